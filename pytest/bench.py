@@ -0,0 +1,276 @@
+# Copyright 2020 Jacob Glueck
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Benchmarks of the generated python code.
+#
+# Generates the python backend for the test protocols, and measures parse,
+# serialize, size_bytes and conversions of small and large messages. Run it from
+# this directory, with the python directory on the path:
+#
+#   PYTHONPATH=../python python bench.py --out before.json
+#   PYTHONPATH=../python python bench.py --compare before.json
+#
+# The messages are built with the default generator options, and benchmarked with
+# the code generated with --generator-args (for example "--slots --views").
+# The results are saved as JSON, so runs on different commits can be compared.
+
+import typing as t
+import argparse
+import atexit
+import importlib
+import json
+import platform
+import shlex
+import subprocess
+import sys
+import timeit
+
+from helpers import check_parsed, generate_python
+
+Benchmark = t.Tuple[str, int, t.Callable[[], t.Any]]
+
+
+# The generated modules for one set of generator arguments
+class Protocols:
+    def __init__(self, namespace: str, *args: str) -> None:
+        self.basic = generate_python(
+            atexit.register,
+            f"{namespace}_basic",
+            ["test_types.basic.Basic", "test_types.external.External"],
+            *args,
+        )
+        self.external = importlib.import_module(
+            f"{namespace}_basic.test_types.External"
+        )
+        self.robot_cmd = generate_python(
+            atexit.register,
+            f"{namespace}_robot_cmd",
+            ["test_types.robot_cmd.RobotCmd"],
+            *args,
+        )
+        self.v4 = generate_python(
+            atexit.register,
+            f"{namespace}_bakery",
+            [
+                "test_types.bakery.v4.V4",
+                "test_types.bakery.v3.V3",
+                "test_types.bakery.v2.V2",
+                "test_types.bakery.v1.V1",
+            ],
+            *args,
+        )
+        self.v3 = importlib.import_module(f"{namespace}_bakery.test_types.bakery.V3")
+        self.ptypes_test_types = generate_python(
+            atexit.register,
+            f"{namespace}_ptypes",
+            ["test_types.ptypes_test_types.PtypesTestTypes", "tako.ptypes.Ptypes"],
+            *args,
+        )
+        self.ptypes = importlib.import_module(f"{namespace}_ptypes.tako.Ptypes")
+
+
+# The messages to benchmark: a name, the module and name of their type, and a
+# message built with the default generator options
+def messages(ref: Protocols) -> t.List[t.Tuple[str, str, str, t.Any]]:
+    basic = ref.basic
+    rc = ref.robot_cmd
+    v4 = ref.v4
+    ptypes = ref.ptypes
+    person = basic.Person(ref.external.String(b"alice"), 30)
+    orders = [basic.CookieOrder(i, basic.Flavor(i % 2)) for i in range(1000)]
+    move = rc.BaseCmd(rc.BaseCmdVariant(rc.MoveCmd(rc.Direction.FORWARDS, 1)))
+    rotate = rc.BaseCmd(rc.BaseCmdVariant(rc.RotateCmd(rc.RotateDirection.LEFT_90)))
+    cmds = [move, rotate] * 500
+    order = v4.Order(v4.CakeOrder(3, v4.Shape.ROUND, v4.Flavor.CARMEL))
+    return [
+        (
+            "basic.Primitives",
+            "basic",
+            "Primitives",
+            check_parsed(basic.Primitives.parse(bytes(82), 0))[1],
+        ),
+        (
+            "basic.TwoThingMsg",
+            "basic",
+            "TwoThingMsg",
+            basic.TwoThingMsg(basic.Thing(person), basic.Thing(basic.Box(1, 2, 3))),
+        ),
+        (
+            "basic.CookieOrderList[1000]",
+            "basic",
+            "CookieOrderList",
+            basic.CookieOrderList(orders),
+        ),
+        (
+            "basic.VectorPair[2x1000]",
+            "basic",
+            "VectorPair",
+            basic.VectorPair(
+                basic.Vector(list(range(1000))), basic.Vector(list(range(1000)))
+            ),
+        ),
+        (
+            "robot_cmd.Msg.move",
+            "robot_cmd",
+            "Msg",
+            rc.Msg(rc.CmdVariant(rc.MoveCmd(rc.Direction.BACKWARDS, 10))),
+        ),
+        (
+            "robot_cmd.Msg.seq[1000]",
+            "robot_cmd",
+            "Msg",
+            rc.Msg(rc.CmdVariant(rc.CmdSeq(cmds))),
+        ),
+        (
+            "bakery.Message.new_order",
+            "v4",
+            "Message",
+            v4.Message(v4.MessageVariant(v4.NewOrderRequest(b"bob", order))),
+        ),
+        (
+            "ptypes.Optional",
+            "ptypes_test_types",
+            "Optional",
+            ref.ptypes_test_types.Optional(
+                ref.ptypes_test_types.MaybeNum(ptypes.Lu32(7))
+            ),
+        ),
+        (
+            "ptypes.StringL32[100000]",
+            "ptypes",
+            "StringL32",
+            ptypes.StringL32(bytes(range(256)) * 390 + bytes(160)),
+        ),
+    ]
+
+
+def benchmarks(ref: Protocols, target: Protocols) -> t.List[Benchmark]:
+    result: t.List[Benchmark] = []
+    for name, module, type_name, message in messages(ref):
+        message_type = getattr(getattr(target, module), type_name)
+        data = bytes(message.serialize())
+        parsed = check_parsed(message_type.parse(data, 0))[1]
+
+        def parse(message_type: t.Any = message_type, data: bytes = data) -> None:
+            message_type.parse(data, 0)
+
+        def size_bytes(message: t.Any = parsed) -> None:
+            message.size_bytes()
+            # Dynamic structs cache their size, so measure computing it. Nested
+            # messages keep their cached sizes.
+            if hasattr(message, "_size_bytes"):
+                object.__delattr__(message, "_size_bytes")
+
+        result.append((f"{name}.parse", len(data), parse))
+        result.append((f"{name}.serialize", len(data), parsed.serialize))
+        result.append((f"{name}.size_bytes", len(data), size_bytes))
+
+    v4 = target.v4
+    v3 = target.v3
+    order = v4.Order(v4.CakeOrder(3, v4.Shape.ROUND, v4.Flavor.CARMEL))
+    new_order = v4.Message(v4.MessageVariant(v4.NewOrderRequest(b"bob", order)))
+    old_order = v4.convert(new_order, v3.ToMessage)
+    result.append(
+        (
+            "bakery.Message.new_order.convert_v4_to_v3",
+            0,
+            lambda: v4.convert(new_order, v3.ToMessage),
+        )
+    )
+    result.append(
+        (
+            "bakery.Message.new_order.convert_v3_to_v4",
+            0,
+            lambda: v4.convert(old_order, v4.ToMessage),
+        )
+    )
+    return result
+
+
+# Returns the best time of one call of fn, in seconds, out of repeat runs which
+# each take at least 0.2 seconds
+def measure(fn: t.Callable[[], t.Any], repeat: int) -> float:
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat, number)) / number
+
+
+def git_commit() -> t.Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            check=True,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            universal_newlines=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv: t.List[str]) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the generated python")
+    parser.add_argument("--out", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="compare with the results in this file")
+    parser.add_argument(
+        "--filter", default="", help="only run benchmarks containing this string"
+    )
+    parser.add_argument(
+        "--generator-args",
+        default="",
+        help="arguments of the python generator, for example '--slots'",
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    generator_args = shlex.split(args.generator_args)
+    ref = Protocols("takobench_ref")
+    target = Protocols("takobench", *generator_args) if generator_args else ref
+
+    baseline: t.Dict[str, t.Any] = {}
+    if args.compare is not None:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+
+    results: t.Dict[str, t.Dict[str, float]] = {}
+    for name, size, fn in benchmarks(ref, target):
+        if args.filter not in name:
+            continue
+        seconds = measure(fn, args.repeat)
+        results[name] = {"seconds": seconds, "bytes": size}
+        line = f"{name:<55} {seconds * 1e6:>12.3f} us"
+        if size != 0:
+            line += f" {size / seconds / 1e6:>10.1f} MB/s"
+        # The speedup compared to the baseline
+        if name in baseline:
+            line += f"  x{baseline[name]['seconds'] / seconds:.2f}"
+        print(line)
+
+    if args.out is not None:
+        with open(args.out, "w") as f:
+            json.dump(
+                {
+                    "commit": git_commit(),
+                    "python": platform.python_version(),
+                    "generator_args": generator_args,
+                    "results": results,
+                },
+                f,
+                indent=2,
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -13,7 +13,13 @@
 # limitations under the License.
 
 import typing as t
+import importlib
+import io
+import sys
+import tempfile
+from types import ModuleType
 from tako.runtime import ParseError
+from tako.main import main
 
 T = t.TypeVar("T")
 
@@ -21,3 +27,41 @@ T = t.TypeVar("T")
 def check_parsed(result: t.Union[ParseError, t.Tuple[int, T]]) -> t.Tuple[int, T]:
     assert not isinstance(result, ParseError)
     return result
+
+
+# Generates the python backend for the given protocols into a temporary directory with
+# the given generator arguments, and imports the first one.
+# add_cleanup (e.g. TestCase.addClassCleanup) registers the removal of the directory,
+# its sys.path entry, and the imported modules.
+# Each call must use its own namespace, because generated modules are cached by python.
+def generate_python(
+    add_cleanup: t.Callable[..., t.Any], namespace: str, protos: t.List[str], *args: str
+) -> ModuleType:
+    out_dir = tempfile.TemporaryDirectory()
+    add_cleanup(out_dir.cleanup)
+    for proto in protos:
+        output = io.StringIO()
+        status = main(
+            [
+                "generate",
+                "--namespace",
+                namespace,
+                out_dir.name,
+                proto,
+                "python",
+                *args,
+            ],
+            output,
+        )
+        assert status == 0, output.getvalue()
+    sys.path.append(out_dir.name)
+    add_cleanup(remove_generated, namespace, out_dir.name)
+    module, cls = protos[0].rsplit(".", 1)
+    return importlib.import_module(f"{namespace}.{module.rsplit('.', 1)[0]}.{cls}")
+
+
+def remove_generated(namespace: str, out_dir: str) -> None:
+    sys.path.remove(out_dir)
+    for name in list(sys.modules):
+        if name == namespace or name.startswith(f"{namespace}."):
+            del sys.modules[name]
@@ -0,0 +1,127 @@
+# Copyright 2020 Jacob Glueck
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from unittest import TestCase
+
+import asyncio
+import typing
+
+from takogen.test_types import Basic
+from tako.runtime.aio import MessageProtocol, MessageWriter, read_messages
+
+messages = [Basic.Vector(data=list(range(n))) for n in range(20)]
+stream = b"".join(m.serialize() for m in messages)
+
+
+class FakeTransport:
+    def __init__(self) -> None:
+        self.writes: typing.List[typing.List[bytes]] = []
+        self.closed = False
+
+    def writelines(self, data: typing.List[bytes]) -> None:
+        self.writes.append([bytes(x) for x in data])
+
+    def close(self) -> None:
+        self.closed = True
+
+
+class CollectingProtocol(MessageProtocol[typing.Any]):
+    def __init__(self, message_type: typing.Any) -> None:
+        super().__init__(message_type, buffer_size=16)
+        self.received: typing.List[typing.Any] = []
+
+    def message_received(self, message: typing.Any) -> None:
+        self.received.append(message)
+
+
+# Parses vectors, counting how many times parse is called
+class CountingParser:
+    def __init__(self) -> None:
+        self.validate = Basic.Vector.validate
+        self.parses = 0
+
+    def parse(self, buf: memoryview, offset: int) -> typing.Any:
+        self.parses += 1
+        return Basic.Vector.parse(buf, offset)
+
+
+class TestAio(TestCase):
+    def test_read_messages(self) -> None:
+        async def read(data: bytes) -> typing.List[Basic.Vector]:
+            reader = asyncio.StreamReader()
+            reader.feed_data(data)
+            reader.feed_eof()
+            decoded: typing.AsyncIterator[Basic.Vector] = read_messages(
+                reader, Basic.Vector, 5
+            )
+            return [m async for m in decoded]
+
+        self.assertEqual(asyncio.run(read(stream)), messages)
+        with self.assertRaises(asyncio.IncompleteReadError) as context:
+            asyncio.run(read(stream[:-1]))
+        self.assertEqual(context.exception.partial, messages[-1].serialize()[:-1])
+
+    def test_protocol(self) -> None:
+        protocol = CollectingProtocol(Basic.Vector)
+        protocol.connection_made(FakeTransport())  # type: ignore
+        for i in range(0, len(stream), 7):
+            chunk = stream[i : i + 7]
+            buf = protocol.get_buffer(len(chunk))
+            buf[: len(chunk)] = chunk
+            protocol.buffer_updated(len(chunk))
+        self.assertEqual(protocol.received, messages)
+
+    def test_incomplete_not_parsed_again(self) -> None:
+        # A large message arriving in small chunks is parsed once it is complete,
+        # not for each chunk
+        message = Basic.Vector(data=list(range(1000)))
+        data = message.serialize()
+        parser = CountingParser()
+        protocol = CollectingProtocol(parser)
+        for i in range(0, len(data), 100):
+            chunk = data[i : i + 100]
+            protocol.get_buffer(len(chunk))[: len(chunk)] = chunk
+            protocol.buffer_updated(len(chunk))
+        self.assertEqual(protocol.received, [message])
+        # When the first chunk arrives, when the message is complete, and at the
+        # end of the data
+        self.assertEqual(parser.parses, 3)
+
+    def test_protocol_malformed(self) -> None:
+        transport = FakeTransport()
+        protocol = CollectingProtocol(Basic.CookieOrder)
+        protocol.connection_made(transport)  # type: ignore
+        # The second order has an invalid flavor
+        data = b"\x01\x00\x00\x00\x00" + b"\x01\x00\x00\x00\x09"
+        protocol.get_buffer(-1)[: len(data)] = data
+        protocol.buffer_updated(len(data))
+        self.assertEqual(len(protocol.received), 1)
+        self.assertTrue(transport.closed)
+
+    def test_coalesced_writes(self) -> None:
+        transport = FakeTransport()
+
+        async def write() -> None:
+            writer = MessageWriter(transport)
+            for message in messages[:3]:
+                writer.write(message)
+            await asyncio.sleep(0)
+            writer.write(messages[3])
+            writer.flush()
+
+        asyncio.run(write())
+        self.assertEqual(
+            transport.writes,
+            [[bytes(m.serialize()) for m in messages[:3]], [messages[3].serialize()]],
+        )
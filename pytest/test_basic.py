@@ -14,7 +14,15 @@
 
 from unittest import TestCase
 
+import array
+import copy
+import dataclasses
+import pickle
+import typing as t
+
 from tako.util.cast import checked_cast
+import tako.runtime
+from tako.runtime import ParseError
 
 from takogen.test_types import Basic
 from takogen.test_types import External
@@ -408,6 +416,17 @@ class TestBasic(TestCase):
         self.assertEqual(p_data[3][1], 0xB)
         self.assertEqual(p_data[3][2], 0xC)
 
+    def test_fields_after_virtual(self) -> None:
+        # Fields after a virtual field are parsed with the context of parse
+        label = External.String(array.array("b", b"ab"))
+        msg = Basic.LabeledVarList(rows=1, label=label)
+        data = msg.serialize()
+        offset, parsed = check_parsed(Basic.LabeledVarList.parse(data, 0))
+        self.assertEqual(parsed, msg)
+        self.assertEqual(
+            parsed.data(bytes([1, 2, 3]), 0), (3, [array.array("b", [1, 2, 3])])
+        )
+
     def test_person(self) -> None:
         # fmt: off
         data = bytes([
@@ -471,6 +490,28 @@ class TestBasic(TestCase):
         self.assertIn(Basic.Pencil, Basic.Thing.types)
         self.assertEqual(len(Basic.Thing.types), 3)
 
+    def test_thing_dispatch(self) -> None:
+        self.assertEqual(
+            Basic.Thing.TAGS, {Basic.Person: 0, Basic.Box: 1, Basic.Pencil: 2}
+        )
+        box = Basic.Box(1, 2, 3)
+        self.assertEqual(Basic.Thing(box).tag(), 1)
+
+        class Namer(Basic.ThingVisitor[str]):
+            def visit_person(self, value: Basic.Person) -> str:
+                return "person"
+
+            def visit_box(self, value: Basic.Box) -> str:
+                return "box"
+
+            def visit_pencil(self, value: Basic.Pencil) -> str:
+                return "pencil"
+
+        self.assertEqual(Basic.Thing(box).accept(Namer()), "box")
+        self.assertEqual(Basic.Thing.parse(box.serialize(), 0, 3), ParseError.MALFORMED)
+        self.assertEqual(Basic.Flavor.from_int(1), Basic.Flavor.CHOCOLATE)
+        self.assertEqual(Basic.Flavor.from_int(2), ParseError.MALFORMED)
+
     def test_thing_person(self) -> None:
         # fmt: off
         data = bytes([
@@ -563,3 +604,148 @@ class TestBasic(TestCase):
         parsed.serialize_into(built, 0)
         thing.serialize_into(built, parsed.size_bytes())
         self.assertEqual(data, built)
+
+    def test_sizes(self) -> None:
+        self.assertEqual(Basic.Box.SIZE_BYTES, 6)
+        self.assertEqual(Basic.Box(1, 2, 3).size_bytes(), 6)
+
+        orders = Basic.CookieOrderList(
+            [Basic.CookieOrder(i, Basic.Flavor.CHOCOLATE) for i in range(3)]
+        )
+        self.assertEqual(orders.size_bytes(), 19)
+        self.assertEqual(orders.size_bytes(), 19)
+
+        serialized = orders.serialize()
+        self.assertEqual(len(serialized), 19)
+        offset, parsed = check_parsed(Basic.CookieOrderList.parse(serialized, 0))
+        self.assertEqual(offset, 19)
+        self.assertEqual(parsed, orders)
+
+        # serialize_into extends a buffer which is too small
+        buf = bytearray(b"\xff")
+        self.assertEqual(orders.serialize_into(buf, 1), 20)
+        self.assertEqual(buf, b"\xff" + serialized)
+
+        # serialize is correct after a list is modified, even though the size was
+        # already computed
+        orders.orders.pop()
+        self.assertEqual(len(orders.serialize()), 14)
+        offset, parsed = check_parsed(
+            Basic.CookieOrderList.parse(orders.serialize(), 0)
+        )
+        self.assertEqual(parsed, orders)
+        orders.orders.append(Basic.CookieOrder(3, Basic.Flavor.VANILLA))
+        self.assertEqual(
+            check_parsed(Basic.CookieOrderList.parse(orders.serialize(), 0))[1],
+            orders,
+        )
+
+    def test_peek_tag(self) -> None:
+        msg = Basic.ThingMsg(Basic.Thing(Basic.Box(1, 2, 3)))
+        data = b"\x00" + msg.serialize()
+        self.assertEqual(Basic.ThingMsg.peek_tag(data, 1), 1)
+        self.assertEqual(
+            Basic.ThingMsg.parse_as(1, data, 1), (len(data), msg.thing.value)
+        )
+        self.assertEqual(Basic.ThingMsg.parse_as(0, data, 1), ParseError.MALFORMED)
+        self.assertEqual(Basic.ThingMsg.peek_tag(data, 0), 0)
+        self.assertEqual(
+            Basic.ThingMsg.peek_tag(data, len(data)), ParseError.NOT_ENOUGH_DATA
+        )
+        self.assertEqual(Basic.ThingMsg.peek_tag(b"\x07", 0), ParseError.MALFORMED)
+
+    def test_field_accessors(self) -> None:
+        pair = Basic.CookieOrderPair(
+            Basic.CookieOrder(1, Basic.Flavor.VANILLA),
+            Basic.CookieOrder(2, Basic.Flavor.CHOCOLATE),
+        )
+        data = bytearray(b"\x00") + pair.serialize()
+        self.assertEqual(Basic.CookieOrder.get_quantity(data, 1), 1)
+        self.assertEqual(Basic.CookieOrder.get_flavor(data, 1), Basic.Flavor.VANILLA)
+        self.assertEqual(
+            Basic.CookieOrder.get_quantity(data, len(data) - 3),
+            ParseError.NOT_ENOUGH_DATA,
+        )
+
+        Basic.CookieOrder.set_quantity(data, 1 + pair.order_1.size_bytes(), -5)
+        Basic.CookieOrder.set_flavor(data, 1, Basic.Flavor.CHOCOLATE)
+        self.assertEqual(
+            check_parsed(Basic.CookieOrderPair.parse(data, 1))[1],
+            Basic.CookieOrderPair(
+                Basic.CookieOrder(1, Basic.Flavor.CHOCOLATE),
+                Basic.CookieOrder(-5, Basic.Flavor.CHOCOLATE),
+            ),
+        )
+        # Fields after a variable length field have no accessors
+        self.assertFalse(hasattr(Basic.Person, "get_age"))
+        # Nor do sequence lengths and variant tags, even when only virtual fields use
+        # them
+        self.assertFalse(hasattr(Basic.CookieOrderList, "set_number_of_orders"))
+        self.assertFalse(hasattr(Basic.VirtualThingMsg, "set_thing_type"))
+        self.assertFalse(hasattr(Basic.VarList, "set_rows"))
+
+    def test_decode_cache(self) -> None:
+        order = Basic.CookieOrder(1, Basic.Flavor.VANILLA)
+        data = (
+            order.serialize() + Basic.CookieOrder(2, Basic.Flavor.VANILLA).serialize()
+        )
+        cache = tako.runtime.enable_decode_cache(Basic.CookieOrder, 1)
+        try:
+            first = check_parsed(Basic.CookieOrder.parse(data, 0))[1]
+            self.assertIs(check_parsed(Basic.CookieOrder.parse(data, 0))[1], first)
+            self.assertEqual((cache.hits, cache.misses), (1, 1))
+            # Nested structs use the cache too
+            pair = check_parsed(Basic.CookieOrderPair.parse(data, 0))[1]
+            self.assertIs(pair.order_1, first)
+            self.assertEqual(pair.order_2, Basic.CookieOrder(2, Basic.Flavor.VANILLA))
+            self.assertEqual((len(cache), cache.evictions), (1, 1))
+            self.assertEqual(
+                Basic.CookieOrder.parse(data, len(data) - 1),
+                ParseError.NOT_ENOUGH_DATA,
+            )
+        finally:
+            tako.runtime.disable_decode_cache(Basic.CookieOrder)
+        self.assertIsNot(check_parsed(Basic.CookieOrder.parse(data, 0))[1], first)
+        with self.assertRaises(TypeError):
+            tako.runtime.enable_decode_cache(Basic.Vector)
+        # Nor can structs holding lists, which could be modified
+        with self.assertRaises(TypeError):
+            tako.runtime.enable_decode_cache(Basic.Arrays)
+
+    def test_pickle(self) -> None:
+        msg = Basic.TwoThingMsg(
+            Basic.Thing(
+                Basic.Person(External.String(array.array("b", b"alice")), 30)
+            ),
+            Basic.Thing(Basic.Box(1, 2, 3)),
+        )
+        # Structs are pickled as their serialized bytes
+        self.assertEqual(
+            msg.__reduce__(),
+            (tako.runtime.decode, (Basic.TwoThingMsg, msg.serialize())),
+        )
+        self.assertEqual(pickle.loads(pickle.dumps(msg)), msg)
+        self.assertEqual(copy.deepcopy(msg), msg)
+
+        # Copies are made field by field, like other dataclasses
+        vector = Basic.Vector(data=[1, 2, 3])
+        self.assertIs(copy.copy(vector).data, vector.data)
+        self.assertIsNot(copy.deepcopy(vector).data, vector.data)
+        self.assertEqual(copy.deepcopy(vector), vector)
+        # Values which do not survive serialization are copied exactly
+        box = Basic.Box(length=2 ** 20, width=2, height=3)
+        self.assertEqual(copy.copy(box), box)
+        self.assertEqual(copy.deepcopy(box), box)
+        values: t.Dict[str, t.Any] = {
+            field.name: 0 for field in dataclasses.fields(Basic.Primitives)
+        }
+        values["f_lf32"] = 0.1
+        primitives = Basic.Primitives(**values)
+        self.assertEqual(copy.copy(primitives).f_lf32, 0.1)
+        self.assertEqual(copy.deepcopy(primitives).f_lf32, 0.1)
+
+        data = msg.serialize()
+        with self.assertRaises(tako.runtime.IncompleteMessage):
+            tako.runtime.decode(Basic.TwoThingMsg, data[:-1])
+        with self.assertRaises(tako.runtime.MalformedMessage):
+            tako.runtime.decode(Basic.TwoThingMsg, data + b"\x00")
@@ -0,0 +1,92 @@
+# Copyright 2020 Jacob Glueck
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from unittest import TestCase
+
+import typing as t
+
+from takogen.test_types import Basic
+from tako.runtime import IncompleteMessage, MalformedMessage, ParseError
+
+from helpers import check_parsed
+
+orders = [Basic.CookieOrder(quantity=i, flavor=Basic.Flavor(i % 2)) for i in range(10)]
+order_data = b"".join(o.serialize() for o in orders)
+vectors = [Basic.Vector(data=list(range(n))) for n in range(10)]
+vector_data = b"".join(v.serialize() for v in vectors)
+cases: t.List[t.Tuple[t.Any, t.List[t.Any], bytes]] = [
+    (Basic.CookieOrder, orders, order_data),
+    (Basic.Vector, vectors, vector_data),
+]
+
+
+class TestBatch(TestCase):
+    def test_parse_many(self) -> None:
+        for message_type, messages, data in cases:
+            offset, parsed = check_parsed(message_type.parse_many(data))
+            self.assertEqual(offset, len(data))
+            self.assertEqual(parsed, messages)
+
+            first = messages[0].size_bytes()
+            offset, parsed = check_parsed(message_type.parse_many(data, first, 2))
+            self.assertEqual(parsed, messages[1:3])
+            self.assertEqual(offset, first + sum(m.size_bytes() for m in parsed))
+
+            self.assertEqual(
+                message_type.parse_many(data[:-1]), ParseError.NOT_ENOUGH_DATA
+            )
+            self.assertEqual(
+                message_type.parse_many(data, 0, 11), ParseError.NOT_ENOUGH_DATA
+            )
+            with self.assertRaises(ValueError):
+                message_type.parse_many(data, 0, -1)
+
+            # Nothing is parsed from an offset past the end of the buffer
+            past_end = len(data) + 10
+            self.assertEqual(message_type.parse_many(data, past_end), (past_end, []))
+            self.assertEqual(message_type.parse_many(data, past_end, 0), (past_end, []))
+            self.assertEqual(
+                message_type.parse_many(data, len(data) + 1, 1),
+                ParseError.NOT_ENOUGH_DATA,
+            )
+
+    def test_iter_parse(self) -> None:
+        for message_type, messages, data in cases:
+            self.assertEqual(list(message_type.iter_parse(data)), messages)
+            self.assertEqual(list(message_type.iter_parse(data, len(data) + 1)), [])
+            with self.assertRaises(IncompleteMessage) as context:
+                list(message_type.iter_parse(data[:-1]))
+            self.assertEqual(
+                context.exception.offset, len(data) - messages[-1].size_bytes()
+            )
+
+    def test_malformed(self) -> None:
+        bad_data = bytearray(order_data)
+        # The flavor of the third order
+        bad_data[14] = 9
+        self.assertEqual(Basic.CookieOrder.parse_many(bad_data), ParseError.MALFORMED)
+        with self.assertRaises(MalformedMessage) as context:
+            list(Basic.CookieOrder.iter_parse(bad_data))
+        self.assertEqual(context.exception.offset, 10)
+
+    def test_zero_size(self) -> None:
+        offset, parsed = check_parsed(Basic.Empty.parse_many(b"", 0, 3))
+        self.assertEqual(parsed, [Basic.Empty()] * 3)
+        with self.assertRaises(ValueError):
+            Basic.Empty.parse_many(b"")
+
+        # Sequences of structs are parsed with parse_many, but a negative length
+        # read from the message is malformed
+        negative = b"\xff\xff\xff\xff" + order_data
+        self.assertEqual(Basic.CookieOrderList.parse(negative, 0), ParseError.MALFORMED)
@@ -0,0 +1,97 @@
+# Copyright 2020 Jacob Glueck
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from unittest import TestCase
+
+import array
+import mmap
+import typing as t
+from types import ModuleType
+
+from takogen.test_types import Basic
+from tako.runtime import ParseError, byte_view
+
+from helpers import check_parsed, generate_python
+
+# fmt: off
+vector_data = bytes([
+    # len (bi32)
+    0x00, 0x00, 0x00, 0x03,
+    # data (Seq(bi32, this.len))
+    0xde, 0xad, 0xbe, 0xef,
+    0xca, 0xfe, 0xba, 0xbe,
+    0x00, 0xc0, 0xff, 0xee
+])
+person_data = bytes([
+    # name (External.String)
+    # len (li32)
+    0x03, 0x00, 0x00, 0x00,
+    # data (Seq(i8, this.len))
+    98, 111, 98,
+    # age (li16)
+    0x04, 0x00
+])
+# fmt: on
+
+
+class TestBuffers(TestCase):
+    def test_buffer_types(self) -> None:
+        expected = check_parsed(Basic.Vector.parse(vector_data, 0))[1]
+        padded = b"\x00\x00" + vector_data
+        with mmap.mmap(-1, len(padded)) as mapped:
+            mapped.write(padded)
+            bufs: t.List[t.Union[bytearray, memoryview, mmap.mmap]] = [
+                bytearray(padded),
+                memoryview(padded),
+                mapped,
+            ]
+            for buf in bufs:
+                offset, parsed = check_parsed(Basic.Vector.parse(buf, 2))
+                self.assertEqual(offset, len(padded))
+                self.assertEqual(parsed, expected)
+
+    def test_truncated_view(self) -> None:
+        view = memoryview(vector_data)[:-1]
+        self.assertEqual(Basic.Vector.parse(view, 0), ParseError.NOT_ENOUGH_DATA)
+
+    def test_byte_view(self) -> None:
+        words = array.array("B", vector_data)
+        offset, parsed = check_parsed(Basic.Vector.parse(byte_view(words), 0))
+        self.assertEqual(parsed.data[2], 0x00C0FFEE)
+        self.assertEqual(len(byte_view(array.array("i", [1, 2]))), 8)
+
+
+class TestMemoryviewOption(TestCase):
+    basic: ModuleType
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.basic = generate_python(
+            cls.addClassCleanup,
+            "takogen_memoryview",
+            ["test_types.basic.Basic", "test_types.external.External"],
+            "--memoryview",
+        )
+
+    def test_memoryview_option(self) -> None:
+        basic = self.basic
+        buf = bytearray(person_data)
+        offset, parsed = check_parsed(basic.Person.parse(buf, 0))
+
+        self.assertIsInstance(parsed.name.data, memoryview)
+        self.assertEqual(list(parsed.name.data), [98, 111, 98])
+        self.assertEqual(person_data, parsed.serialize())
+        # The field is a view of the original buffer, not a copy
+        buf[4] = ord("c")
+        self.assertEqual(parsed.name.data[0], ord("c"))
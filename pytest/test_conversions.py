@@ -13,9 +13,12 @@
 # limitations under the License.
 
 from unittest import TestCase
+from types import ModuleType
 
 from takogen.test_types.Conversions import *
 
+from helpers import generate_python
+
 
 class TestConversions(TestCase):
     def test_conversions_flavor_old_to_flavor_new(self) -> None:
@@ -64,3 +67,35 @@ class TestConversions(TestCase):
         self.assertEqual(
             old, MsgOld(OrderOld(CupcakeOrderOld(flavor=FlavorOld.CHOCOLATE)))
         )
+
+
+class TestConversionsBetweenVersions(TestCase):
+    v4: ModuleType
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.v4 = generate_python(
+            cls.addClassCleanup,
+            "takogen_bakery",
+            [
+                "test_types.bakery.v4.V4",
+                "test_types.bakery.v3.V3",
+                "test_types.bakery.v2.V2",
+                "test_types.bakery.v1.V1",
+            ],
+        )
+
+    def test_conversions_between_versions(self) -> None:
+        v4 = self.v4
+        v3 = v4.takogen_bakery.test_types.bakery.V3
+
+        new_order = v4.Order(v4.CakeOrder(3, v4.Shape.ROUND, v4.Flavor.CARMEL))
+        new_ = v4.Message(v4.MessageVariant(v4.NewOrderRequest(b"bob", new_order)))
+        old_order = v3.Order(v3.CakeOrder(3, v3.Shape.ROUND, v3.Flavor.CARMEL))
+        old = v4.convert(new_, v3.ToMessage)
+        self.assertEqual(
+            old, v3.Message(v3.MessageVariant(v3.NewOrderRequest(b"bob", old_order)))
+        )
+
+        cancel = v4.Message(v4.MessageVariant(v4.CancelOrderRequest(order_id=1)))
+        self.assertIsNone(v4.convert(cancel, v3.ToMessage))
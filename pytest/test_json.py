@@ -0,0 +1,144 @@
+# Copyright 2020 Jacob Glueck
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from unittest import TestCase, skipIf
+from types import ModuleType
+
+import array
+import importlib
+import json
+import typing as t
+
+import tako.runtime
+from helpers import generate_python
+
+numpy: t.Any
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+protocols = ["test_types.basic.Basic", "test_types.external.External"]
+
+
+class TestJson(TestCase):
+    basic: ModuleType
+    external: ModuleType
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.basic = generate_python(
+            cls.addClassCleanup, "takogen_json", protocols, "--json"
+        )
+        cls.external = importlib.import_module("takogen_json.test_types.External")
+
+    def test_round_trip(self) -> None:
+        messages = [
+            self.basic.Primitives(
+                -1, 2, -3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 1.5, 2.5, 3.5, 4.5
+            ),
+            self.basic.Matrix(
+                [array.array("b", row) for row in [[1, 2, 3], [-1, -2, 0], [0, 0, 0]]]
+            ),
+            self.basic.Enums(
+                self.basic.U8Enum.THING_1,
+                self.basic.BU64Enum.THING_3,
+                [
+                    self.basic.U8Enum.THING_0,
+                    self.basic.U8Enum.THING_2,
+                    self.basic.U8Enum.THING_3,
+                ],
+                [
+                    self.basic.BU64Enum.THING_2,
+                    self.basic.BU64Enum.THING_0,
+                    self.basic.BU64Enum.THING_1,
+                ],
+            ),
+            self.basic.CookieOrderList(
+                [
+                    self.basic.CookieOrder(1, self.basic.Flavor.VANILLA),
+                    self.basic.CookieOrder(-2, self.basic.Flavor.CHOCOLATE),
+                ]
+            ),
+            self.basic.ThingMsg(self.basic.Thing(self.basic.Box(1, 2, 3))),
+            self.basic.ThingMsg(
+                self.basic.Thing(self.basic.Pencil(4, self.external.Color.BLUE))
+            ),
+        ]
+        for msg in messages:
+            obj = json.loads(json.dumps(msg.to_json_obj()))
+            self.assertEqual(type(msg).from_json_obj(obj), msg)
+
+        # The JSON objects are the same as those of the C++ generator
+        self.assertEqual(
+            self.basic.ThingMsg(
+                self.basic.Thing(self.basic.Box(1, 2, 3))
+            ).to_json_obj(),
+            {"thing_type": 1, "thing": {"length": 1, "width": 2, "height": 3}},
+        )
+        # Sequences of i8 are signed, and may be given as lists
+        matrix = self.basic.Matrix([[1, 2, 3], [-1, -2, 0], [0, 0, 0]])
+        self.assertEqual(matrix.to_json_obj()["data"][1], [-1, -2, 0])
+
+    def test_malformed(self) -> None:
+        malformed = tako.runtime.ParseError.MALFORMED
+        msg = self.basic.ThingMsg(
+            self.basic.Thing(self.basic.Box(1, 2, 3))
+        ).to_json_obj()
+        self.assertEqual(
+            self.basic.ThingMsg.from_json_obj(dict(msg, thing_type=7)), malformed
+        )
+        self.assertEqual(
+            self.basic.ThingMsg.from_json_obj(dict(msg, thing={})), malformed
+        )
+        self.assertEqual(self.basic.ThingMsg.from_json_obj([]), malformed)
+
+        vector = self.basic.Vector([1, 2, 3]).to_json_obj()
+        self.assertEqual(
+            self.basic.Vector.from_json_obj(dict(vector, len=2)), malformed
+        )
+        self.assertEqual(
+            self.basic.Vector.from_json_obj(dict(vector, data=[1, 2, 2.5])), malformed
+        )
+        self.assertEqual(
+            self.basic.Vector.from_json_obj(dict(vector, data=[1, 2, 2 ** 31])), malformed
+        )
+
+        box = self.basic.Box(1, 2, 3).to_json_obj()
+        del box["height"]
+        self.assertEqual(self.basic.Box.from_json_obj(box), malformed)
+
+        matrix = self.basic.Matrix([b"\x00\x00\x00"] * 3).to_json_obj()
+        matrix["data"][0] = [0, 0, 128]
+        self.assertEqual(self.basic.Matrix.from_json_obj(matrix), malformed)
+
+
+@skipIf(numpy is None, "numpy is not installed")
+class TestJsonNumpy(TestCase):
+    basic: ModuleType
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.basic = generate_python(
+            cls.addClassCleanup, "takogen_json_numpy", protocols, "--json", "--numpy"
+        )
+
+    def test_numpy(self) -> None:
+        module = self.basic
+        vector = module.Vector(numpy.array([1, 2, 3], dtype=">i4"))
+        obj = json.loads(json.dumps(vector.to_json_obj()))
+        self.assertEqual(obj, {"len": 3, "data": [1, 2, 3]})
+        result = module.Vector.from_json_obj(obj)
+        self.assertEqual(result.data.tolist(), [1, 2, 3])
+        self.assertEqual(result.serialize(), vector.serialize())
@@ -0,0 +1,55 @@
+# Copyright 2020 Jacob Glueck
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from unittest import TestCase
+
+import sys
+from types import ModuleType
+
+from helpers import check_parsed, generate_python
+
+
+class TestLazy(TestCase):
+    basic: ModuleType
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.basic = generate_python(
+            cls.addClassCleanup,
+            "takogen_lazy",
+            ["test_types.basic.Basic", "test_types.external.External"],
+            "--lazy",
+        )
+
+    def test_lazy(self) -> None:
+        basic = self.basic
+        prefix = "takogen_lazy.test_types.Basic."
+        self.assertEqual(basic.MAGIC_NUMBER, 1492)
+        self.assertFalse(any(name.startswith(prefix) for name in sys.modules))
+
+        orders = basic.CookieOrderList([basic.CookieOrder(1, basic.Flavor.VANILLA)] * 2)
+        self.assertEqual(
+            check_parsed(basic.CookieOrderList.parse(orders.serialize(), 0))[1],
+            orders,
+        )
+        # Only the submodules of the types used, and the types they use, are imported
+        self.assertEqual(
+            {name for name in sys.modules if name.startswith(prefix)},
+            {prefix + "_CookieOrderList", prefix + "_CookieOrder", prefix + "_Flavor"},
+        )
+
+        self.assertIn("Thing", dir(basic))
+        self.assertIn("ThingVisitor", basic.__all__)
+        with self.assertRaises(AttributeError):
+            basic.Missing
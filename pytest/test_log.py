@@ -0,0 +1,100 @@
+# Copyright 2020 Jacob Glueck
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from unittest import TestCase
+
+import os
+import tempfile
+
+from takogen.test_types import Basic
+from tako.runtime import Buffer, IncompleteMessage, MalformedMessage
+from tako.runtime.log import MessageLog
+
+messages = [Basic.Vector(data=list(range(n))) for n in range(20)]
+stream = b"".join(m.serialize() for m in messages)
+
+
+class TestLog(TestCase):
+    def setUp(self) -> None:
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "messages.log")
+
+    def tearDown(self) -> None:
+        self.dir.cleanup()
+
+    def write(self, data: Buffer) -> None:
+        with open(self.path, "wb") as f:
+            f.write(data)
+
+    def test_read(self) -> None:
+        self.write(stream)
+        for _ in range(2):
+            with MessageLog[Basic.Vector](self.path, Basic.Vector) as log:
+                self.assertTrue(os.path.exists(self.path + ".idx"))
+                self.assertEqual(len(log), len(messages))
+                self.assertEqual(log[3], messages[3])
+                self.assertEqual(log[-1], messages[-1])
+                self.assertEqual(list(log[5:8]), messages[5:8])
+                self.assertEqual(list(log), messages)
+                self.assertEqual(log.offsets[1], messages[0].size_bytes())
+
+    def test_stale_index(self) -> None:
+        self.write(stream[: messages[0].size_bytes() + messages[1].size_bytes()])
+        with MessageLog[Basic.Vector](self.path, Basic.Vector) as log:
+            self.assertEqual(list(log), messages[:2])
+        self.write(stream)
+        with MessageLog[Basic.Vector](self.path, Basic.Vector) as log:
+            self.assertEqual(list(log), messages)
+
+    def test_invalid_index(self) -> None:
+        self.write(stream)
+        MessageLog(self.path, Basic.Vector).close()
+        # A truncated index is rebuilt
+        with open(self.path + ".idx", "r+b") as f:
+            f.truncate(os.path.getsize(self.path + ".idx") - 3)
+        with MessageLog[Basic.Vector](self.path, Basic.Vector) as log:
+            self.assertEqual(list(log), messages)
+
+        # An index is not reused for another message type
+        self.write(bytes(30))
+        with MessageLog[Basic.CookieOrder](self.path, Basic.CookieOrder) as orders:
+            self.assertEqual(len(orders), 6)
+        with MessageLog[Basic.Box](self.path, Basic.Box) as boxes:
+            self.assertEqual(len(boxes), 5)
+
+    def test_empty(self) -> None:
+        self.write(b"")
+        with MessageLog[Basic.Vector](self.path, Basic.Vector) as log:
+            self.assertEqual(len(log), 0)
+            self.assertEqual(list(log), [])
+
+    def test_invalid(self) -> None:
+        self.write(stream[:-1])
+        with self.assertRaises(IncompleteMessage) as incomplete:
+            MessageLog(self.path, Basic.Vector)
+        self.assertEqual(
+            incomplete.exception.offset, len(stream) - messages[-1].size_bytes()
+        )
+
+        order = Basic.CookieOrder(1, Basic.Flavor.VANILLA).serialize()
+        self.write(order + order[:4] + b"\xff")
+        with self.assertRaises(MalformedMessage) as malformed:
+            MessageLog(self.path, Basic.CookieOrder)
+        self.assertEqual(malformed.exception.offset, 5)
+
+        # A corrupt record with a negative length
+        self.write(messages[1].serialize() + b"\xff\xff\xff\xff" + bytes(8))
+        with self.assertRaises(MalformedMessage) as malformed:
+            MessageLog(self.path, Basic.Vector)
+        self.assertEqual(malformed.exception.offset, messages[1].size_bytes())
@@ -0,0 +1,66 @@
+# Copyright 2020 Jacob Glueck
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from unittest import TestCase
+from types import ModuleType
+
+import dataclasses
+import pickle
+
+from helpers import check_parsed, generate_python
+
+protocols = ["test_types.basic.Basic", "test_types.external.External"]
+
+
+class TestMemoize(TestCase):
+    basic: ModuleType
+    slotted: ModuleType
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.basic = generate_python(
+            cls.addClassCleanup, "takogen_memoize", protocols, "--memoize"
+        )
+        cls.slotted = generate_python(
+            cls.addClassCleanup,
+            "takogen_memoize_slots",
+            protocols,
+            "--memoize",
+            "--slots",
+        )
+
+    def test_serialize(self) -> None:
+        for module in [self.basic, self.slotted]:
+            vector = module.Vector(data=[1, 2, 3])
+            data = vector.serialize()
+            self.assertEqual(vector._serialized, data)
+            # The result is a copy, which can be modified
+            data[-1] = 0xFF
+            self.assertEqual(vector.serialize(), vector._serialized)
+            self.assertNotEqual(vector.serialize(), data)
+
+            pair = module.VectorPair(v1=vector, v2=module.Vector(data=[4]))
+            buf = bytearray(b"\x00")
+            end = pair.serialize_into(buf, 1)
+            self.assertEqual(end, len(buf))
+            self.assertEqual(check_parsed(module.VectorPair.parse(buf, 1))[1], pair)
+            self.assertFalse(hasattr(pair, "_serialized"))
+            self.assertEqual(bytes(buf[1:]), pair.serialize())
+
+            # The serialized bytes are not part of the value
+            self.assertEqual(vector, module.Vector(data=[1, 2, 3]))
+            self.assertFalse(
+                hasattr(dataclasses.replace(vector, data=[4]), "_serialized")
+            )
+            self.assertEqual(pickle.loads(pickle.dumps(pair)), pair)
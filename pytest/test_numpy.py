@@ -0,0 +1,116 @@
+# Copyright 2020 Jacob Glueck
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from unittest import TestCase, skipIf
+
+import typing as t
+from types import ModuleType
+
+from tako.runtime import ParseError
+
+from helpers import check_parsed, generate_python
+
+numpy: t.Any
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# fmt: off
+vector_data = bytes([
+    # len (bi32)
+    0x00, 0x00, 0x00, 0x03,
+    # data (Seq(bi32, this.len))
+    0xde, 0xad, 0xbe, 0xef,
+    0xca, 0xfe, 0xba, 0xbe,
+    0x00, 0xc0, 0xff, 0xee
+])
+# fmt: on
+
+
+@skipIf(numpy is None, "numpy is not installed")
+class TestNumpy(TestCase):
+    basic: ModuleType
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.basic = generate_python(
+            cls.addClassCleanup,
+            "takogen_numpy",
+            ["test_types.basic.Basic", "test_types.external.External"],
+            "--numpy",
+            "--views",
+        )
+
+    def test_vector(self) -> None:
+        offset, parsed = check_parsed(self.basic.Vector.parse(vector_data, 0))
+        self.assertEqual(offset, len(vector_data))
+        self.assertIsInstance(parsed.data, numpy.ndarray)
+        self.assertTrue(parsed.data.dtype.isnative)
+        self.assertEqual(parsed.data.tolist(), [-0x21524111, -0x35014542, 0x00C0FFEE])
+        self.assertEqual(parsed.serialize(), vector_data)
+        self.assertEqual(
+            self.basic.Vector.parse(vector_data[:-1], 0), ParseError.NOT_ENOUGH_DATA
+        )
+        negative = b"\xff\xff\xff\xff" + vector_data[4:]
+        self.assertEqual(self.basic.Vector.parse(negative, 0), ParseError.MALFORMED)
+
+        offset, view = check_parsed(self.basic.VectorView.parse(vector_data, 0))
+        self.assertTrue(numpy.array_equal(view.data, parsed.data))
+
+    def test_arrays(self) -> None:
+        arrays = self.basic.Arrays(
+            **{
+                fname: (
+                    [1, 2, 3] if fname in ["f_i8", "f_u8"] else numpy.array([1, 2, 3])
+                )
+                for fname in self.basic.Arrays.__dataclass_fields__
+            }
+        )
+        data = arrays.serialize()
+        offset, parsed = check_parsed(self.basic.Arrays.parse(data, 0))
+        self.assertEqual(offset, len(data))
+        self.assertEqual(parsed.f_bu64.tolist(), [1, 2, 3])
+        # Sequences of bytes are still bytes, or signed arrays for i8
+        self.assertEqual(parsed.f_u8, b"\x01\x02\x03")
+        self.assertEqual(parsed.f_i8.tolist(), [1, 2, 3])
+        self.assertEqual(parsed.serialize(), data)
+
+    def test_record_arrays(self) -> None:
+        fields = self.basic.Primitives.__dataclass_fields__
+        primitives = [
+            self.basic.Primitives(**{fname: i + 1 for fname in fields})
+            for i in range(3)
+        ]
+        data = bytearray(b"".join(p.serialize() for p in primitives))
+        records = self.basic.Primitives.frombuffer(data)
+        self.assertEqual(len(records), 3)
+        for fname in fields:
+            self.assertEqual(records[fname].tolist(), [1, 2, 3])
+        self.assertEqual(records.f_bu32[1], 2)
+
+        # The records are backed by the buffer
+        data[0] = 7
+        self.assertEqual(records.f_i8[0], 7)
+
+        pair = self.basic.CookieOrderPair(
+            self.basic.CookieOrder(5, self.basic.Flavor.CHOCOLATE),
+            self.basic.CookieOrder(6, self.basic.Flavor.VANILLA),
+        )
+        records = self.basic.CookieOrderPair.frombuffer(b"\0" + pair.serialize(), 1, 1)
+        self.assertEqual(records.order_1.quantity[0], 5)
+        self.assertEqual(records.order_2.flavor[0], self.basic.Flavor.VANILLA.value)
+
+        # Structs without a constant size have no dtype
+        self.assertFalse(hasattr(self.basic.Vector, "DTYPE"))
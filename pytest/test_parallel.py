@@ -0,0 +1,60 @@
+# Copyright 2020 Jacob Glueck
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from unittest import TestCase
+
+import os
+import tempfile
+import typing
+
+from takogen.test_types import Basic
+from tako.runtime.parallel import decode_file
+
+messages = [Basic.Vector(data=list(range(n % 7))) for n in range(100)]
+stream = b"".join(m.serialize() for m in messages)
+
+
+def total(vector: Basic.Vector) -> typing.Optional[Basic.CookieOrder]:
+    if not vector.data:
+        return None
+    return Basic.CookieOrder(sum(vector.data), Basic.Flavor.VANILLA)
+
+
+def length(vector: Basic.Vector) -> int:
+    return len(vector.data)
+
+
+class TestParallel(TestCase):
+    def setUp(self) -> None:
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "messages.log")
+        with open(self.path, "wb") as f:
+            f.write(stream)
+
+    def tearDown(self) -> None:
+        self.dir.cleanup()
+
+    def test_serialized_results(self) -> None:
+        results = list(
+            decode_file(
+                self.path, Basic.Vector, total, 2, result_type=Basic.CookieOrder
+            )
+        )
+        expected = [total(m) for m in messages if m.data]
+        self.assertEqual(results, expected)
+
+    def test_pickled_results(self) -> None:
+        for workers in [1, 3]:
+            results = list(decode_file(self.path, Basic.Vector, length, workers))
+            self.assertEqual(results, [len(m.data) for m in messages])
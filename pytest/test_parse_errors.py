@@ -52,3 +52,84 @@ class TestParseErrors(TestCase):
             Basic.ThingMsg.parse(string_to_short, 0), ParseError.NOT_ENOUGH_DATA
         )
         self.assertEqual(Basic.ThingMsg.parse(malformed, 0), ParseError.MALFORMED)
+
+    def test_parse_errors_cookie_order(self) -> None:
+        # fmt: off
+        data = bytes([
+            # quantity (li32) = 10,
+            0x0a, 0x00, 0x00, 0x00,
+            # flavor (Flavor) = VANILLA
+            0x00,
+        ])
+        bad_flavor = bytes([
+            # quantity (li32) = 10,
+            0x0a, 0x00, 0x00, 0x00,
+            # flavor (Flavor)
+            # NOTE NOT A VALID FLAVOR
+            0x07,
+        ])
+        # fmt: on
+        self.assertEqual(
+            Basic.CookieOrder.parse(data[:-1], 0), ParseError.NOT_ENOUGH_DATA
+        )
+        self.assertEqual(Basic.CookieOrder.parse(data, 1), ParseError.NOT_ENOUGH_DATA)
+        self.assertEqual(Basic.CookieOrder.parse(bad_flavor, 0), ParseError.MALFORMED)
+        self.assertEqual(
+            Basic.CookieOrder.parse(bytes([0xFF]) + data, 1),
+            (6, Basic.CookieOrder(quantity=10, flavor=Basic.Flavor.VANILLA)),
+        )
+
+    def test_malformed_before_truncated(self) -> None:
+        # A malformed field is reported before the end of the buffer, even if the
+        # fields after it are cut off
+        enums = Basic.Enums(
+            Basic.U8Enum.THING_1,
+            Basic.BU64Enum.THING_3,
+            [Basic.U8Enum.THING_0, Basic.U8Enum.THING_2, Basic.U8Enum.THING_3],
+            [Basic.BU64Enum.THING_2, Basic.BU64Enum.THING_0, Basic.BU64Enum.THING_1],
+        ).serialize()
+        bad_u8_enum = bytes([0x07]) + enums[1:]
+        self.assertEqual(Basic.Enums.parse(bad_u8_enum[:5], 0), ParseError.MALFORMED)
+        bad_array = enums[:10] + bytes([0x07]) + enums[11:]
+        self.assertEqual(Basic.Enums.parse(bad_array[:12], 0), ParseError.MALFORMED)
+        self.assertEqual(Basic.Enums.parse(enums[:12], 0), ParseError.NOT_ENOUGH_DATA)
+
+        orders = Basic.CookieOrderList(
+            [
+                Basic.CookieOrder(1, Basic.Flavor.VANILLA),
+                Basic.CookieOrder(2, Basic.Flavor.CHOCOLATE),
+            ]
+        ).serialize()
+        bad_flavor = orders[:8] + bytes([0x07]) + orders[9:]
+        self.assertEqual(
+            Basic.CookieOrderList.parse(bad_flavor[:-1], 0), ParseError.MALFORMED
+        )
+        self.assertEqual(
+            Basic.CookieOrderList.parse(orders[:-1], 0), ParseError.NOT_ENOUGH_DATA
+        )
+        self.assertEqual(
+            Basic.CookieOrder.parse_many(bad_flavor[4:-1]), ParseError.MALFORMED
+        )
+        self.assertEqual(
+            Basic.CookieOrder.parse_many(orders[4:-1]), ParseError.NOT_ENOUGH_DATA
+        )
+
+    def test_parse_errors_negative_length(self) -> None:
+        # fmt: off
+        person = bytes([
+            # name (External.String)
+            # len (li32)
+            # NOTE A NEGATIVE LENGTH
+            0xFF, 0xFF, 0xFF, 0xFF,
+            # data (Seq(i8, this.len))
+            98, 111, 98,
+            # age (li16)
+            0x04, 0x00,
+        ])
+        # fmt: on
+        self.assertEqual(Basic.Person.parse(person, 0), ParseError.MALFORMED)
+        self.assertEqual(
+            Basic.ThingMsg.parse(bytes([0x00]) + person, 0), ParseError.MALFORMED
+        )
+        self.assertEqual(Basic.Vector.parse(person, 0), ParseError.MALFORMED)
+        self.assertEqual(Basic.CookieOrderList.parse(person, 0), ParseError.MALFORMED)
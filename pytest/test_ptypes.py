@@ -17,9 +17,24 @@ from unittest import TestCase
 from takogen.tako import Ptypes
 from tako.runtime.ptypes_runtime import make_ptype_string, make_string
 
+from helpers import check_parsed
+
 
 class TestPtypes(TestCase):
     def test_ptype_string(self) -> None:
-        start = "hello world"
+        start = "hello wörld"
         x = make_ptype_string(Ptypes.StringL8, start)
         self.assertEqual(start, make_string(x))
+        offset, parsed = check_parsed(Ptypes.StringL8.parse(x.serialize(), 0))
+        self.assertEqual(parsed, x)
+        # Sequences of i8 are signed, and may be given as lists
+        self.assertEqual(parsed.data[7], -61)
+        self.assertEqual(Ptypes.StringL8(list(x.data)).serialize(), x.serialize())
+
+    def test_ptype_bytes(self) -> None:
+        x = Ptypes.BytesL16(b"\x00\xff")
+        data = x.serialize()
+        self.assertEqual(data, b"\x02\x00\x00\xff")
+        offset, parsed = check_parsed(Ptypes.BytesL16.parse(data, 0))
+        self.assertIsInstance(parsed.data, bytes)
+        self.assertEqual(parsed, x)
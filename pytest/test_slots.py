@@ -0,0 +1,84 @@
+# Copyright 2020 Jacob Glueck
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from unittest import TestCase
+from types import ModuleType
+
+import array
+import copy
+import dataclasses
+import pickle
+
+from helpers import check_parsed, generate_python
+
+
+class TestSlots(TestCase):
+    basic: ModuleType
+    external: ModuleType
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.basic = generate_python(
+            cls.addClassCleanup,
+            "takogen_slots",
+            ["test_types.basic.Basic", "test_types.external.External"],
+            "--slots",
+        )
+        cls.external = cls.basic.takogen_slots.test_types.External
+
+    def test_parse(self) -> None:
+        order = self.basic.CookieOrder(quantity=3, flavor=self.basic.Flavor.CHOCOLATE)
+        msg = self.basic.CookieOrderList(orders=[order, order])
+        offset, parsed = check_parsed(
+            self.basic.CookieOrderList.parse(msg.serialize(), 0)
+        )
+        self.assertEqual(parsed, msg)
+        self.assertEqual(parsed.orders[1].quantity, 3)
+        self.assertFalse(hasattr(parsed.orders[0], "__dict__"))
+
+    def test_frozen(self) -> None:
+        offset, parsed = check_parsed(
+            self.basic.CookieOrder.parse(b"\x01\x00\x00\x00\x00", 0)
+        )
+        with self.assertRaises(dataclasses.FrozenInstanceError):
+            parsed.quantity = 2
+        self.assertEqual(dataclasses.replace(parsed, quantity=2).quantity, 2)
+
+    def test_copy(self) -> None:
+        msg = self.basic.VectorPair(
+            v1=self.basic.Vector(data=[1, 2]), v2=self.basic.Vector(data=[])
+        )
+        self.assertEqual(copy.copy(msg), msg)
+        self.assertEqual(copy.deepcopy(msg), msg)
+        self.assertEqual(pickle.loads(pickle.dumps(msg)), msg)
+        empty = self.basic.Empty()
+        self.assertEqual(pickle.loads(pickle.dumps(empty)), empty)
+
+    def test_virtual(self) -> None:
+        data = bytes([2, 1, 2, 3, 4, 5, 6])
+        offset, parsed = check_parsed(self.basic.VarList.parse(data, 0))
+        self.assertEqual(
+            parsed.data(data, offset),
+            (7, [array.array("b", [1, 2, 3]), array.array("b", [4, 5, 6])]),
+        )
+
+        label = self.external.String(array.array("b", b"ab"))
+        msg = self.basic.LabeledVarList(rows=1, label=label)
+        offset, parsed = check_parsed(
+            self.basic.LabeledVarList.parse(msg.serialize(), 0)
+        )
+        self.assertEqual(parsed, msg)
+        self.assertEqual(
+            parsed.data(bytes([1, 2, 3]), 0), (3, [array.array("b", [1, 2, 3])])
+        )
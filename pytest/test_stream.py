@@ -0,0 +1,112 @@
+# Copyright 2020 Jacob Glueck
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from unittest import TestCase
+from types import ModuleType
+
+import typing as t
+
+from takogen.test_types import Basic
+from tako.runtime import MalformedMessage, StreamDecoder
+
+from helpers import generate_python
+
+
+def make_vector(n: int) -> Basic.Vector:
+    return Basic.Vector(data=list(range(n)))
+
+
+# Counts the calls to the parse of a generated struct
+class CountingParser:
+    def __init__(self, message_type: t.Any) -> None:
+        self.message_type = message_type
+        self.validate = message_type.validate
+        if hasattr(message_type, "SIZE_BYTES"):
+            self.SIZE_BYTES = message_type.SIZE_BYTES
+        self.parses = 0
+
+    def parse(self, buf: bytearray, offset: int) -> t.Any:
+        self.parses += 1
+        return self.message_type.parse(buf, offset)
+
+
+class TestStream(TestCase):
+    def test_chunks(self) -> None:
+        messages = [make_vector(n) for n in range(10)]
+        stream = b"".join(m.serialize() for m in messages)
+        for chunk_size in [1, 3, 7, len(stream)]:
+            decoder: StreamDecoder[Basic.Vector] = StreamDecoder(Basic.Vector)
+            decoded: t.List[Basic.Vector] = []
+            for i in range(0, len(stream), chunk_size):
+                decoded += decoder.feed(stream[i : i + chunk_size])
+            self.assertEqual(decoded, messages)
+            self.assertEqual(decoder.pending, 0)
+            self.assertEqual(decoder.offset, len(stream))
+
+    def test_pending(self) -> None:
+        data = make_vector(2).serialize()
+        decoder: StreamDecoder[Basic.Vector] = StreamDecoder(Basic.Vector)
+        self.assertEqual(list(decoder.feed(data + data[:5])), [make_vector(2)])
+        self.assertEqual(decoder.pending, 5)
+        self.assertEqual(list(decoder.feed(data[5:])), [make_vector(2)])
+
+    def test_malformed(self) -> None:
+        order = Basic.CookieOrder(quantity=1, flavor=Basic.Flavor.VANILLA)
+        data = order.serialize()
+        decoder: StreamDecoder[Basic.CookieOrder] = StreamDecoder(Basic.CookieOrder)
+        self.assertEqual(list(decoder.feed(data + data[:2])), [order])
+        with self.assertRaises(MalformedMessage) as context:
+            list(decoder.feed(data[2:4] + b"\x09"))
+        self.assertEqual(context.exception.offset, len(data))
+
+    def test_incomplete_not_parsed_again(self) -> None:
+        # An incomplete message is parsed again only once it may be complete
+        order = Basic.CookieOrder(quantity=1, flavor=Basic.Flavor.VANILLA)
+        messages: t.List[t.Any] = [make_vector(100), order]
+        for message in messages:
+            data = message.serialize()
+            parser = CountingParser(type(message))
+            decoder: StreamDecoder[t.Any] = StreamDecoder(parser)
+            decoded: t.List[t.Any] = []
+            for i in range(len(data)):
+                decoded += decoder.feed(data[i : i + 1])
+            self.assertEqual(decoded, [message])
+            # When the first byte arrives, when the message is complete, and at the
+            # end of the data
+            self.assertEqual(parser.parses, 3)
+
+
+class TestStreamMemoryview(TestCase):
+    basic: ModuleType
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.basic = generate_python(
+            cls.addClassCleanup,
+            "takogen_stream_memoryview",
+            ["test_types.basic.Basic", "test_types.external.External"],
+            "--memoryview",
+        )
+
+    def test_memoryview_messages(self) -> None:
+        # Decoded messages hold views of the buffer of the decoder, so it must
+        # never be resized
+        basic = self.basic
+        external = basic.takogen_stream_memoryview.test_types.External
+        person = basic.Person(name=external.String(data=b"bob"), age=4)
+        data = person.serialize()
+        decoder: StreamDecoder[t.Any] = StreamDecoder(basic.Person)
+        decoded = list(decoder.feed(data + data[:3]))
+        decoded += decoder.feed(data[3:])
+        self.assertEqual([bytes(p.name.data) for p in decoded], [b"bob", b"bob"])
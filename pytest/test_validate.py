@@ -0,0 +1,91 @@
+# Copyright 2020 Jacob Glueck
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from unittest import TestCase
+
+import array
+import typing as t
+
+from takogen.test_types import Basic
+from takogen.test_types import External
+from tako.runtime import ParseError
+
+
+class TestValidate(TestCase):
+    def test_validate(self) -> None:
+        orders = [
+            Basic.CookieOrder(quantity=i, flavor=Basic.Flavor.CHOCOLATE)
+            for i in range(3)
+        ]
+        messages: t.List[t.Any] = [
+            Basic.Box(length=1, width=2, height=3),
+            Basic.CookieOrderList(orders=orders),
+            Basic.Enums(
+                u8_enum=Basic.U8Enum.THING_3,
+                bu64_enum=Basic.BU64Enum.THING_1,
+                u8_enum_array=[Basic.U8Enum.THING_0] * 3,
+                bu64_enum_array=[Basic.BU64Enum.THING_2] * 3,
+            ),
+            Basic.VectorPair(Basic.Vector([1, 2]), Basic.Vector([3])),
+            Basic.TwoThingMsg(
+                thing1=Basic.Thing(
+                    Basic.Person(External.String(array.array("b", b"bob")), 4)
+                ),
+                thing2=Basic.Thing(Basic.Pencil(2, External.Color.VIOLET)),
+            ),
+        ]
+        for message in messages:
+            data = b"\xff" + message.serialize()
+            self.assertEqual(type(message).validate(data, 1), len(data))
+            # Truncated messages need more data, just like when parsing them
+            for end in range(1, len(data)):
+                self.assertEqual(
+                    type(message).validate(data[:end], 1), ParseError.NOT_ENOUGH_DATA
+                )
+
+    def test_validate_malformed(self) -> None:
+        order = Basic.CookieOrder(quantity=1, flavor=Basic.Flavor.VANILLA)
+        data = bytearray(Basic.CookieOrderList(orders=[order, order]).serialize())
+        data[-1] = 7
+        self.assertEqual(Basic.CookieOrderList.validate(data, 0), ParseError.MALFORMED)
+
+        thing = Basic.ThingMsg(Basic.Thing(Basic.Box(1, 2, 3)))
+        data = bytearray(thing.serialize())
+        self.assertEqual(Basic.ThingMsg.validate(data, 0), len(data))
+        data[0] = 3
+        self.assertEqual(Basic.ThingMsg.validate(data, 0), ParseError.MALFORMED)
+
+        # The length of a sequence is negative
+        negative = b"\xff\xff\xff\xff" + bytes(8)
+        self.assertEqual(Basic.Vector.validate(negative, 0), ParseError.MALFORMED)
+        self.assertEqual(
+            Basic.CookieOrderList.validate(negative, 0), ParseError.MALFORMED
+        )
+
+    def test_malformed_before_truncated(self) -> None:
+        # A malformed field is reported before the end of the buffer, like in parse
+        enums = bytearray(36)
+        enums[0] = 9
+        self.assertEqual(Basic.Enums.validate(enums[:5], 0), ParseError.MALFORMED)
+        order = Basic.CookieOrder(quantity=1, flavor=Basic.Flavor.VANILLA)
+        data = bytearray(Basic.CookieOrderList(orders=[order, order]).serialize())
+        data[8] = 7
+        for end in range(9, len(data)):
+            self.assertEqual(
+                Basic.CookieOrderList.parse(data[:end], 0), ParseError.MALFORMED
+            )
+            self.assertEqual(
+                Basic.CookieOrderList.validate(data[:end], 0), ParseError.MALFORMED
+            )
@@ -0,0 +1,136 @@
+# Copyright 2020 Jacob Glueck
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from unittest import TestCase
+from types import ModuleType
+
+import array
+
+from tako.runtime import ParseError
+
+from helpers import check_parsed, generate_python
+
+
+class TestViews(TestCase):
+    basic: ModuleType
+    external: ModuleType
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.basic = generate_python(
+            cls.addClassCleanup,
+            "takogen_views",
+            ["test_types.basic.Basic", "test_types.external.External"],
+            "--views",
+        )
+        cls.external = cls.basic.takogen_views.test_types.External
+
+    def test_primitive_fields(self) -> None:
+        order = self.basic.CookieOrder(quantity=-7, flavor=self.basic.Flavor.CHOCOLATE)
+        data = b"\x01" + order.serialize()
+        offset, view = check_parsed(self.basic.CookieOrderView.parse(data, 1))
+        self.assertEqual(offset, len(data))
+        self.assertEqual(view.size_bytes(), 5)
+        self.assertEqual(view.quantity, -7)
+        self.assertEqual(view.flavor, self.basic.Flavor.CHOCOLATE)
+        self.assertEqual(view.build(), order)
+
+    def test_lazy_decode(self) -> None:
+        order = self.basic.CookieOrder(quantity=1, flavor=self.basic.Flavor.VANILLA)
+        buf = bytearray(order.serialize())
+        offset, view = check_parsed(self.basic.CookieOrderView.parse(buf, 0))
+        # The field is decoded when it is read, not when the view is parsed
+        buf[0] = 2
+        self.assertEqual(view.quantity, 2)
+
+    def test_list(self) -> None:
+        orders = [
+            self.basic.CookieOrder(quantity=i, flavor=self.basic.Flavor.VANILLA)
+            for i in range(10)
+        ]
+        msg = self.basic.CookieOrderList(orders=orders)
+        offset, view = check_parsed(
+            self.basic.CookieOrderListView.parse(msg.serialize(), 0)
+        )
+        self.assertEqual(len(view.orders), 10)
+        self.assertEqual(view.orders[3].quantity, 3)
+        self.assertEqual(view.orders[-1].quantity, 9)
+        self.assertEqual([o.quantity for o in view.orders[2:4]], [2, 3])
+        self.assertEqual(view.build(), msg)
+
+    def test_dynamic_fields(self) -> None:
+        msg = self.basic.VectorPair(
+            v1=self.basic.Vector(data=[1, 2, 3]), v2=self.basic.Vector(data=[4, 5])
+        )
+        offset, view = check_parsed(self.basic.VectorPairView.parse(msg.serialize(), 0))
+        self.assertEqual(view.v1.data, [1, 2, 3])
+        self.assertEqual(view.v2.data, [4, 5])
+        self.assertEqual(view.size_bytes(), msg.size_bytes())
+
+        person = self.basic.Person(
+            name=self.external.String(data=array.array("b", b"bob")), age=4
+        )
+        msg = self.basic.ThingMsg(thing=self.basic.Thing(person))
+        offset, view = check_parsed(self.basic.ThingMsgView.parse(msg.serialize(), 0))
+        self.assertIsInstance(view.thing, self.basic.PersonView)
+        self.assertEqual(view.thing.name.data, array.array("b", b"bob"))
+        self.assertEqual(view.thing.age, 4)
+        self.assertEqual(view.build(), msg)
+
+    def test_nested_arrays(self) -> None:
+        msg = self.basic.Matrix(
+            data=[array.array("b", row) for row in [[1, 2, 3], [4, 5, 6], [-7, -8, -9]]]
+        )
+        offset, view = check_parsed(self.basic.MatrixView.parse(msg.serialize(), 0))
+        self.assertEqual(list(view.data[2]), [-7, -8, -9])
+        self.assertEqual(list(view.data), msg.data)
+
+    def test_virtual(self) -> None:
+        data = bytes([2, 1, 2, 3, 4, 5, 6])
+        offset, view = check_parsed(self.basic.VarListView.parse(data, 0))
+        self.assertEqual(offset, 1)
+        self.assertEqual(
+            view.data(data, offset),
+            (7, [array.array("b", [1, 2, 3]), array.array("b", [4, 5, 6])]),
+        )
+
+    def test_parse_errors(self) -> None:
+        data = self.basic.CookieOrderList(
+            orders=[
+                self.basic.CookieOrder(quantity=1, flavor=self.basic.Flavor.VANILLA)
+            ]
+        ).serialize()
+        self.assertEqual(
+            self.basic.CookieOrderListView.parse(data[:-1], 0),
+            ParseError.NOT_ENOUGH_DATA,
+        )
+        bad_flavor = data[:-1] + b"\x07"
+        self.assertEqual(
+            self.basic.CookieOrderListView.parse(bad_flavor, 0), ParseError.MALFORMED
+        )
+        enums = bytearray(36)
+        check_parsed(self.basic.EnumsView.parse(enums, 0))
+        # u8_enum_array[1]
+        enums[10] = 9
+        self.assertEqual(self.basic.EnumsView.parse(enums, 0), ParseError.MALFORMED)
+        # The length of a sequence is negative
+        vector = b"\xff\xff\xff\xff" + bytes(8)
+        self.assertEqual(self.basic.VectorView.parse(vector, 0), ParseError.MALFORMED)
+        self.assertEqual(
+            self.basic.CookieOrderListView.parse(vector, 0), ParseError.MALFORMED
+        )
+        # An invalid enum is reported before the end of the buffer
+        enums[10] = 0
+        enums[0] = 9
+        self.assertEqual(self.basic.EnumsView.parse(enums[:5], 0), ParseError.MALFORMED)
@@ -49,6 +49,16 @@ def valid_identifier(name: str) -> bool:
             "size_bytes",
             "serialize",
             "serialize_into",
+            "parse_many",
+            "iter_parse",
+            "frombuffer",
+            "validate",
+            "DTYPE",
+            "SIZE_BYTES",
+            "peek_tag",
+            "parse_as",
+            "to_json_obj",
+            "from_json_obj",
             # Language keywords
             "for",
             "while",
@@ -82,10 +92,13 @@ def valid_identifier(name: str) -> bool:
         ]
     )
     illegal_suffix = ("View", "Tag")
+    # Reserved for the field accessors of the code generators
+    illegal_prefix = ("get_", "set_")
     return (
         (name not in keywords)
         and (re.search(regex, name) is not None)
         and (not name.endswith(illegal_suffix))
+        and (not name.startswith(illegal_prefix))
     )
 
 
@@ -15,7 +15,10 @@
 import typing as t
 import dataclasses
 import argparse
+import ast
+import io
 import json
+import shutil
 from pathlib import Path
 from tako.util.qname import QName
 from tako.core.sir import Protocol, tir, kir, cir
@@ -30,22 +33,98 @@ import tako.core.size_types as st
 from tako.util.int_model import Sign, Endianness
 
 parse_error = "tako.runtime.ParseError"
+buffer_type = "tako.runtime.Buffer"
+
+
+@dataclasses.dataclass(frozen=True)
+class PythonOptions:
+    # Decode sequences of u8 and i8 as memoryview slices of the parsed buffer
+    memoryview: bool
+    # Generate a lazily decoded View class for each struct
+    views: bool
+    # Decode sequences of ints and floats as numpy arrays
+    numpy: bool
+    # Generate structs with __slots__, built by parse with a fast constructor
+    slots: bool
+    # Generate a package with a submodule for each type, imported when it is used
+    lazy: bool
+    # Store the bytes of a struct when it is first serialized, and copy them after
+    memoize: bool
+    # Generate conversions to and from JSON objects
+    json: bool
+
+    @staticmethod
+    def from_args(args: t.Any) -> "PythonOptions":
+        return PythonOptions(
+            memoryview=args.memoryview,
+            views=args.views,
+            numpy=args.numpy,
+            slots=args.slots,
+            lazy=args.lazy,
+            memoize=args.memoize,
+            json=args.json,
+        )
 
 
 class PythonGenerator(Generator):
     def configure_parser(self, parser: argparse.ArgumentParser) -> None:
-        pass
+        parser.add_argument(
+            "--memoryview",
+            action="store_true",
+            help="decode sequences of u8 and i8 as memoryview slices of the parsed buffer instead of copying them into bytes. "
+            "The slices keep the buffer alive, and a bytearray cannot be resized while they exist.",
+        )
+        parser.add_argument(
+            "--views",
+            action="store_true",
+            help="generate a View class for each struct, which validates a message once and decodes each field when it is read",
+        )
+        parser.add_argument(
+            "--numpy",
+            action="store_true",
+            help="decode sequences of ints and floats as numpy arrays in native byte order, copied from the buffer, instead of lists. "
+            "Generated code then depends on numpy, and structs holding arrays can no longer be compared with ==. "
+            "Sequences of u8 are still bytes and sequences of i8 are still signed arrays (array.array('b')), "
+            "or memoryviews with --memoryview.",
+        )
+        parser.add_argument(
+            "--slots",
+            action="store_true",
+            help="generate structs with __slots__ instead of a __dict__, which parse builds without the frozen dataclass __init__",
+        )
+        parser.add_argument(
+            "--lazy",
+            action="store_true",
+            help="generate each protocol as a package with a submodule for each type, which is imported when the type is first used. "
+            "Programs which only use a few types of a large protocol start faster.",
+        )
+        parser.add_argument(
+            "--memoize",
+            action="store_true",
+            help="store the serialized bytes of a struct on it the first time serialize is called, and copy them when it is serialized again, "
+            "on its own or as part of another struct. The sequences held by a serialized struct must then not be modified.",
+        )
+        parser.add_argument(
+            "--json",
+            action="store_true",
+            help="generate to_json_obj and from_json_obj, which convert messages to and from the objects of json.dumps and json.loads, "
+            "in the same JSON representation as the C++ generator",
+        )
 
     def generate_into(self, proto: Protocol, out_dir: Path, args: t.Any) -> None:
+        options = PythonOptions.from_args(args)
         # Helps mypy -- doing one big list concat doesn't work
         sections: t.List[pg.Node] = []
         sections += [
             pg.Raw(
                 """\
             # flake8: noqa
+            from __future__ import annotations
 
             import typing
             import abc
+            import array
+            import copy
             import struct
             import dataclasses
             import enum
@@ -53,31 +132,61 @@ class PythonGenerator(Generator):
             import tako.runtime"""
             )
         ]
+        if options.numpy:
+            sections += [pg.Raw("import numpy")]
         sections += [
             pg.Raw(f"import {python_module(ext)}")
             for ext in proto.types.external_protocols
         ]
         sections += [
+            pg.Raw(
+                """\
+            # Parsing context passed to field parsers of structs where no field
+            # depends on another. It is never written to.
+            _no_ctxt: typing.Dict[str, typing.Any] = {}"""
+            )
+        ]
+        constants = [
             constant.accept(RootConstantGenerator())
             for constant in proto.constants.constants.values()
         ]
-        sections += [
-            proto.types.types[name].accept_rtv(RootTypeGenerator())
+        types = [
+            proto.types.types[name].accept_rtv(RootTypeGenerator(options))
             for name in proto.types.own
         ]
-        sections += [
+        markers = [
             proto.types.types[name].accept_rtv(RootMarkerTypeGenerator())
             for name in proto.types.own
         ]
-        sections += gen_conversions(proto.name, proto.conversions.own)
+        conversions = gen_conversions(proto.name, options, proto.conversions.own)
 
         base_name = python_relative_path(proto.name)
         proto_file = out_dir / base_name
+        package_dir = proto_file.with_suffix("")
         proto_file.parent.mkdir(parents=True, exist_ok=True)
-        with proto_file.open("w") as out:
-            generated = pg.Section(sections)
-            printer = PrettyPrinter(4, out)
-            generated.pretty_printer(printer)
+        if options.lazy:
+            # Remove the output of a previous generation without --lazy
+            if proto_file.exists():
+                proto_file.unlink()
+            submodules: t.List[t.Tuple[str, pg.Node]] = [
+                (f"_{name.name()}", pg.Section([type_, marker]))
+                for name, type_, marker in zip(proto.types.own, types, markers)
+            ]
+            if conversions:
+                submodules.append(("_convert", pg.Section(conversions)))
+            write_lazy_package(
+                package_dir, pg.Section(sections), pg.Section(constants), submodules
+            )
+        else:
+            # Remove the output of a previous generation with --lazy, which would
+            # be imported instead
+            if (package_dir / "__init__.py").exists():
+                shutil.rmtree(package_dir)
+            with proto_file.open("w") as out:
+                render(
+                    pg.Section([*sections, *constants, *types, *markers, *conversions]),
+                    out,
+                )
 
         base_dir = base_name.parent
         while len(base_dir.parts) != 0:
@@ -93,6 +202,132 @@ class PythonGenerator(Generator):
         yield
 
 
+def render(node: pg.Node, out: t.TextIO) -> None:
+    printer = PrettyPrinter(4, out)
+    node.pretty_printer(printer)
+
+
+def render_str(node: pg.Node) -> str:
+    out = io.StringIO()
+    render(node, out)
+    return out.getvalue()
+
+
+# Writes a protocol as a package with the given submodules. Each submodule imports
+# the names it uses from the others, so importing one also imports the ones it
+# depends on. The package imports a submodule the first time a name it defines is
+# read (PEP 562).
+def write_lazy_package(
+    package_dir: Path,
+    header: pg.Node,
+    constants: pg.Node,
+    submodules: t.List[t.Tuple[str, pg.Node]],
+) -> None:
+    header_code = render_str(header)
+    constants_code = render_str(constants)
+    codes = [(module, render_str(node)) for module, node in submodules]
+    # The constants are defined in the package itself, which is imported as "."
+    defined = {"": defined_names(ast.parse(constants_code))}
+    for module, code in codes:
+        defined[module] = defined_names(ast.parse(code))
+    exports = [(name, module) for module, _ in codes for name in defined[module]]
+
+    package_dir.mkdir(parents=True, exist_ok=True)
+    for module, code in codes:
+        visitor = UsedNames()
+        visitor.visit(ast.parse(code))
+        own = set(defined[module])
+        imports = [
+            (other, sorted(visitor.names.intersection(names) - own))
+            for other, names in defined.items()
+            if other != module
+        ]
+        with (package_dir / f"{module}.py").open("w") as out:
+            out.write(header_code)
+            for other, names in imports:
+                if names:
+                    out.write(f"from .{other} import {', '.join(names)}\n")
+            out.write(code)
+
+    public = sorted(
+        name
+        for name in [*defined[""], *(name for name, _ in exports)]
+        if not name.startswith("_")
+    )
+    with (package_dir / "__init__.py").open("w") as out:
+        out.write(render_str(pg.Raw("""\
+            # flake8: noqa
+            from __future__ import annotations
+
+            import importlib
+            import typing""")))
+        out.write(constants_code)
+        out.write(
+            render_str(
+                gen_raw(
+                    """\
+            __all__ = [
+                {%- for name in public %}
+                "{{ name }}",
+                {%- endfor %}
+            ]
+            # The submodule which defines each name
+            _submodules: typing.Dict[str, str] = {
+                {%- for name, module in exports %}
+                "{{ name }}": "{{ module }}",
+                {%- endfor %}
+            }
+            def __getattr__(name: str) -> typing.Any:
+                module = _submodules.get(name)
+                if module is None:
+                    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+                value = getattr(importlib.import_module(f"{__name__}.{module}"), name)
+                globals()[name] = value
+                return value
+            def __dir__() -> typing.List[str]:
+                return sorted({*globals(), *_submodules})""",
+                    locals(),
+                )
+            )
+        )
+
+
+# The names defined at the top level of a module, in order
+def defined_names(module: ast.Module) -> t.List[str]:
+    names: t.Dict[str, None] = {}
+    for node in module.body:
+        if isinstance(node, (ast.ClassDef, ast.FunctionDef)):
+            names[node.name] = None
+        elif isinstance(node, ast.Assign):
+            for target in node.targets:
+                if isinstance(target, ast.Name):
+                    names[target.id] = None
+        elif isinstance(node, ast.AnnAssign) and isinstance(node.target, ast.Name):
+            names[node.target.id] = None
+    return list(names)
+
+
+# Finds the names a module reads when it runs. Annotations are skipped, because
+# they are not evaluated with "from __future__ import annotations".
+class UsedNames(ast.NodeVisitor):
+    def __init__(self) -> None:
+        self.names: t.Set[str] = set()
+
+    def visit_Name(self, node: ast.Name) -> None:
+        self.names.add(node.id)
+
+    def visit_arg(self, node: ast.arg) -> None:
+        pass
+
+    def visit_FunctionDef(self, node: ast.FunctionDef) -> None:
+        for child in [*node.decorator_list, node.args, *node.body]:
+            self.visit(child)
+
+    def visit_AnnAssign(self, node: ast.AnnAssign) -> None:
+        if node.value is not None:
+            self.visit(node.value)
+
+
 def python_module(qname: QName) -> QName:
     proto_name = qname.name()
     return qname.namespace().with_name(proto_name)
@@ -107,26 +342,60 @@ def python_relative_path(qname: QName) -> Path:
 
 @dataclasses.dataclass
 class RootTypeGenerator(tir.RootTypeVisitor[pg.Node]):
+    options: PythonOptions
+
     def visit_struct(self, root: tir.Struct) -> pg.Node:
         class_name = get_local_struct(root)
         pyfields = [
-            (fname, field.type_.accept(PythonType(root.name.namespace())))
+            (fname, field.type_.accept(PythonType(root.name.namespace(), self.options)))
             for fname, field in root.get_owned()
         ]
+        layout = fuse_fields(root)
+        slots = (
+            gen_slots(root, pyfields, self.options)
+            if self.options.slots
+            else (pg.Section([]), pg.Section([]))
+        )
+        view_class = (
+            gen_view_class(root, self.options, layout)
+            if self.options.views
+            else pg.Section([])
+        )
+        accessors = gen_field_accessors(root, self.options)
+        tag_peeker = gen_tag_peeker(root, self.options)
 
-        return pg.Class(
-            class_name,
-            pg.Section(
-                [
+        return pg.Section(
+            [
+                gen_struct_formats(layout),
+                accessors[0],
+                tag_peeker[0],
+                pg.Class(
+                    class_name,
                     pg.Section(
-                        [pg.Raw(f"{fname}: {pytype}") for fname, pytype in pyfields]
+                        [
+                            slots[0],
+                            pg.Section(
+                                [
+                                    pg.Raw(f"{fname}: {pytype}")
+                                    for fname, pytype in pyfields
+                                ]
+                            ),
+                            gen_parser(root, self.options, layout),
+                            gen_batch_parser(root, self.options, layout),
+                            tag_peeker[1],
+                            accessors[1],
+                            gen_validator(root, self.options, layout),
+                            gen_record_arrays(root, self.options),
+                            gen_serializer(root, self.options, layout),
+                            gen_sizer(root, self.options),
+                            gen_json(root, self.options),
+                        ]
                     ),
-                    gen_parser(root),
-                    gen_serializer(root),
-                    gen_sizer(root),
-                ]
-            ),
-            decorator="@dataclasses.dataclass(frozen=True)",
+                    decorator="@dataclasses.dataclass(frozen=True)",
+                ),
+                slots[1],
+                view_class,
+            ]
         )
 
     def visit_variant(self, root: tir.Variant) -> pg.Node:
@@ -138,12 +407,41 @@ class RootTypeGenerator(tir.RootTypeVisitor[pg.Node]):
             (
                 root.tags[variant],
                 vname,
-                variant.accept(PythonType(root.name.namespace())),
+                variant.accept(PythonType(root.name.namespace(), self.options)),
             )
             for variant, vname in get_visitor_info(root).items()
         ]
         variant_type_list = ", ".join([vtype for _, _, vtype in visitor_info])
-        tag_pytype = root.tag_type.accept(PythonType(root.name.namespace()))
+        tag_pytype = root.tag_type.accept(
+            PythonType(root.name.namespace(), self.options)
+        )
+        view_info = [
+            (root.tags[variant], get_view_pyname(variant, root.name.namespace()))
+            for variant in root.tags
+        ]
+        view_type_list = ", ".join([vtype for _, vtype in view_info])
+        # Dispatch tables, so dispatch costs the same for every type in the variant
+        tag_table = ", ".join(
+            [f"{vtype}: {tag_value}" for tag_value, _, vtype in visitor_info]
+        )
+        visitor_table = ", ".join(
+            [f'{vtype}: "{vname}"' for _, vname, vtype in visitor_info]
+        )
+        parser_table = ", ".join(
+            [f"{tag_value}: {vtype}.parse" for tag_value, _, vtype in visitor_info]
+        )
+        validator_table = ", ".join(
+            [f"{tag_value}: {vtype}.validate" for tag_value, _, vtype in visitor_info]
+        )
+        view_parser_table = ", ".join(
+            [f"{tag_value}: {vtype}.parse" for tag_value, vtype in view_info]
+        )
+        json_decoder_table = ", ".join(
+            [
+                f"{tag_value}: {vtype}.from_json_obj"
+                for tag_value, _, vtype in visitor_info
+            ]
+        )
 
         return gen_raw(
             """\
@@ -158,37 +456,71 @@ class RootTypeGenerator(tir.RootTypeVisitor[pg.Node]):
         class {{ class_name }}:
             value: typing.Union[{{ variant_type_list }}]
             types: typing.ClassVar[typing.List[typing.Type]] = [{{ variant_type_list }}]
+            # The tag of each type of value
+            TAGS: typing.ClassVar[typing.Dict[typing.Type, {{ tag_pytype }}]] = {{ "{" }}{{ tag_table }}{{ "}" }}
+            _visitors: typing.ClassVar[typing.Dict[typing.Type, str]] = {{ "{" }}{{ visitor_table }}{{ "}" }}
+            _parsers: typing.ClassVar[typing.Dict[{{ tag_pytype }}, typing.Callable[[{{ buffer_type }}, int], typing.Any]]] = {{ "{" }}{{ parser_table }}{{ "}" }}
+            _validators: typing.ClassVar[typing.Dict[{{ tag_pytype }}, typing.Callable[[{{ buffer_type }}, int], typing.Union[{{ parse_error }}, int]]]] = {{ "{" }}{{ validator_table }}{{ "}" }}
+            {%- if this.options.views %}
+            _view_parsers: typing.ClassVar[typing.Dict[{{ tag_pytype }}, typing.Callable[[{{ buffer_type }}, int], typing.Any]]] = {{ "{" }}{{ view_parser_table }}{{ "}" }}
+            {%- endif %}
+            {%- if this.options.json %}
+            _json_decoders: typing.ClassVar[typing.Dict[{{ tag_pytype }}, typing.Callable[[typing.Any], typing.Any]]] = {{ "{" }}{{ json_decoder_table }}{{ "}" }}
+            {%- endif %}
             def accept(self, visitor: {{ visitor_name }}[{{ type_var_name }}]) -> {{ type_var_name }}:
-                {%- for tag_value, vname, vtype in visitor_info %}
-                if isinstance(self.value, {{ vtype }}):
-                    return visitor.{{ vname }}(self.value)
-                    return
-                {%- endfor %}
-                raise ValueError('Variant held illegal type')
+                vname = {{ class_name }}._visitors.get(type(self.value))
+                if vname is None:
+                    raise ValueError('Variant held illegal type')
+                return getattr(visitor, vname)(self.value)
             def tag(self) -> {{ tag_pytype }}:
-                {%- for tag_value, vname, vtype in visitor_info %}
-                if isinstance(self.value, {{ vtype }}):
-                    return {{ tag_value }}
-                {%- endfor %}
-                raise ValueError('Variant held illegal type')
+                tag = {{ class_name }}.TAGS.get(type(self.value))
+                if tag is None:
+                    raise ValueError('Variant held illegal type')
+                return tag
             @staticmethod
-            def parse(buf: bytes, offset: int, tag: {{ tag_pytype }}) -> typing.Union[{{ parse_error }}, typing.Tuple[int, '{{ class_name }}']]:
-                value: typing.Union[{{ variant_type_list }}]
-                {%- for tag_value, vname, vtype in visitor_info %}
-                if tag == {{ tag_value }}:
-                    value_inner_{{ loop.index0 }} = {{ vtype }}.parse(buf, offset)
-                    if isinstance(value_inner_{{ loop.index0 }}, {{ parse_error }}):
-                        return value_inner_{{ loop.index0 }}
-                    offset, value = value_inner_{{ loop.index0 }}
-                    return offset, {{ class_name }}(value)
-                {%- endfor %}
-                return {{ parse_error }}.MALFORMED
+            def parse(buf: {{ buffer_type }}, offset: int, tag: {{ tag_pytype }}) -> typing.Union[{{ parse_error }}, typing.Tuple[int, '{{ class_name }}']]:
+                parser = {{ class_name }}._parsers.get(tag)
+                if parser is None:
+                    return {{ parse_error }}.MALFORMED
+                result = parser(buf, offset)
+                if isinstance(result, {{ parse_error }}):
+                    return result
+                return result[0], {{ class_name }}(result[1])
+            @staticmethod
+            def validate(buf: {{ buffer_type }}, offset: int, tag: {{ tag_pytype }}) -> typing.Union[{{ parse_error }}, int]:
+                validator = {{ class_name }}._validators.get(tag)
+                if validator is None:
+                    return {{ parse_error }}.MALFORMED
+                return validator(buf, offset)
+            {%- if this.options.views %}
+            @staticmethod
+            def parse_view(buf: {{ buffer_type }}, offset: int, tag: {{ tag_pytype }}) -> typing.Union[{{ parse_error }}, typing.Tuple[int, typing.Union[{{ view_type_list }}]]]:
+                parser = {{ class_name }}._view_parsers.get(tag)
+                if parser is None:
+                    return {{ parse_error }}.MALFORMED
+                return parser(buf, offset)
+            {%- endif %}
             def serialize_into(self, buf: bytearray, offset: int) -> int:
                 return self.value.serialize_into(buf, offset)
             def serialize(self) -> bytearray:
                 return self.value.serialize()
             def size_bytes(self) -> int:
-                return self.value.size_bytes()""",
+                return self.value.size_bytes()
+            {%- if this.options.json %}
+            # The JSON object of a variant is the object of its value, since the tag
+            # is a field of the enclosing struct
+            def to_json_obj(self) -> typing.Dict[str, typing.Any]:
+                return self.value.to_json_obj()
+            @staticmethod
+            def from_json_obj(obj: typing.Any, tag: {{ tag_pytype }}) -> typing.Union[{{ parse_error }}, '{{ class_name }}']:
+                decoder = {{ class_name }}._json_decoders.get(tag)
+                if decoder is None:
+                    return {{ parse_error }}.MALFORMED
+                result = decoder(obj)
+                if isinstance(result, {{ parse_error }}):
+                    return result
+                return {{ class_name }}(result)
+            {%- endif %}""",
             locals(),
         )
 
@@ -203,67 +535,417 @@ class RootTypeGenerator(tir.RootTypeVisitor[pg.Node]):
             {%- endfor %}
             @staticmethod
             def from_int(value: int) -> typing.Union[{{ parse_error }}, '{{ class_name }}']:
-                try:
-                    return {{ class_name }}(value)
-                except ValueError:
-                    return {{ parse_error }}.MALFORMED""",
+                return _{{ class_name }}_values.get(value, {{ parse_error }}.MALFORMED)
+        # Built here because a dict in the class body would become a member
+        _{{ class_name }}_values: typing.Dict[int, {{ class_name }}] = {member.value: member for member in {{ class_name }}}""",
             locals(),
         )
 
 
-def gen_parser(struct: tir.Struct) -> pg.Node:
+@dataclasses.dataclass
+class FusedRun:
+    # A run of consecutive fixed size primitive (int, float, or enum) fields which
+    # are parsed with a single precompiled module level struct.Struct.
+    # All the fields in a run share the same byte order, because a struct format
+    # can only have one.
+    struct_name: str
+    fmt: str
+    size: int
+    fields: t.List[t.Tuple[str, tir.Field]]
+
+
+# Each non-virtual field of a struct is either part of a fused run, or is handled
+# on its own.
+FieldLayout = t.List[t.Union[FusedRun, t.Tuple[str, tir.Field]]]
+
+
+def fuse_fields(struct: tir.Struct) -> FieldLayout:
     class_name = get_local_struct(struct)
+    result: FieldLayout = []
+
+    run_fields: t.List[t.Tuple[str, tir.Field]] = []
+    run_codes: t.List[str] = []
+    run_endianness: t.Optional[Endianness] = None
+    run_size = 0
+    num_runs = 0
+
+    def finish_run() -> None:
+        nonlocal run_fields, run_codes, run_endianness, run_size, num_runs
+        if run_fields:
+            endianness_prefix = struct_pack_endianness(
+                run_endianness or Endianness.LITTLE
+            )
+            result.append(
+                FusedRun(
+                    f"_{class_name}_struct{num_runs}",
+                    endianness_prefix + "".join(run_codes),
+                    run_size,
+                    run_fields,
+                )
+            )
+            num_runs += 1
+        run_fields = []
+        run_codes = []
+        run_endianness = None
+        run_size = 0
 
-    parser_parts: t.List[pg.Node] = []
-    helpers: t.List[pg.Node] = []
-    parser_parts.append(
+    for fname, field in struct.get_non_virtual():
+        code = field.type_.accept(StructFormatCode())
+        if code is None:
+            finish_run()
+            result.append((fname, field))
+            continue
+        endianness, fmt = code
+        if (
+            endianness is not None
+            and run_endianness is not None
+            and endianness != run_endianness
+        ):
+            finish_run()
+        run_endianness = run_endianness or endianness
+        run_fields.append((fname, field))
+        run_codes.append(fmt)
+        run_size += checked_cast(st.Constant, field.type_.size).value
+    finish_run()
+
+    return result
+
+
+def group_fused_runs(
+    layout: FieldLayout,
+) -> t.List[t.Union[t.List[FusedRun], t.Tuple[str, tir.Field]]]:
+    # Groups consecutive fused runs into blocks, which have a constant size
+    # and a constant offset from the start of the block for each run.
+    blocks: t.List[t.Union[t.List[FusedRun], t.Tuple[str, tir.Field]]] = []
+    for part in layout:
+        if isinstance(part, FusedRun):
+            last = blocks[-1] if blocks else None
+            if isinstance(last, list):
+                last.append(part)
+            else:
+                blocks.append([part])
+        else:
+            blocks.append(part)
+    return blocks
+
+
+@dataclasses.dataclass
+class TruncatedEnumCheck:
+    # An enum of a block of fused runs, which ends at end in the block, and is read
+    # on its own with read_expr
+    fname: str
+    end: int
+    read_expr: str
+    values: str
+
+
+# Returns the expression reading an int (or the value of an enum) on its own from
+# the bytes at [start, end) after _offset in _buf
+def int_from_bytes_expr(type_: tir.Type, start: int, end: int) -> str:
+    int_type = type_.underlying_type if isinstance(type_, tir.Enum) else type_
+    int_type = checked_cast(tir.Int, int_type)
+    byteorder = "big" if int_type.endianness == Endianness.BIG else "little"
+    signed = int_type.sign == Sign.SIGNED
+    return f"int.from_bytes(_buf[_offset + {start}:_offset + {end}], '{byteorder}', signed={signed})"
+
+
+# Returns the enums of a block of fused runs which are checked when the block is
+# cut off by the end of the buffer. Each field parsed on its own reports a
+# malformed enum before the end of the buffer as MALFORMED, so the enums which
+# end before the end of the block are checked in order, before the block returns
+# NOT_ENOUGH_DATA.
+def truncated_enum_checks(
+    block: t.List[FusedRun], current_proto: QName
+) -> t.List[TruncatedEnumCheck]:
+    block_size = sum(run.size for run in block)
+    checks = []
+    start = 0
+    for run in block:
+        for fname, field in run.fields:
+            end = start + checked_cast(st.Constant, field.type_.size).value
+            if isinstance(field.type_, tir.Enum) and end < block_size:
+                checks.append(
+                    TruncatedEnumCheck(
+                        fname,
+                        end,
+                        int_from_bytes_expr(field.type_, start, end),
+                        get_enum_values_name(field.type_, current_proto),
+                    )
+                )
+            start = end
+    return checks
+
+
+def gen_struct_formats(layout: FieldLayout) -> pg.Node:
+    return pg.Section(
+        [
+            pg.Raw(f"{part.struct_name} = struct.Struct('{part.fmt}')")
+            for part in layout
+            if isinstance(part, FusedRun)
+        ]
+    )
+
+
+# Returns the byte order (None if it does not matter) and the struct format code
+# for types which can be part of a fused run, and None for all other types.
+@dataclasses.dataclass
+class StructFormatCode(
+    tir.TypeVisitor[t.Optional[t.Tuple[t.Optional[Endianness], str]]]
+):
+    def visit_int(
+        self, type_: tir.Int
+    ) -> t.Optional[t.Tuple[t.Optional[Endianness], str]]:
+        endianness = type_.endianness if type_.width > 1 else None
+        return endianness, int_struct_pack_code(type_)
+
+    def visit_float(
+        self, type_: tir.Float
+    ) -> t.Optional[t.Tuple[t.Optional[Endianness], str]]:
+        return type_.endianness, float_struct_pack_width(type_.width)
+
+    def visit_array(
+        self, type_: tir.Array
+    ) -> t.Optional[t.Tuple[t.Optional[Endianness], str]]:
+        return None
+
+    def visit_vector(
+        self, type_: tir.Vector
+    ) -> t.Optional[t.Tuple[t.Optional[Endianness], str]]:
+        return None
+
+    def visit_list(
+        self, type_: tir.List
+    ) -> t.Optional[t.Tuple[t.Optional[Endianness], str]]:
+        return None
+
+    def visit_detached_variant(
+        self, type_: tir.DetachedVariant
+    ) -> t.Optional[t.Tuple[t.Optional[Endianness], str]]:
+        return None
+
+    def visit_virtual(
+        self, type_: tir.Virtual
+    ) -> t.Optional[t.Tuple[t.Optional[Endianness], str]]:
+        return None
+
+    def visit_struct(
+        self, root: tir.Struct
+    ) -> t.Optional[t.Tuple[t.Optional[Endianness], str]]:
+        return None
+
+    def visit_variant(
+        self, root: tir.Variant
+    ) -> t.Optional[t.Tuple[t.Optional[Endianness], str]]:
+        raise InternalError()
+
+    def visit_enum(
+        self, root: tir.Enum
+    ) -> t.Optional[t.Tuple[t.Optional[Endianness], str]]:
+        return self.visit_int(root.underlying_type)
+
+
+# Returns the __slots__ declaration of a slotted struct, and its fast constructor,
+# which is defined after the struct.
+# The constructor sets each slot through its descriptor, which skips the
+# __setattr__ of the frozen dataclass, so it is only used for new objects.
+def gen_slots(
+    struct: tir.Struct, pyfields: t.List[t.Tuple[str, str]], options: PythonOptions
+) -> t.Tuple[pg.Node, pg.Node]:
+    class_name = get_local_struct(struct)
+    fnames = [fname for fname, _ in pyfields]
+    # Structs with a dynamic size also have a slot for their cached size, and
+    # with --memoize, structs have a slot for their serialized bytes
+    slots = fnames + (["_size_bytes"] if isinstance(struct.size, st.Dynamic) else [])
+    slots += ["_serialized"] if options.memoize else []
+    return (
+        pg.Raw(f"__slots__ = {tuple(slots)!r}"),
         gen_raw(
             """\
-        _ctxt: typing.Dict[str, typing.Any] = {}
-    """,
+        {%- for fname in fnames %}
+        _{{ class_name }}_set_{{ fname }} = {{ class_name }}.__dict__["{{ fname }}"].__set__
+        {%- endfor %}
+        def _{{ class_name }}_new({% for fname, pytype in pyfields %}{{ fname }}: {{ pytype }}{{ ", " if not loop.last }}{% endfor %}) -> {{ class_name }}:
+            self = object.__new__({{ class_name }})
+            {%- for fname in fnames %}
+            _{{ class_name }}_set_{{ fname }}(self, {{ fname }})
+            {%- endfor %}
+            return self""",
             locals(),
+        ),
+    )
+
+
+# Returns a dict of the owned fields of obj, which is used as the context of virtual
+# field parsers
+def owned_ctxt_expr(struct: tir.Struct, obj: str) -> str:
+    items = ", ".join(f'"{fname}": {obj}.{fname}' for fname, _ in struct.get_owned())
+    return f"{{{items}}}"
+
+
+def gen_parser(
+    struct: tir.Struct, options: PythonOptions, layout: FieldLayout
+) -> pg.Node:
+    class_name = get_local_struct(struct)
+
+    parser_parts: t.List[pg.Node] = []
+    helpers: t.List[pg.Node] = []
+
+    # Constant size structs can cache the messages they parse, unless the
+    # messages may reference the buffer or be modified, since cached messages are
+    # shared
+    size = struct.size.value if isinstance(struct.size, st.Constant) else 0
+    cached = size != 0 and not has_mutable_sequences(struct, options)
+    if cached:
+        helpers.append(
+            gen_raw(
+                """\
+            # A tako.runtime.DecodeCache, set by tako.runtime.enable_decode_cache. It
+            # is not annotated, so it is not listed in the fields of the dataclass.
+            _decode_cache = None""",
+                locals(),
+            )
+        )
+        parser_parts.append(
+            gen_raw(
+                """\
+            if {{ class_name }}._decode_cache is not None:
+                _cached = {{ class_name }}._decode_cache.get(_buf, _offset)
+                if _cached is not None:
+                    return _offset + {{ size }}, _cached""",
+                locals(),
+            )
         )
+
+    # The context is only needed if some field (a sequence length or variant tag)
+    # is needed to parse another field.
+    needs_ctxt = any(
+        field.master_field is not None for _, field in struct.get_non_virtual()
     )
+    if needs_ctxt:
+        ctxt_expr = "_ctxt"
+        parser_parts.append(pg.Raw("_ctxt: typing.Dict[str, typing.Any] = {}"))
+    else:
+        ctxt_expr = "_no_ctxt"
+
+    def dst_expr(fname: str, field: tir.Field) -> str:
+        # If the field is a dependent field, parse it, but store the value in the
+        # context dictionary -- the class itself doesn't store it
+        if field.master_field is not None:
+            return f'_ctxt["{fname}"]'
+        else:
+            return fname
+
     for fname, field in struct.fields.items():
-        pname, fhelpers = field.type_.accept(
-            FieldParserGenerator(struct.name.namespace(), class_name, fname)
-        )
-        helpers.append(fhelpers)
         # If the field is virtual expose the parsing function
         if isinstance(field.type_, tir.Virtual):
-            pytype = field.type_.accept(PythonType(struct.name.namespace()))
-            # self.__dict__ is the context -- the struct itself is the context
+            pname, fhelpers = field.type_.accept(
+                FieldParserGenerator(
+                    struct.name.namespace(), options, class_name, fname
+                )
+            )
+            helpers.append(fhelpers)
+            pytype = field.type_.accept(PythonType(struct.name.namespace(), options))
+            # self.__dict__ is the context -- the struct itself is the context.
+            # Slotted structs have no __dict__, so the context is built from their fields.
+            virtual_ctxt_expr = (
+                owned_ctxt_expr(struct, "self") if options.slots else "self.__dict__"
+            )
             helpers.append(
                 gen_raw(
                     """\
-                def {{ fname }}(self, buf: bytes, offset: int) -> typing.Union[{{ parse_error }}, typing.Tuple[int, {{ pytype }}]]:
-                    return {{ class_name }}.{{ pname }}(buf, offset, self.__dict__)""",
+                def {{ fname }}(self, buf: {{ buffer_type }}, offset: int) -> typing.Union[{{ parse_error }}, typing.Tuple[int, {{ pytype }}]]:
+                    return {{ class_name }}.{{ pname }}(buf, offset, {{ virtual_ctxt_expr }})""",
+                    locals(),
+                )
+            )
+
+    # Consecutive fused runs share a single bounds check
+    for block in group_fused_runs(layout):
+        if isinstance(block, list):
+            block_size = sum(run.size for run in block)
+            unpacks = []
+            conversions = []
+            run_offset = 0
+            for run in block:
+                targets = []
+                for fname, field in run.fields:
+                    if isinstance(field.type_, tir.Enum):
+                        targets.append(f"_{fname}_raw")
+                        conversions.append(
+                            (
+                                fname,
+                                dst_expr(fname, field),
+                                get_enum_values_name(
+                                    field.type_, struct.name.namespace()
+                                ),
+                            )
+                        )
+                    else:
+                        targets.append(dst_expr(fname, field))
+                offset_expr = (
+                    f"_offset + {run_offset}" if run_offset != 0 else "_offset"
+                )
+                # A single target still has to be unpacked from a tuple
+                target_expr = ", ".join(targets) + ("," if len(targets) == 1 else "")
+                unpacks.append((run.struct_name, target_expr, offset_expr))
+                run_offset += run.size
+            truncated_checks = truncated_enum_checks(block, struct.name.namespace())
+            parser_parts.append(
+                gen_raw(
+                    """\
+                if _offset + {{ block_size }} > len(_buf):
+                    {%- for check in truncated_checks %}
+                    if _offset + {{ check.end }} > len(_buf):
+                        return {{ parse_error }}.NOT_ENOUGH_DATA
+                    if {{ check.read_expr }} not in {{ check.values }}:
+                        return {{ parse_error }}.MALFORMED
+                    {%- endfor %}
+                    return {{ parse_error }}.NOT_ENOUGH_DATA
+                {%- for struct_name, targets, offset_expr in unpacks %}
+                {{ targets }} = {{ struct_name }}.unpack_from(_buf, {{ offset_expr }})
+                {%- endfor %}
+                {%- for fname, dst, values in conversions %}
+                {{ dst }} = {{ values }}.get(_{{ fname }}_raw)
+                if {{ dst }} is None:
+                    return {{ parse_error }}.MALFORMED
+                {%- endfor %}
+                _offset += {{ block_size }}""",
                     locals(),
                 )
             )
         else:
-            # If the field is a dependent field, parse it, but store the value in the
-            # context dictionary -- the class itself doesn't store it
-            if field.master_field is not None:
-                dst_expr = f'_ctxt["{fname}"]'
-            else:
-                dst_expr = fname
+            fname, field = block
+            pname, fhelpers = field.type_.accept(
+                FieldParserGenerator(
+                    struct.name.namespace(), options, class_name, fname
+                )
+            )
+            helpers.append(fhelpers)
+            field_dst_expr = dst_expr(fname, field)
             parser_parts.append(
                 gen_raw(
                     """\
-                _{{ fname }}_inner = {{ class_name }}.{{ pname }}(_buf, _offset, _ctxt)
+                _{{ fname }}_inner = {{ class_name }}.{{ pname }}(_buf, _offset, {{ ctxt_expr }})
                 if isinstance(_{{ fname }}_inner, {{ parse_error }}):
                     return _{{ fname }}_inner
-                _offset, {{ dst_expr }} = _{{ fname }}_inner""",
+                _offset, {{ field_dst_expr }} = _{{ fname }}_inner""",
                     locals(),
                 )
             )
 
     owned = [owned_fname for owned_fname, _ in struct.get_owned()]
+    constructor = f"_{class_name}_new" if options.slots else class_name
     parser_parts.append(
         gen_raw(
             """\
-        return _offset, {{ class_name }}({{ owned|join(', ') }})""",
+        {%- if cached %}
+        _result = {{ constructor }}({{ owned|join(', ') }})
+        if {{ class_name }}._decode_cache is not None:
+            {{ class_name }}._decode_cache.put(_buf, _offset - {{ size }}, _result)
+        return _offset, _result
+        {%- else %}
+        return _offset, {{ constructor }}({{ owned|join(', ') }})
+        {%- endif %}""",
             locals(),
         )
     )
@@ -271,7 +953,7 @@ def gen_parser(struct: tir.Struct) -> pg.Node:
     helpers.append(
         pg.Function(
             "parse",
-            [(pg.Type("bytes"), "_buf"), (pg.Type("int"), "_offset")],
+            [(pg.Type(buffer_type), "_buf"), (pg.Type("int"), "_offset")],
             pg.Type(
                 f"typing.Union[{ parse_error }, typing.Tuple[int, '{class_name}']]"
             ),
@@ -283,11 +965,38 @@ def gen_parser(struct: tir.Struct) -> pg.Node:
     return pg.Section(helpers)
 
 
+# Whether a message of the type may hold a sequence
+# Whether messages of type_ hold sequences which can be modified or reference the
+# parsed buffer. Only sequences of u8 are decoded as immutable bytes, and not with
+# --memoryview.
+def has_mutable_sequences(type_: tir.Type, options: PythonOptions) -> bool:
+    if isinstance(type_, (tir.Array, tir.Vector, tir.List)):
+        return (
+            options.memoryview
+            or not is_byte(type_.inner)
+            or checked_cast(tir.Int, type_.inner).sign == Sign.SIGNED
+        )
+    elif isinstance(type_, tir.Virtual):
+        return has_mutable_sequences(type_.inner, options)
+    elif isinstance(type_, tir.Struct):
+        return any(
+            has_mutable_sequences(field.type_, options)
+            for field in type_.fields.values()
+        )
+    elif isinstance(type_, tir.DetachedVariant):
+        return any(
+            has_mutable_sequences(member, options) for member in type_.variant.tags
+        )
+    else:
+        return False
+
+
 @dataclasses.dataclass
 class FieldParserGenerator(
     tir.TypeVisitor[t.Tuple[str, pg.Node]], tir.LengthVisitor[str]
 ):
     current_proto: QName
+    options: PythonOptions
     class_name: str
     fname: str
     num: int = 0
@@ -314,7 +1023,7 @@ class FieldParserGenerator(
     def visit_detached_variant(
         self, type_: tir.DetachedVariant
     ) -> t.Tuple[str, pg.Node]:
-        pytype = type_.accept(PythonType(self.current_proto))
+        pytype = type_.accept(PythonType(self.current_proto, self.options))
         pname = self.alloc_parse_function()
         tag_expr = self.handle_field_reference(type_.tag)
 
@@ -323,7 +1032,7 @@ class FieldParserGenerator(
             gen_raw(
                 """\
             @staticmethod
-            def {{ pname }}(buf: bytes, offset: int, ctxt: typing.Dict[str, typing.Any]) -> typing.Union[{{ parse_error }}, typing.Tuple[int, {{ pytype }}]]:
+            def {{ pname }}(buf: {{ buffer_type }}, offset: int, ctxt: typing.Dict[str, typing.Any]) -> typing.Union[{{ parse_error }}, typing.Tuple[int, {{ pytype }}]]:
                 return {{ pytype }}.parse(buf, offset, {{ tag_expr }})""",
                 locals(),
             ),
@@ -333,14 +1042,14 @@ class FieldParserGenerator(
         return type_.inner.accept(self)
 
     def visit_struct(self, root: tir.Struct) -> t.Tuple[str, pg.Node]:
-        pytype = root.accept(PythonType(self.current_proto))
+        pytype = root.accept(PythonType(self.current_proto, self.options))
         pname = self.alloc_parse_function()
         return (
             pname,
             gen_raw(
                 """\
             @staticmethod
-            def {{ pname }}(buf: bytes, offset: int, ctxt: typing.Dict[str, typing.Any]) -> typing.Union[{{ parse_error }}, typing.Tuple[int, {{ pytype }}]]:
+            def {{ pname }}(buf: {{ buffer_type }}, offset: int, ctxt: typing.Dict[str, typing.Any]) -> typing.Union[{{ parse_error }}, typing.Tuple[int, {{ pytype }}]]:
                 return {{ pytype }}.parse(buf, offset)""",
                 locals(),
             ),
@@ -350,7 +1059,7 @@ class FieldParserGenerator(
         raise InternalError()
 
     def visit_enum(self, root: tir.Enum) -> t.Tuple[str, pg.Node]:
-        pytype = root.accept(PythonType(self.current_proto))
+        pytype = root.accept(PythonType(self.current_proto, self.options))
         return self.handle_int_like(
             root,
             int_struct_pack_format(root.underlying_type),
@@ -378,7 +1087,7 @@ class FieldParserGenerator(
         self, type_: tir.Type, pack_expr: str, conversion_func: t.Optional[str] = None
     ) -> t.Tuple[str, pg.Node]:
         pname = self.alloc_parse_function()
-        pytype = type_.accept(PythonType(self.current_proto))
+        pytype = type_.accept(PythonType(self.current_proto, self.options))
         size = checked_cast(st.Constant, type_.size).value
 
         return (
@@ -386,11 +1095,11 @@ class FieldParserGenerator(
             gen_raw(
                 """\
             @staticmethod
-            def {{ pname }}(buf: bytes, offset: int, ctxt: typing.Dict[str, typing.Any]) -> typing.Union[{{ parse_error }}, typing.Tuple[int, {{ pytype }}]]:
+            def {{ pname }}(buf: {{ buffer_type }}, offset: int, ctxt: typing.Dict[str, typing.Any]) -> typing.Union[{{ parse_error }}, typing.Tuple[int, {{ pytype }}]]:
                 end = offset + {{ size }}
                 if end > len(buf):
                     return {{ parse_error }}.NOT_ENOUGH_DATA
-                value = struct.unpack('{{ pack_expr }}', buf[offset:end])[0]
+                value = struct.unpack_from('{{ pack_expr }}', buf, offset)[0]
                 {%- if conversion_func is none %}
                 return offset + {{ size }}, value
                 {%- else %}
@@ -408,10 +1117,120 @@ class FieldParserGenerator(
         self, seq: tir.Type, inner: tir.Type, length_expr: str
     ) -> t.Tuple[str, pg.Node]:
         pname = self.alloc_parse_function()
-        inner_pname, inner_helpers = inner.accept(self)
+        pytype = seq.accept(PythonType(self.current_proto, self.options))
+
+        variable_length = has_variable_length(seq)
+
+        dtype = numpy_dtype(self.options, inner)
+        if dtype is not None:
+            size = checked_cast(st.Constant, inner.size).value
+            return (
+                pname,
+                gen_raw(
+                    """\
+                @staticmethod
+                def {{ pname }}(buf: {{ buffer_type }}, offset: int, ctxt: typing.Dict[str, typing.Any]) -> typing.Union[{{ parse_error }}, typing.Tuple[int, {{ pytype }}]]:
+                    count = {{ length_expr }}
+                    {%- if variable_length %}
+                    if count < 0:
+                        return {{ parse_error }}.MALFORMED
+                    {%- endif %}
+                    end = offset + {{ size }} * count
+                    if end > len(buf):
+                        return {{ parse_error }}.NOT_ENOUGH_DATA
+                    return end, numpy.frombuffer(buf, '{{ dtype }}', count, offset).astype('{{ dtype[1:] }}')""",
+                    locals(),
+                ),
+            )
+
+        if is_byte(inner):
+            bytes_expr = byte_seq_expr(self.options, inner, "offset", "end")
+            return (
+                pname,
+                gen_raw(
+                    """\
+                @staticmethod
+                def {{ pname }}(buf: {{ buffer_type }}, offset: int, ctxt: typing.Dict[str, typing.Any]) -> typing.Union[{{ parse_error }}, typing.Tuple[int, {{ pytype }}]]:
+                    {%- if variable_length %}
+                    count = {{ length_expr }}
+                    if count < 0:
+                        return {{ parse_error }}.MALFORMED
+                    end = offset + count
+                    {%- else %}
+                    end = offset + {{ length_expr }}
+                    {%- endif %}
+                    if end > len(buf):
+                        return {{ parse_error }}.NOT_ENOUGH_DATA
+                    return end, {{ bytes_expr }}""",
+                    locals(),
+                ),
+            )
+
+        inner_pytype = inner.accept(PythonType(self.current_proto, self.options))
+
+        # Sequences of primitives are unpacked with a single repeated struct format
+        code = inner.accept(StructFormatCode())
+        if code is not None:
+            endianness, fmt = code
+            endianness_prefix = struct_pack_endianness(endianness or Endianness.LITTLE)
+            size = checked_cast(st.Constant, inner.size).value
+            is_enum = isinstance(inner, tir.Enum)
+            if isinstance(inner, tir.Enum):
+                values = get_enum_values_name(inner, self.current_proto)
+            return (
+                pname,
+                gen_raw(
+                    """\
+                @staticmethod
+                def {{ pname }}(buf: {{ buffer_type }}, offset: int, ctxt: typing.Dict[str, typing.Any]) -> typing.Union[{{ parse_error }}, typing.Tuple[int, {{ pytype }}]]:
+                    count = {{ length_expr }}
+                    {%- if variable_length %}
+                    if count < 0:
+                        return {{ parse_error }}.MALFORMED
+                    {%- endif %}
+                    end = offset + {{ size }} * count
+                    if end > len(buf):
+                        {%- if is_enum %}
+                        # A malformed value before the end of the buffer is reported first
+                        available = (len(buf) - offset) // {{ size }}
+                        if available > 0 and not all(raw in {{ values }} for raw in struct.unpack_from(f'{{ endianness_prefix }}{available}{{ fmt }}', buf, offset)):
+                            return {{ parse_error }}.MALFORMED
+                        {%- endif %}
+                        return {{ parse_error }}.NOT_ENOUGH_DATA
+                    {%- if is_enum %}
+                    result = [{{ values }}.get(raw) for raw in struct.unpack_from(f'{{ endianness_prefix }}{count}{{ fmt }}', buf, offset)]
+                    if None in result:
+                        return {{ parse_error }}.MALFORMED
+                    return end, typing.cast({{ pytype }}, result)
+                    {%- else %}
+                    return end, list(struct.unpack_from(f'{{ endianness_prefix }}{count}{{ fmt }}', buf, offset))
+                    {%- endif %}""",
+                    locals(),
+                ),
+            )
 
-        pytype = seq.accept(PythonType(self.current_proto))
-        inner_pytype = inner.accept(PythonType(self.current_proto))
+        # Sequences of structs are parsed with parse_many, which unpacks structs
+        # made of a single fused run all at once
+        if isinstance(inner, tir.Struct):
+            return (
+                pname,
+                gen_raw(
+                    """\
+                @staticmethod
+                def {{ pname }}(buf: {{ buffer_type }}, offset: int, ctxt: typing.Dict[str, typing.Any]) -> typing.Union[{{ parse_error }}, typing.Tuple[int, {{ pytype }}]]:
+                    {%- if variable_length %}
+                    count = {{ length_expr }}
+                    if count < 0:
+                        return {{ parse_error }}.MALFORMED
+                    return {{ inner_pytype }}.parse_many(buf, offset, count)
+                    {%- else %}
+                    return {{ inner_pytype }}.parse_many(buf, offset, {{ length_expr }})
+                    {%- endif %}""",
+                    locals(),
+                ),
+            )
+
+        inner_pname, inner_helpers = inner.accept(self)
 
         return (
             pname,
@@ -421,9 +1240,14 @@ class FieldParserGenerator(
                     gen_raw(
                         """\
                     @staticmethod
-                    def {{ pname }}(buf: bytes, offset: int, ctxt: typing.Dict[str, typing.Any]) -> typing.Union[{{ parse_error }}, typing.Tuple[int, {{ pytype }}]]:
+                    def {{ pname }}(buf: {{ buffer_type }}, offset: int, ctxt: typing.Dict[str, typing.Any]) -> typing.Union[{{ parse_error }}, typing.Tuple[int, {{ pytype }}]]:
+                        {%- if variable_length %}
+                        count = {{ length_expr }}
+                        if count < 0:
+                            return {{ parse_error }}.MALFORMED
+                        {%- endif %}
                         result: typing.List[{{ inner_pytype }}] = []
-                        for i in range({{ length_expr }}):
+                        for i in range({{ 'count' if variable_length else length_expr }}):
                             inner_result = {{ this.class_name }}.{{ inner_pname }}(buf, offset, ctxt)
                             if isinstance(inner_result, {{ parse_error }}):
                                 return inner_result
@@ -438,59 +1262,692 @@ class FieldParserGenerator(
         )
 
 
-def gen_serializer(struct: tir.Struct) -> pg.Node:
+# Generates validate, which runs the checks of parse (bounds, enum values, and
+# variant tags) without building anything, and returns the offset of the end of the
+# struct. Consecutive fields with a constant size share a single bounds check.
+def gen_validator(
+    struct: tir.Struct, options: PythonOptions, layout: FieldLayout
+) -> pg.Node:
+    current_proto = struct.name.namespace()
     class_name = get_local_struct(struct)
 
-    builder_parts: t.List[pg.Node] = []
+    validator_parts: t.List[pg.Node] = []
     helpers: t.List[pg.Node] = []
-    for fname, field in struct.get_non_virtual():
-        bname, fhelpers = field.type_.accept(
-            FieldSerializerGenerator(struct.name.namespace(), class_name, fname)
+
+    needs_ctxt = any(
+        field.master_field is not None for _, field in struct.get_non_virtual()
+    )
+    if needs_ctxt:
+        ctxt_expr = "_ctxt"
+        validator_parts.append(pg.Raw("_ctxt: typing.Dict[str, typing.Any] = {}"))
+    else:
+        ctxt_expr = "_no_ctxt"
+
+    def field_validator(fname: str, field: tir.Field) -> str:
+        vname, fhelpers = field.type_.accept(
+            FieldValidatorGenerator(current_proto, options, class_name, fname)
         )
         helpers.append(fhelpers)
-        # If the field is a dependent field, generate its value from some other field
-        if field.master_field is not None:
-            if field.master_field.key_property == tir.KeyProperty.VARIANT_TAG:
-                fvalue_expr = f"self.{field.master_field.master_field}.tag()"
-            elif field.master_field.key_property == tir.KeyProperty.SEQ_LENGTH:
-                fvalue_expr = f"len(self.{field.master_field.master_field})"
+        return vname
+
+    segment: FieldLayout = []
+
+    def finish_segment() -> None:
+        segment_size = 0
+        unpacks = []
+        conversions = []
+        checks = []
+        # When the segment is cut off by the end of the buffer, its enums and
+        # checked fields before the end are still checked in order, so that a
+        # malformed field is reported before the missing data, like in parse. Each
+        # step is its kind, the end of the bytes it reads, and its code.
+        truncated_steps: t.List[t.Tuple[str, int, t.List[str]]] = []
+        for part in segment:
+            offset_expr = (
+                f"_offset + {segment_size}" if segment_size != 0 else "_offset"
+            )
+            if isinstance(part, FusedRun):
+                # Only dependent fields and enums are read
+                targets = []
+                field_start = segment_size
+                for fname, field in part.fields:
+                    field_end = (
+                        field_start + checked_cast(st.Constant, field.type_.size).value
+                    )
+                    bounds_check = [
+                        f"if _offset + {field_end} > len(_buf):",
+                        f"    return {parse_error}.NOT_ENOUGH_DATA",
+                    ]
+                    if isinstance(field.type_, (tir.Enum, tir.Int)):
+                        read_expr = int_from_bytes_expr(
+                            field.type_, field_start, field_end
+                        )
+                    if isinstance(field.type_, tir.Enum):
+                        values = get_enum_values_name(field.type_, current_proto)
+                        if field.master_field is None:
+                            enum_check = [
+                                f"if {read_expr} not in {values}:",
+                                f"    return {parse_error}.MALFORMED",
+                            ]
+                        else:
+                            enum_check = [
+                                f'_ctxt["{fname}"] = {values}.get({read_expr})',
+                                f'if _ctxt["{fname}"] is None:',
+                                f"    return {parse_error}.MALFORMED",
+                            ]
+                        truncated_steps.append(
+                            ("enum", field_end, bounds_check + enum_check)
+                        )
+                    elif field.master_field is not None:
+                        truncated_steps.append(
+                            (
+                                "master",
+                                field_end,
+                                bounds_check + [f'_ctxt["{fname}"] = {read_expr}'],
+                            )
+                        )
+                    field_start = field_end
+                    if isinstance(field.type_, tir.Enum):
+                        targets.append(f"_{fname}_raw")
+                        conversions.append(
+                            (
+                                fname,
+                                field.master_field,
+                                field.type_.accept(PythonType(current_proto, options)),
+                            )
+                        )
+                    elif field.master_field is not None:
+                        targets.append(f'_ctxt["{fname}"]')
+                    else:
+                        targets.append("_")
+                if any(target != "_" for target in targets):
+                    target_expr = ", ".join(targets) + (
+                        "," if len(targets) == 1 else ""
+                    )
+                    unpacks.append((part.struct_name, target_expr, offset_expr))
+                segment_size += part.size
             else:
-                assert_never(field.master_field.key_property)
-        else:
-            fvalue_expr = f"self.{fname}"
-        builder_parts.append(
-            pg.Raw(f"offset = self.{bname}({fvalue_expr}, buf, offset)")
+                fname, field = part
+                if not field.type_.trivial:
+                    vname = field_validator(fname, field)
+                    checks.append((vname, offset_expr))
+                    truncated_steps.append(
+                        (
+                            "check",
+                            segment_size,
+                            [
+                                f"_result = {class_name}.{vname}(_buf, {offset_expr}, {ctxt_expr})",
+                                f"if isinstance(_result, {parse_error}):",
+                                "    return _result",
+                            ],
+                        )
+                    )
+                segment_size += checked_cast(st.Constant, field.type_.size).value
+        segment.clear()
+        if segment_size == 0 and not checks:
+            return
+        # Enums which end at the end of the segment are never complete, and dependent
+        # fields are only needed by the checks after them
+        last_check = max(
+            (i for i, (kind, _, _) in enumerate(truncated_steps) if kind == "check"),
+            default=-1,
         )
-    builder_parts.append(pg.Raw("return offset"))
+        truncated_lines = [
+            line
+            for i, (kind, end, lines) in enumerate(truncated_steps)
+            if (kind == "enum" and end < segment_size)
+            or (kind == "master" and i < last_check)
+            or kind == "check"
+            for line in lines
+        ]
+        validator_parts.append(
+            gen_raw(
+                """\
+            if _offset + {{ segment_size }} > len(_buf):
+                {%- for line in truncated_lines %}
+                {{ line }}
+                {%- endfor %}
+                return {{ parse_error }}.NOT_ENOUGH_DATA
+            {%- for struct_name, targets, offset_expr in unpacks %}
+            {{ targets }} = {{ struct_name }}.unpack_from(_buf, {{ offset_expr }})
+            {%- endfor %}
+            {%- for fname, master_field, pytype in conversions %}
+            {%- if master_field is none %}
+            if isinstance({{ pytype }}.from_int(_{{ fname }}_raw), {{ parse_error }}):
+                return {{ parse_error }}.MALFORMED
+            {%- else %}
+            _ctxt["{{ fname }}"] = {{ pytype }}.from_int(_{{ fname }}_raw)
+            if isinstance(_ctxt["{{ fname }}"], {{ parse_error }}):
+                return {{ parse_error }}.MALFORMED
+            {%- endif %}
+            {%- endfor %}
+            {%- for vname, offset_expr in checks %}
+            _result = {{ class_name }}.{{ vname }}(_buf, {{ offset_expr }}, {{ ctxt_expr }})
+            if isinstance(_result, {{ parse_error }}):
+                return _result
+            {%- endfor %}
+            _offset += {{ segment_size }}""",
+                {**locals(), "class_name": class_name, "ctxt_expr": ctxt_expr},
+            )
+        )
+
+    for part in layout:
+        if isinstance(part, FusedRun) or isinstance(part[1].type_.size, st.Constant):
+            segment.append(part)
+            continue
+        finish_segment()
+        fname, field = part
+        vname = field_validator(fname, field)
+        validator_parts.append(
+            gen_raw(
+                """\
+            _result = {{ class_name }}.{{ vname }}(_buf, _offset, {{ ctxt_expr }})
+            if isinstance(_result, {{ parse_error }}):
+                return _result
+            _offset = _result""",
+                locals(),
+            )
+        )
+    finish_segment()
+    validator_parts.append(pg.Raw("return _offset"))
 
     helpers.append(
         pg.Function(
-            "serialize_into",
-            [(None, "self"), (pg.Type("bytearray"), "buf"), (pg.Type("int"), "offset")],
-            pg.Type("int"),
-            pg.Section(builder_parts),
+            "validate",
+            [(pg.Type(buffer_type), "_buf"), (pg.Type("int"), "_offset")],
+            pg.Type(f"typing.Union[{ parse_error }, int]"),
+            pg.Section(validator_parts),
+            decorator="@staticmethod",
         )
     )
+    return pg.Section(helpers)
 
-    helpers.append(
-        gen_raw(
-            """\
-        def serialize(self) -> bytearray:
-            result = bytearray(self.size_bytes())
-            self.serialize_into(result, 0)
-            return result""",
-            locals(),
-        )
+
+# With --numpy, generates the structured dtype of constant size structs, and
+# frombuffer, which decodes an array of them without copying.
+def gen_record_arrays(struct: tir.Struct, options: PythonOptions) -> pg.Node:
+    dtype = struct_dtype_expr(struct, struct.name.namespace(), options)
+    if not options.numpy or dtype is None:
+        return pg.Section([])
+    class_name = get_local_struct(struct)
+    return gen_raw(
+        """\
+        DTYPE = {{ dtype }}
+        # Returns the count structs (or all of them, if count is -1) starting at offset
+        # as a record array backed by buf. Enums are not validated.
+        @staticmethod
+        def frombuffer(buf: {{ buffer_type }}, count: int = -1, offset: int = 0) -> numpy.recarray:
+            return numpy.frombuffer(buf, {{ class_name }}.DTYPE, count, offset).view(numpy.recarray)""",
+        locals(),
     )
 
-    return pg.Section(helpers)
 
+# Generates peek_tag, which reads the tag of the first variant of a struct without
+# parsing the struct, if the tag is at a constant offset. If the variant is also at
+# a constant offset, and is the last field, it also generates parse_as, which
+# parses only the value of the variant, so messages can be routed by their tag and
+# then decoded as the type they hold. The module level struct.Struct which reads the
+# tag is returned before them.
+def gen_tag_peeker(
+    struct: tir.Struct, options: PythonOptions
+) -> t.Tuple[pg.Node, pg.Node]:
+    for tag_name, tag_field in struct.get_non_virtual():
+        if (
+            tag_field.master_field is not None
+            and tag_field.master_field.key_property == tir.KeyProperty.VARIANT_TAG
+            and tag_field.offset.base is None
+        ):
+            break
+    else:
+        return pg.Section([]), pg.Section([])
 
-@dataclasses.dataclass
-class FieldSerializerGenerator(
-    tir.TypeVisitor[t.Tuple[str, pg.Node]], tir.LengthVisitor[t.Optional[int]]
-):
-    current_proto: QName
+    class_name = get_local_struct(struct)
+    master = unwrap(tag_field.master_field)
+    variant_name = master.master_field
+    variant_field = struct.fields[variant_name]
+    variant_type = variant_field.type_
+    if isinstance(variant_type, tir.Virtual):
+        variant_type = variant_type.inner
+    variant = checked_cast(tir.DetachedVariant, variant_type).variant
+    variant_pytype = variant.accept(PythonType(struct.name.namespace(), options))
+    tag_pytype = variant.tag_type.accept(PythonType(struct.name.namespace(), options))
+    tag_struct = f"_{class_name}_{tag_name}_struct"
+    tag_format = int_struct_pack_format(checked_cast(tir.Int, tag_field.type_))
+    tag_offset = tag_field.offset.offset
+    tag_offset_expr = f"offset + {tag_offset}" if tag_offset != 0 else "offset"
+    tag_end = tag_offset + checked_cast(st.Constant, tag_field.type_.size).value
+    last_name, _ = list(struct.get_non_virtual())[-1]
+    can_parse_as = (
+        variant_name == last_name
+        and not isinstance(variant_field.type_, tir.Virtual)
+        and variant_field.offset.base is None
+    )
+    value_offset = variant_field.offset.offset
+    value_offset_expr = f"offset + {value_offset}" if value_offset != 0 else "offset"
+    value_types = ", ".join(
+        member.accept(PythonType(struct.name.namespace(), options))
+        for member in variant.tags
+    )
+
+    return pg.Raw(f"{tag_struct} = struct.Struct('{tag_format}')"), gen_raw(
+        """\
+        # The tag of {{ variant_name }}, or MALFORMED if it is not a tag of {{ variant_pytype }}
+        @staticmethod
+        def peek_tag(buf: {{ buffer_type }}, offset: int) -> typing.Union[{{ parse_error }}, {{ tag_pytype }}]:
+            if offset + {{ tag_end }} > len(buf):
+                return {{ parse_error }}.NOT_ENOUGH_DATA
+            tag: {{ tag_pytype }} = {{ tag_struct }}.unpack_from(buf, {{ tag_offset_expr }})[0]
+            if tag not in {{ variant_pytype }}._parsers:
+                return {{ parse_error }}.MALFORMED
+            return tag
+        {%- if can_parse_as %}
+        # Parses only {{ variant_name }}, as the type of tag. Returns MALFORMED if it has another tag.
+        @staticmethod
+        def parse_as(tag: {{ tag_pytype }}, buf: {{ buffer_type }}, offset: int) -> typing.Union[{{ parse_error }}, typing.Tuple[int, typing.Union[{{ value_types }}]]]:
+            peeked = {{ class_name }}.peek_tag(buf, offset)
+            if isinstance(peeked, {{ parse_error }}):
+                return peeked
+            if peeked != tag:
+                return {{ parse_error }}.MALFORMED
+            return {{ variant_pytype }}._parsers[tag](buf, {{ value_offset_expr }})
+        {%- endif %}""",
+        locals(),
+    )
+
+
+# The names of the fields of the struct which a type references: the lengths of
+# sequences (including nested ones) and the tags of detached variants, including
+# those of virtual fields.
+@dataclasses.dataclass
+class ReferencedFields(tir.TypeVisitor[t.Set[str]], tir.LengthVisitor[t.Set[str]]):
+    def visit_int(self, type_: tir.Int) -> t.Set[str]:
+        return set()
+
+    def visit_float(self, type_: tir.Float) -> t.Set[str]:
+        return set()
+
+    def visit_array(self, type_: tir.Array) -> t.Set[str]:
+        return type_.inner.accept(self)
+
+    def visit_vector(self, type_: tir.Vector) -> t.Set[str]:
+        return {*type_.inner.accept(self), type_.length.name}
+
+    def visit_list(self, type_: tir.List) -> t.Set[str]:
+        return {*type_.inner.accept(self), *type_.length.accept(self)}
+
+    def visit_detached_variant(self, type_: tir.DetachedVariant) -> t.Set[str]:
+        return {type_.tag.name}
+
+    def visit_virtual(self, type_: tir.Virtual) -> t.Set[str]:
+        return type_.inner.accept(self)
+
+    # Other structs can only reference their own fields
+    def visit_struct(self, root: tir.Struct) -> t.Set[str]:
+        return set()
+
+    def visit_variant(self, root: tir.Variant) -> t.Set[str]:
+        return set()
+
+    def visit_enum(self, root: tir.Enum) -> t.Set[str]:
+        return set()
+
+    def visit_fixed_length(self, length: tir.FixedLength) -> t.Set[str]:
+        return set()
+
+    def visit_variable_length(self, length: tir.VariableLength) -> t.Set[str]:
+        return {length.length.name}
+
+
+# Returns the module level struct.Struct of each field accessor, and the accessors:
+# get_<field> and set_<field> read and write a primitive field at a constant offset
+# in place in a serialized struct, without parsing or building the rest of it.
+# The buffer is not validated, so it must hold a valid struct. Fields referenced by
+# other fields (as the length of a sequence or the tag of a variant, including in
+# virtual fields) have no accessors, because changing them alone would corrupt the
+# message or change how it is read.
+def gen_field_accessors(
+    struct: tir.Struct, options: PythonOptions
+) -> t.Tuple[pg.Node, pg.Node]:
+    class_name = get_local_struct(struct)
+    referenced: t.Set[str] = set()
+    for field in struct.fields.values():
+        field_referenced: t.Set[str] = field.type_.accept(ReferencedFields())
+        referenced |= field_referenced
+    accessors = []
+    for fname, field in struct.get_owned():
+        code = field.type_.accept(StructFormatCode())
+        if code is None or field.offset.base is not None or fname in referenced:
+            continue
+        endianness, fmt = code
+        struct_name = f"_{class_name}_{fname}_struct"
+        struct_format = struct_pack_endianness(endianness or Endianness.LITTLE) + fmt
+        field_offset = field.offset.offset
+        field_offset_expr = (
+            f"offset + {field_offset}" if field_offset != 0 else "offset"
+        )
+        field_end = field_offset + checked_cast(st.Constant, field.type_.size).value
+        pytype = field.type_.accept(PythonType(struct.name.namespace(), options))
+        is_enum = isinstance(field.type_, tir.Enum)
+        accessors.append(
+            (
+                fname,
+                struct_name,
+                struct_format,
+                field_offset_expr,
+                field_end,
+                pytype,
+                is_enum,
+            )
+        )
+
+    formats = gen_raw(
+        """\
+        {%- for fname, struct_name, struct_format, offset_expr, end, pytype, is_enum in accessors %}
+        {{ struct_name }} = struct.Struct('{{ struct_format }}')
+        {%- endfor %}""",
+        locals(),
+    )
+    methods = gen_raw(
+        """\
+        {%- for fname, struct_name, struct_format, offset_expr, end, pytype, is_enum in accessors %}
+        # Reads {{ fname }} of the {{ class_name }} at offset in buf, without parsing the other fields
+        @staticmethod
+        def get_{{ fname }}(buf: {{ buffer_type }}, offset: int) -> typing.Union[{{ parse_error }}, {{ pytype }}]:
+            if offset + {{ end }} > len(buf):
+                return {{ parse_error }}.NOT_ENOUGH_DATA
+            {%- if is_enum %}
+            return {{ pytype }}.from_int({{ struct_name }}.unpack_from(buf, {{ offset_expr }})[0])
+            {%- else %}
+            return {{ struct_name }}.unpack_from(buf, {{ offset_expr }})[0]
+            {%- endif %}
+        # Overwrites {{ fname }} of the {{ class_name }} at offset in buf
+        @staticmethod
+        def set_{{ fname }}(buf: typing.Union[bytearray, memoryview], offset: int, value: {{ pytype }}) -> None:
+            {{ struct_name }}.pack_into(buf, {{ offset_expr }}, value{{ ".value" if is_enum }})
+        {%- endfor %}""",
+        locals(),
+    )
+    return formats, methods
+
+
+# Generates parse_many, which parses count consecutive structs (or structs up to the
+# end of the buffer), and iter_parse, which lazily parses structs up to the end of
+# the buffer.
+# Structs whose fields form a single fused run are parsed with struct.iter_unpack.
+def gen_batch_parser(
+    struct: tir.Struct, options: PythonOptions, layout: FieldLayout
+) -> pg.Node:
+    class_name = get_local_struct(struct)
+    constructor = f"_{class_name}_new" if options.slots else class_name
+    owned = [fname for fname, _ in struct.get_owned()]
+    zero_size = struct.size == st.Constant(0)
+
+    run = layout[0] if len(layout) == 1 else None
+    if isinstance(run, FusedRun) and len(run.fields) == len(owned):
+        targets = []
+        enums = []
+        for fname, field in run.fields:
+            if isinstance(field.type_, tir.Enum):
+                targets.append(f"_{fname}_raw")
+                enums.append(
+                    (fname, get_enum_values_name(field.type_, struct.name.namespace()))
+                )
+            else:
+                targets.append(fname)
+        target_expr = ", ".join(targets) + ("," if len(targets) == 1 else "")
+        return gen_raw(
+            """\
+        @staticmethod
+        def parse_many(buf: {{ buffer_type }}, offset: int = 0, count: typing.Optional[int] = None) -> typing.Union[{{ parse_error }}, typing.Tuple[int, typing.List['{{ class_name }}']]]:
+            if count is not None and count < 0:
+                raise ValueError('count must not be negative')
+            # Like the generic parse_many, nothing is parsed from an offset past the end
+            if offset > len(buf):
+                return (offset, []) if not count else {{ parse_error }}.NOT_ENOUGH_DATA
+            if count is None:
+                count = (len(buf) - offset) // {{ run.size }}
+                if offset + {{ run.size }} * count != len(buf):
+                    return {{ class_name }}._parse_many_truncated(buf, offset)
+            end = offset + {{ run.size }} * count
+            if end > len(buf):
+                return {{ class_name }}._parse_many_truncated(buf, offset)
+            {%- if enums %}
+            result: typing.List['{{ class_name }}'] = []
+            for {{ target_expr }} in {{ run.struct_name }}.iter_unpack(memoryview(buf)[offset:end]):
+                {%- for fname, values in enums %}
+                {{ fname }} = {{ values }}.get(_{{ fname }}_raw)
+                if {{ fname }} is None:
+                    return {{ parse_error }}.MALFORMED
+                {%- endfor %}
+                result.append({{ constructor }}({{ owned|join(', ') }}))
+            return end, result
+            {%- else %}
+            return end, [{{ constructor }}(*values) for values in {{ run.struct_name }}.iter_unpack(memoryview(buf)[offset:end])]
+            {%- endif %}
+        # Returns the error of parsing structs up to the end of buf, which is cut
+        # off by the end of buf. A malformed struct before the end is reported first.
+        # offset must not be past the end of buf.
+        @staticmethod
+        def _parse_many_truncated(buf: {{ buffer_type }}, offset: int) -> {{ parse_error }}:
+            count = (len(buf) - offset) // {{ run.size }}
+            complete = {{ class_name }}.parse_many(buf, offset, count)
+            if isinstance(complete, {{ parse_error }}):
+                return complete
+            last = {{ class_name }}.parse(buf, offset + {{ run.size }} * count)
+            return last if isinstance(last, {{ parse_error }}) else {{ parse_error }}.NOT_ENOUGH_DATA
+        @staticmethod
+        def iter_parse(buf: {{ buffer_type }}, offset: int = 0) -> typing.Iterator['{{ class_name }}']:
+            end = offset + {{ run.size }} * max(0, (len(buf) - offset) // {{ run.size }})
+            {%- if enums %}
+            for i, ({{ target_expr }}) in enumerate({{ run.struct_name }}.iter_unpack(memoryview(buf)[offset:end])):
+                {%- for fname, values in enums %}
+                {{ fname }} = {{ values }}.get(_{{ fname }}_raw)
+                if {{ fname }} is None:
+                    raise tako.runtime.MalformedMessage(offset + {{ run.size }} * i)
+                {%- endfor %}
+                yield {{ constructor }}({{ owned|join(', ') }})
+            {%- else %}
+            for values in {{ run.struct_name }}.iter_unpack(memoryview(buf)[offset:end]):
+                yield {{ constructor }}(*values)
+            {%- endif %}
+            if end < len(buf):
+                {%- if enums %}
+                if {{ class_name }}.parse(buf, end) == {{ parse_error }}.MALFORMED:
+                    raise tako.runtime.MalformedMessage(end)
+                {%- endif %}
+                raise tako.runtime.IncompleteMessage(end)""",
+            locals(),
+        )
+
+    return gen_raw(
+        """\
+    @staticmethod
+    def parse_many(buf: {{ buffer_type }}, offset: int = 0, count: typing.Optional[int] = None) -> typing.Union[{{ parse_error }}, typing.Tuple[int, typing.List['{{ class_name }}']]]:
+        {%- if zero_size %}
+        if count is None:
+            raise ValueError('count is required for structs of size 0')
+        {%- endif %}
+        if count is not None and count < 0:
+            raise ValueError('count must not be negative')
+        result: typing.List['{{ class_name }}'] = []
+        end = len(buf)
+        while offset < end if count is None else len(result) < count:
+            item = {{ class_name }}.parse(buf, offset)
+            if isinstance(item, {{ parse_error }}):
+                return item
+            offset, value = item
+            result.append(value)
+        return offset, result
+    @staticmethod
+    def iter_parse(buf: {{ buffer_type }}, offset: int = 0) -> typing.Iterator['{{ class_name }}']:
+        {%- if zero_size %}
+        raise ValueError('structs of size 0 cannot be parsed up to the end of a buffer')
+        {%- else %}
+        end = len(buf)
+        while offset < end:
+            item = {{ class_name }}.parse(buf, offset)
+            if isinstance(item, {{ parse_error }}):
+                if item == {{ parse_error }}.MALFORMED:
+                    raise tako.runtime.MalformedMessage(offset)
+                raise tako.runtime.IncompleteMessage(offset)
+            offset, value = item
+            yield value
+        {%- endif %}""",
+        locals(),
+    )
+
+
+# serialize_into extends buf if it is too small, so messages can be serialized in a
+# single pass without computing their size first, e.g. appended to one buffer.
+# Constant size structs check the size of buf once, and others before each fused
+# block.
+def gen_serializer(
+    struct: tir.Struct, options: PythonOptions, layout: FieldLayout
+) -> pg.Node:
+    class_name = get_local_struct(struct)
+    size = struct.size.value if isinstance(struct.size, st.Constant) else None
+    fnames = [fname for fname, _ in struct.get_owned()]
+
+    builder_parts: t.List[pg.Node] = []
+    helpers: t.List[pg.Node] = []
+    if options.memoize:
+        builder_parts.append(
+            gen_raw(
+                """\
+            _serialized: typing.Optional[bytes] = getattr(self, "_serialized", None)
+            if _serialized is not None:
+                end = offset + len(_serialized)
+                if len(buf) < end:
+                    buf.extend(bytes(end - len(buf)))
+                buf[offset:end] = _serialized
+                return end""",
+                locals(),
+            )
+        )
+    if size is not None and size != 0:
+        builder_parts.append(
+            gen_raw(
+                """\
+            if len(buf) < offset + {{ size }}:
+                buf.extend(bytes(offset + {{ size }} - len(buf)))""",
+                locals(),
+            )
+        )
+
+    def value_expr(fname: str, field: tir.Field) -> str:
+        # If the field is a dependent field, generate its value from some other field
+        if field.master_field is not None:
+            if field.master_field.key_property == tir.KeyProperty.VARIANT_TAG:
+                return f"self.{field.master_field.master_field}.tag()"
+            elif field.master_field.key_property == tir.KeyProperty.SEQ_LENGTH:
+                return f"len(self.{field.master_field.master_field})"
+            else:
+                assert_never(field.master_field.key_property)
+        else:
+            return f"self.{fname}"
+
+    for block in group_fused_runs(layout):
+        if isinstance(block, list):
+            block_size = sum(run.size for run in block)
+            run_offset = 0
+            for run in block:
+                values = []
+                for fname, field in run.fields:
+                    fvalue_expr = value_expr(fname, field)
+                    if isinstance(field.type_, tir.Enum):
+                        fvalue_expr += ".value"
+                    values.append(fvalue_expr)
+                offset_expr = f"offset + {run_offset}" if run_offset != 0 else "offset"
+                if run_offset == 0 and size is None:
+                    builder_parts.append(
+                        gen_raw(
+                            """\
+                        if len(buf) < offset + {{ block_size }}:
+                            buf.extend(bytes(offset + {{ block_size }} - len(buf)))""",
+                            locals(),
+                        )
+                    )
+                builder_parts.append(
+                    pg.Raw(
+                        f"{run.struct_name}.pack_into(buf, {offset_expr}, {', '.join(values)})"
+                    )
+                )
+                run_offset += run.size
+            builder_parts.append(pg.Raw(f"offset += {block_size}"))
+        else:
+            fname, field = block
+            fvalue_expr = value_expr(fname, field)
+            # Nested types serialize themselves, so skip the helper
+            if isinstance(field.type_, (tir.Struct, tir.DetachedVariant)):
+                builder_parts.append(
+                    pg.Raw(f"offset = {fvalue_expr}.serialize_into(buf, offset)")
+                )
+                continue
+            bname, fhelpers = field.type_.accept(
+                FieldSerializerGenerator(
+                    struct.name.namespace(), options, class_name, fname
+                )
+            )
+            helpers.append(fhelpers)
+            builder_parts.append(
+                pg.Raw(f"offset = self.{bname}({fvalue_expr}, buf, offset)")
+            )
+    builder_parts.append(pg.Raw("return offset"))
+
+    helpers.append(
+        pg.Function(
+            "serialize_into",
+            [(None, "self"), (pg.Type("bytearray"), "buf"), (pg.Type("int"), "offset")],
+            pg.Type("int"),
+            pg.Section(builder_parts),
+        )
+    )
+
+    helpers.append(
+        gen_raw(
+            """\
+        def serialize(self) -> bytearray:
+            {%- if options.memoize %}
+            _serialized: typing.Optional[bytes] = getattr(self, "_serialized", None)
+            if _serialized is not None:
+                return bytearray(_serialized)
+            {%- endif %}
+            {%- if size is none %}
+            result = bytearray(self.size_bytes())
+            # The cached size is stale if a list in the message was modified since it
+            # was computed, so the result is cut to what was actually written
+            del result[self.serialize_into(result, 0):]
+            {%- else %}
+            result = bytearray({{ size }})
+            self.serialize_into(result, 0)
+            {%- endif %}
+            {%- if options.memoize %}
+            object.__setattr__(self, "_serialized", bytes(result))
+            {%- endif %}
+            return result
+        # Pickled as its serialized bytes, which are smaller and faster to pickle
+        # than the objects it holds
+        def __reduce__(self) -> typing.Tuple[typing.Any, ...]:
+            return tako.runtime.decode, ({{ class_name }}, bytes(self.serialize()))
+        # Copied field by field like other dataclasses, so copies keep values which
+        # cannot be serialized exactly (such as floats in f32 fields)
+        def __copy__(self) -> {{ class_name }}:
+            return {{ class_name }}({% for fname in fnames %}{{ fname }}=self.{{ fname }}{{ ", " if not loop.last }}{% endfor %})
+        def __deepcopy__(self, memo: typing.Dict[int, typing.Any]) -> {{ class_name }}:
+            return {{ class_name }}({% for fname in fnames %}{{ fname }}=copy.deepcopy(self.{{ fname }}, memo){{ ", " if not loop.last }}{% endfor %})""",
+            locals(),
+        )
+    )
+
+    return pg.Section(helpers)
+
+
+@dataclasses.dataclass
+class FieldSerializerGenerator(
+    tir.TypeVisitor[t.Tuple[str, pg.Node]], tir.LengthVisitor[t.Optional[int]]
+):
+    current_proto: QName
+    options: PythonOptions
     class_name: str
     fname: str
     num: int = 0
@@ -552,7 +2009,7 @@ class FieldSerializerGenerator(
         self, type_: tir.Type, pack_expr: str, value_to_int_suffix: str = ""
     ) -> t.Tuple[str, pg.Node]:
         bname = self.alloc_build_function()
-        pytype = type_.accept(PythonType(self.current_proto))
+        pytype = type_.accept(PythonType(self.current_proto, self.options))
         size = checked_cast(st.Constant, type_.size).value
 
         return (
@@ -570,14 +2027,21 @@ class FieldSerializerGenerator(
         self, seq: tir.Type, inner: tir.Type, expected_length: t.Optional[int]
     ) -> t.Tuple[str, pg.Node]:
         bname = self.alloc_build_function()
-        inner_bname, inner_helpers = inner.accept(self)
-
-        pytype = seq.accept(PythonType(self.current_proto))
+        pytype = seq.accept(PythonType(self.current_proto, self.options))
 
         length_check: t.Optional[str] = None
         if expected_length is not None:
             length_check = f"assert len(value) == {expected_length}"
 
+        code = inner.accept(StructFormatCode())
+        if code is not None:
+            return bname, self.handle_primitive_seq(
+                bname, pytype, inner, code, expected_length, length_check
+            )
+
+        inner_bname, inner_helpers = inner.accept(self)
+        inner_size = inner.size.value if isinstance(inner.size, st.Constant) else None
+
         return (
             bname,
             pg.Section(
@@ -589,6 +2053,10 @@ class FieldSerializerGenerator(
                 {%- if length_check is not none %}
                 {{ length_check }}
                 {%- endif %}
+                {%- if inner_size is not none %}
+                if len(buf) < offset + {{ inner_size }} * len(value):
+                    buf.extend(bytes(offset + {{ inner_size }} * len(value) - len(buf)))
+                {%- endif %}
                 for x in value:
                     offset = self.{{ inner_bname }}(x, buf, offset)
                 return offset""",
@@ -598,151 +2066,1235 @@ class FieldSerializerGenerator(
             ),
         )
 
-    def handle_root(self, type_: tir.Type) -> t.Tuple[str, pg.Node]:
-        bname = self.alloc_build_function()
-        pytype = type_.accept(PythonType(self.current_proto))
+    def handle_primitive_seq(
+        self,
+        bname: str,
+        pytype: str,
+        inner: tir.Type,
+        code: t.Tuple[t.Optional[Endianness], str],
+        expected_length: t.Optional[int],
+        length_check: t.Optional[str],
+    ) -> pg.Node:
+        # Sequences of primitives are packed with a single repeated struct format
+        endianness, fmt = code
+        endianness_prefix = struct_pack_endianness(endianness or Endianness.LITTLE)
+        inner_size = checked_cast(st.Constant, inner.size).value
+        if expected_length is not None:
+            format_expr = f"'{endianness_prefix}{expected_length}{fmt}'"
+        else:
+            format_expr = f"f'{endianness_prefix}{{len(value)}}{fmt}'"
+        if isinstance(inner, tir.Enum):
+            values_expr = "[x.value for x in value]"
+        else:
+            values_expr = "value"
+
+        dtype = numpy_dtype(self.options, inner)
+        if dtype is not None:
+            # Converting an array which already has the right dtype does not copy it
+            return gen_raw(
+                """\
+                def {{ bname }}(self, value: {{ pytype }}, buf: bytearray, offset: int) -> int:
+                    {%- if length_check is not none %}
+                    {{ length_check }}
+                    {%- endif %}
+                    data = numpy.asarray(value, '{{ dtype }}').tobytes()
+                    end = offset + len(data)
+                    buf[offset:end] = data
+                    return end""",
+                locals(),
+            )
+
+        if is_byte(inner):
+            # Byte sequences are copied directly from the value's buffer. Lists of
+            # i8 values are converted to a signed array first.
+            signed = checked_cast(tir.Int, inner).sign == Sign.SIGNED
+            return gen_raw(
+                """\
+                def {{ bname }}(self, value: {{ pytype }}, buf: bytearray, offset: int) -> int:
+                    {%- if length_check is not none %}
+                    {{ length_check }}
+                    {%- endif %}
+                    end = offset + len(value)
+                    {%- if signed %}
+                    buf[offset:end] = array.array('b', value) if isinstance(value, list) else value
+                    {%- else %}
+                    buf[offset:end] = value
+                    {%- endif %}
+                    return end""",
+                locals(),
+            )
+
+        return gen_raw(
+            """\
+            def {{ bname }}(self, value: {{ pytype }}, buf: bytearray, offset: int) -> int:
+                {%- if length_check is not none %}
+                {{ length_check }}
+                {%- endif %}
+                end = offset + {{ inner_size }} * len(value)
+                if len(buf) < end:
+                    buf.extend(bytes(end - len(buf)))
+                struct.pack_into({{ format_expr }}, buf, offset, *{{ values_expr }})
+                return end""",
+            locals(),
+        )
+
+    def handle_root(self, type_: tir.Type) -> t.Tuple[str, pg.Node]:
+        bname = self.alloc_build_function()
+        pytype = type_.accept(PythonType(self.current_proto, self.options))
+
+        return (
+            bname,
+            gen_raw(
+                """\
+            def {{ bname }}(self, value: {{ pytype }}, buf: bytearray, offset: int) -> int:
+                return value.serialize_into(buf, offset)""",
+                locals(),
+            ),
+        )
+
+
+# Constant size structs have their size as SIZE_BYTES. Structs are frozen, so
+# others compute their size once, and cache it.
+def gen_sizer(struct: tir.Struct, options: PythonOptions) -> pg.Node:
+    if isinstance(struct.size, st.Constant):
+        size = struct.size.value
+        return gen_raw(
+            """\
+        SIZE_BYTES = {{ size }}
+        def size_bytes(self) -> int:
+            return {{ size }}""",
+            locals(),
+        )
+
+    sizer_parts: t.List[pg.Node] = []
+    helpers: t.List[pg.Node] = []
+    # The size is computed once, since structs are frozen. It is stale if a list in
+    # the message is modified afterwards, so serialize does not rely on it.
+    sizer_parts.append(pg.Raw("""\
+cached: typing.Optional[int] = getattr(self, "_size_bytes", None)
+if cached is not None:
+    return cached"""))
+    sizer_parts.append(pg.Raw(f"result: int = 0"))
+    base_size = 0
+    for fname, field in struct.get_non_virtual():
+        size_info = field.type_.accept(
+            FieldSizerGenerator(struct.name.namespace(), options, fname)
+        )
+        if isinstance(size_info, int):
+            base_size += size_info
+        elif isinstance(size_info, tuple):
+            sname, fhelpers = size_info
+            helpers.append(fhelpers)
+            sizer_parts.append(pg.Raw(f"result += self.{sname}(self.{fname})"))
+        else:
+            assert_never()
+    sizer_parts.append(pg.Raw(f"result += {base_size}"))
+    sizer_parts.append(pg.Raw('object.__setattr__(self, "_size_bytes", result)'))
+    sizer_parts.append(pg.Raw("return result"))
+    helpers.append(
+        pg.Function(
+            "size_bytes", [(None, "self")], pg.Type("int"), pg.Section(sizer_parts)
+        )
+    )
+    return pg.Section(helpers)
+
+
+@dataclasses.dataclass
+class FieldSizerGenerator(tir.TypeVisitor[t.Union[int, t.Tuple[str, pg.Node]]]):
+    current_proto: QName
+    options: PythonOptions
+    fname: str
+    num: int = 0
+
+    def visit_int(self, type_: tir.Int) -> t.Union[int, t.Tuple[str, pg.Node]]:
+        return self.handle_fixed_size(type_)
+
+    def visit_float(self, type_: tir.Float) -> t.Union[int, t.Tuple[str, pg.Node]]:
+        return self.handle_fixed_size(type_)
+
+    def visit_array(self, type_: tir.Array) -> t.Union[int, t.Tuple[str, pg.Node]]:
+        return self.handle_fixed_size(type_)
+
+    def visit_vector(self, type_: tir.Vector) -> t.Union[int, t.Tuple[str, pg.Node]]:
+        sname = self.alloc_size_function()
+        inner_size = checked_cast(int, type_.inner.accept(self))
+        pytype = type_.accept(PythonType(self.current_proto, self.options))
+
+        return (
+            sname,
+            gen_raw(
+                """\
+            def {{ sname }}(self, value: {{ pytype }}) -> int:
+                return {{ inner_size }} * len(value)""",
+                locals(),
+            ),
+        )
+
+    def visit_list(self, type_: tir.List) -> t.Union[int, t.Tuple[str, pg.Node]]:
+        sname = self.alloc_size_function()
+        inner_sname, inner_helpers = checked_cast(tuple, type_.inner.accept(self))
+        pytype = type_.accept(PythonType(self.current_proto, self.options))
+
+        return (
+            sname,
+            pg.Section(
+                [
+                    inner_helpers,
+                    gen_raw(
+                        """\
+                def {{ sname }}(self, value: {{ pytype }}) -> int:
+                    result: int = 0
+                    for x in value:
+                        result += self.{{ inner_sname }}(x);
+                    return result""",
+                        locals(),
+                    ),
+                ]
+            ),
+        )
+
+    def visit_detached_variant(
+        self, type_: tir.DetachedVariant
+    ) -> t.Union[int, t.Tuple[str, pg.Node]]:
+        return self.handle_root(type_)
+
+    def visit_virtual(self, type_: tir.Virtual) -> t.Union[int, t.Tuple[str, pg.Node]]:
+        raise InternalError()
+
+    def visit_struct(self, root: tir.Struct) -> t.Union[int, t.Tuple[str, pg.Node]]:
+        return self.handle_root(root)
+
+    def visit_variant(self, root: tir.Variant) -> t.Union[int, t.Tuple[str, pg.Node]]:
+        raise InternalError()
+
+    def visit_enum(self, root: tir.Enum) -> t.Union[int, t.Tuple[str, pg.Node]]:
+        return self.handle_fixed_size(root)
+
+    def alloc_size_function(self) -> str:
+        result = f"_size_bytes{self.fname}{self.num}"
+        self.num += 1
+        return result
+
+    def handle_fixed_size(self, type_: tir.Type) -> int:
+        return checked_cast(st.Constant, type_.size).value
+
+    def handle_root(self, type_: tir.Type) -> t.Union[int, t.Tuple[str, pg.Node]]:
+        sname = self.alloc_size_function()
+        pytype = type_.accept(PythonType(self.current_proto, self.options))
+        return type_.size.accept(FieldSizerGeneratorHelper(sname, pytype))
+
+
+@dataclasses.dataclass
+class FieldSizerGeneratorHelper(st.SizeVisitor[t.Union[int, t.Tuple[str, pg.Node]]]):
+    sname: str
+    pytype: str
+
+    def visit_constant(self, size: st.Constant) -> t.Union[int, t.Tuple[str, pg.Node]]:
+        return size.value
+
+    def visit_dynamic(self, size: st.Dynamic) -> t.Union[int, t.Tuple[str, pg.Node]]:
+        return (
+            self.sname,
+            gen_raw(
+                """\
+            def {{ this.sname }}(self, value: {{ this.pytype }}) -> int:
+                return value.size_bytes()""",
+                locals(),
+            ),
+        )
+
+
+# Generates to_json_obj, which converts a struct to the dicts, lists, ints and floats
+# of its JSON representation in a single pass, and from_json_obj, which converts
+# them back, or returns MALFORMED if they do not form a valid struct. The JSON
+# representation is the same as the one of the C++ generator: structs are objects
+# with all their non-virtual fields (including sequence lengths and variant tags),
+# enums are their values, and variants are the object of their value.
+def gen_json(struct: tir.Struct, options: PythonOptions) -> pg.Node:
+    if not options.json:
+        return pg.Section([])
+    class_name = get_local_struct(struct)
+    constructor = f"_{class_name}_new" if options.slots else class_name
+
+    encoded: t.List[t.Tuple[str, str]] = []
+    for fname, field in struct.get_non_virtual():
+        if field.master_field is not None:
+            if field.master_field.key_property == tir.KeyProperty.VARIANT_TAG:
+                value_expr = f"self.{field.master_field.master_field}.tag()"
+            elif field.master_field.key_property == tir.KeyProperty.SEQ_LENGTH:
+                value_expr = f"len(self.{field.master_field.master_field})"
+            else:
+                assert_never(field.master_field.key_property)
+        else:
+            value_expr = field.type_.accept(JsonEncodeExpr(options, f"self.{fname}"))
+        encoded.append((fname, value_expr))
+
+    needs_ctxt = any(
+        field.master_field is not None for _, field in struct.get_non_virtual()
+    )
+    ctxt_expr = "_ctxt" if needs_ctxt else "_no_ctxt"
+    helpers: t.List[pg.Node] = []
+    decoders: t.List[pg.Node] = []
+    for fname, field in struct.get_non_virtual():
+        dst = f'_ctxt["{fname}"]' if field.master_field is not None else fname
+        # Primitives are checked inline
+        type_ = field.type_
+        if isinstance(type_, tir.Int):
+            low, high = int_range(type_)
+            decoders.append(
+                gen_raw(
+                    """\
+                {{ dst }} = obj.get("{{ fname }}")
+                if type({{ dst }}) is not int or not {{ low }} <= {{ dst }} <= {{ high }}:
+                    return {{ parse_error }}.MALFORMED""",
+                    locals(),
+                )
+            )
+        elif isinstance(type_, tir.Float):
+            decoders.append(
+                gen_raw(
+                    """\
+                {{ dst }} = obj.get("{{ fname }}")
+                if type({{ dst }}) is int:
+                    {{ dst }} = float({{ dst }})
+                elif type({{ dst }}) is not float:
+                    return {{ parse_error }}.MALFORMED""",
+                    locals(),
+                )
+            )
+        elif isinstance(type_, tir.Enum):
+            values = get_enum_values_name(type_, struct.name.namespace())
+            decoders.append(
+                gen_raw(
+                    """\
+                _{{ fname }}_raw = obj.get("{{ fname }}")
+                {{ dst }} = {{ values }}.get(_{{ fname }}_raw) if type(_{{ fname }}_raw) is int else None
+                if {{ dst }} is None:
+                    return {{ parse_error }}.MALFORMED""",
+                    locals(),
+                )
+            )
+        else:
+            pname, fhelpers = type_.accept(
+                FieldJsonDecoderGenerator(
+                    struct.name.namespace(), options, class_name, fname
+                )
+            )
+            helpers.append(fhelpers)
+            decoders.append(
+                gen_raw(
+                    """\
+                {{ dst }} = {{ class_name }}.{{ pname }}(obj.get("{{ fname }}"), {{ ctxt_expr }})
+                if isinstance({{ dst }}, {{ parse_error }}):
+                    return {{ dst }}""",
+                    locals(),
+                )
+            )
+    owned = [fname for fname, _ in struct.get_owned()]
+
+    return pg.Section(
+        helpers
+        + [
+            gen_raw(
+                """\
+            def to_json_obj(self) -> typing.Dict[str, typing.Any]:
+                return {
+                    {%- for fname, value_expr in encoded %}
+                    "{{ fname }}": {{ value_expr }},
+                    {%- endfor %}
+                }""",
+                locals(),
+            ),
+            pg.Function(
+                "from_json_obj",
+                [(pg.Type("typing.Any"), "obj")],
+                pg.Type(f"typing.Union[{parse_error}, '{class_name}']"),
+                pg.Section(
+                    [
+                        gen_raw(
+                            """\
+                        if not isinstance(obj, dict):
+                            return {{ parse_error }}.MALFORMED
+                        {%- if needs_ctxt %}
+                        _ctxt: typing.Dict[str, typing.Any] = {}
+                        {%- endif %}""",
+                            locals(),
+                        ),
+                        *decoders,
+                        pg.Raw(f"return {constructor}({', '.join(owned)})"),
+                    ]
+                ),
+                decorator="@staticmethod",
+            ),
+        ]
+    )
+
+
+# The smallest and largest values of an int type
+def int_range(type_: tir.Int) -> t.Tuple[int, int]:
+    bits = 8 * type_.width
+    if type_.sign == Sign.SIGNED:
+        return -(2 ** (bits - 1)), 2 ** (bits - 1) - 1
+    else:
+        return 0, 2**bits - 1
+
+
+# Returns the expression converting value_expr to its JSON representation
+@dataclasses.dataclass
+class JsonEncodeExpr(tir.TypeVisitor[str]):
+    options: PythonOptions
+    value_expr: str
+    depth: int = 0
+
+    def visit_int(self, type_: tir.Int) -> str:
+        return self.value_expr
+
+    def visit_float(self, type_: tir.Float) -> str:
+        return self.value_expr
+
+    def visit_array(self, type_: tir.Array) -> str:
+        return self.handle_seq(type_.inner)
+
+    def visit_vector(self, type_: tir.Vector) -> str:
+        return self.handle_seq(type_.inner)
+
+    def visit_list(self, type_: tir.List) -> str:
+        return self.handle_seq(type_.inner)
+
+    def visit_detached_variant(self, type_: tir.DetachedVariant) -> str:
+        return f"{self.value_expr}.to_json_obj()"
+
+    def visit_virtual(self, type_: tir.Virtual) -> str:
+        raise InternalError()
+
+    def visit_struct(self, root: tir.Struct) -> str:
+        return f"{self.value_expr}.to_json_obj()"
+
+    def visit_variant(self, root: tir.Variant) -> str:
+        raise InternalError()
+
+    def visit_enum(self, root: tir.Enum) -> str:
+        return f"{self.value_expr}.value"
+
+    def handle_seq(self, inner: tir.Type) -> str:
+        if numpy_dtype(self.options, inner) is not None:
+            return f"{self.value_expr}.tolist()"
+        if isinstance(inner, (tir.Int, tir.Float)):
+            return f"list({self.value_expr})"
+        element = f"x{self.depth}"
+        element_expr = inner.accept(
+            JsonEncodeExpr(self.options, element, self.depth + 1)
+        )
+        return f"[{element_expr} for {element} in {self.value_expr}]"
+
+
+@dataclasses.dataclass
+class FieldJsonDecoderGenerator(
+    tir.TypeVisitor[t.Tuple[str, pg.Node]], tir.LengthVisitor[str]
+):
+    current_proto: QName
+    options: PythonOptions
+    class_name: str
+    fname: str
+    num: int = 0
+
+    def visit_int(self, type_: tir.Int) -> t.Tuple[str, pg.Node]:
+        low, high = int_range(type_)
+        return self.handle_decoder(
+            type_,
+            """\
+            if type(value) is not int or not {{ low }} <= value <= {{ high }}:
+                return {{ parse_error }}.MALFORMED
+            return value""",
+            locals(),
+        )
+
+    def visit_float(self, type_: tir.Float) -> t.Tuple[str, pg.Node]:
+        return self.handle_decoder(
+            type_,
+            """\
+            if type(value) is not float and type(value) is not int:
+                return {{ parse_error }}.MALFORMED
+            return float(value)""",
+            locals(),
+        )
+
+    def visit_array(self, type_: tir.Array) -> t.Tuple[str, pg.Node]:
+        return self.handle_seq(type_, type_.inner, str(type_.length))
+
+    def visit_vector(self, type_: tir.Vector) -> t.Tuple[str, pg.Node]:
+        return self.handle_seq(
+            type_, type_.inner, self.handle_field_reference(type_.length)
+        )
+
+    def visit_list(self, type_: tir.List) -> t.Tuple[str, pg.Node]:
+        return self.handle_seq(type_, type_.inner, type_.length.accept(self))
+
+    def visit_detached_variant(
+        self, type_: tir.DetachedVariant
+    ) -> t.Tuple[str, pg.Node]:
+        variant_pytype = type_.variant.accept(
+            PythonType(self.current_proto, self.options)
+        )
+        tag_expr = self.handle_field_reference(type_.tag)
+        return self.handle_decoder(
+            type_,
+            """\
+            return {{ variant_pytype }}.from_json_obj(value, {{ tag_expr }})""",
+            locals(),
+        )
+
+    def visit_virtual(self, type_: tir.Virtual) -> t.Tuple[str, pg.Node]:
+        raise InternalError()
+
+    def visit_struct(self, root: tir.Struct) -> t.Tuple[str, pg.Node]:
+        struct_pytype = root.accept(PythonType(self.current_proto, self.options))
+        return self.handle_decoder(
+            root,
+            """\
+            return {{ struct_pytype }}.from_json_obj(value)""",
+            locals(),
+        )
+
+    def visit_variant(self, root: tir.Variant) -> t.Tuple[str, pg.Node]:
+        raise InternalError()
+
+    def visit_enum(self, root: tir.Enum) -> t.Tuple[str, pg.Node]:
+        values = get_enum_values_name(root, self.current_proto)
+        return self.handle_decoder(
+            root,
+            """\
+            result = {{ values }}.get(value) if type(value) is int else None
+            if result is None:
+                return {{ parse_error }}.MALFORMED
+            return result""",
+            locals(),
+        )
+
+    def handle_field_reference(self, fr: tir.FieldReference) -> str:
+        return f"ctxt['{fr.name}']"
+
+    def visit_fixed_length(self, length: tir.FixedLength) -> str:
+        return str(length.length)
+
+    def visit_variable_length(self, length: tir.VariableLength) -> str:
+        return self.handle_field_reference(length.length)
+
+    def handle_decoder(
+        self, type_: tir.Type, body: str, env: t.Dict[str, t.Any]
+    ) -> t.Tuple[str, pg.Node]:
+        dname = f"_from_json_{self.fname}{self.num}"
+        self.num += 1
+        pytype = type_.accept(PythonType(self.current_proto, self.options))
+        return (
+            dname,
+            pg.Function(
+                dname,
+                [
+                    (pg.Type("typing.Any"), "value"),
+                    (pg.Type("typing.Dict[str, typing.Any]"), "ctxt"),
+                ],
+                pg.Type(f"typing.Union[{parse_error}, {pytype}]"),
+                gen_raw(body, env),
+                decorator="@staticmethod",
+            ),
+        )
+
+    def handle_seq(
+        self, seq: tir.Type, inner: tir.Type, length_expr: str
+    ) -> t.Tuple[str, pg.Node]:
+        dtype = numpy_dtype(self.options, inner)
+        helpers: pg.Node = pg.Section([])
+        if is_byte(inner):
+            code = int_struct_pack_code(checked_cast(tir.Int, inner))
+            bytes_expr = "data"
+            if self.options.memoryview:
+                bytes_expr = "memoryview(data)" + (".cast('b')" if code == "b" else "")
+            elif code == "b":
+                bytes_expr = "array.array('b', data)"
+            body = """\
+            if type(value) is not list or len(value) != {{ length_expr }}:
+                return {{ parse_error }}.MALFORMED
+            try:
+                data = struct.pack(f'{len(value)}{{ code }}', *value)
+            except struct.error:
+                return {{ parse_error }}.MALFORMED
+            return {{ bytes_expr }}"""
+        elif isinstance(inner, (tir.Int, tir.Float)):
+            is_int = isinstance(inner, tir.Int)
+            low, high = int_range(inner) if isinstance(inner, tir.Int) else (0, 0)
+            result_expr = (
+                f"numpy.array(value, '{dtype[1:]}')"
+                if dtype is not None
+                else (
+                    "[float(x) for x in value]"
+                    if isinstance(inner, tir.Float)
+                    else "list(value)"
+                )
+            )
+            body = """\
+            if type(value) is not list or len(value) != {{ length_expr }}:
+                return {{ parse_error }}.MALFORMED
+            for x in value:
+                {%- if is_int %}
+                if type(x) is not int or not {{ low }} <= x <= {{ high }}:
+                {%- else %}
+                if type(x) is not float and type(x) is not int:
+                {%- endif %}
+                    return {{ parse_error }}.MALFORMED
+            return {{ result_expr }}"""
+        else:
+            if isinstance(inner, tir.Struct):
+                inner_pytype = inner.accept(
+                    PythonType(self.current_proto, self.options)
+                )
+                inner_expr = f"{inner_pytype}.from_json_obj(x)"
+            else:
+                inner_dname, helpers = inner.accept(self)
+                inner_expr = f"{self.class_name}.{inner_dname}(x, ctxt)"
+            inner_pytype = inner.accept(PythonType(self.current_proto, self.options))
+            body = """\
+            if type(value) is not list or len(value) != {{ length_expr }}:
+                return {{ parse_error }}.MALFORMED
+            result: typing.List[{{ inner_pytype }}] = []
+            for x in value:
+                element = {{ inner_expr }}
+                if isinstance(element, {{ parse_error }}):
+                    return element
+                result.append(element)
+            return result"""
+        dname, decoder = self.handle_decoder(seq, body, locals())
+        return dname, pg.Section([helpers, decoder])
+
+
+def gen_view_class(
+    struct: tir.Struct, options: PythonOptions, layout: FieldLayout
+) -> pg.Node:
+    # A view stores the buffer and the offset of the struct, and for each field
+    # which is not a fixed size primitive, whatever is needed to read it (a nested
+    # view, an element count, ...) and the offset of its end if its size is dynamic.
+    # The message is validated once by parse, so reading a field cannot fail.
+    current_proto = struct.name.namespace()
+    class_name = get_local_struct(struct)
+    view_name = get_view_pyname(struct, current_proto)
+
+    field_formats: t.List[pg.Node] = []
+    helpers: t.List[pg.Node] = []
+    parser_parts: t.List[pg.Node] = [pg.Raw("_start = _offset")]
+    getters: t.List[pg.Node] = []
+    members: t.List[str] = []
+
+    needs_ctxt = any(
+        field.master_field is not None for _, field in struct.get_non_virtual()
+    )
+    if needs_ctxt:
+        ctxt_expr = "_ctxt"
+        parser_parts.append(pg.Raw("_ctxt: typing.Dict[str, typing.Any] = {}"))
+    else:
+        ctxt_expr = "_no_ctxt"
+
+    def field_offset_expr(field: tir.Field) -> str:
+        base = (
+            "self._offset"
+            if field.offset.base is None
+            else f"self._tail_{field.offset.base}"
+        )
+        return f"{base} + {field.offset.offset}" if field.offset.offset else base
+
+    def add_getter(fname: str, pytype: str, value_expr: str) -> None:
+        getters.append(
+            gen_raw(
+                """\
+            @property
+            def {{ fname }}(self) -> {{ pytype }}:
+                return {{ value_expr }}""",
+                locals(),
+            )
+        )
+
+    for block in group_fused_runs(layout):
+        if isinstance(block, list):
+            block_size = sum(run.size for run in block)
+            # Only dependent fields and enums (which must be validated) are read
+            # while parsing the view
+            unpacks = []
+            conversions = []
+            run_offset = 0
+            for run in block:
+                targets = []
+                for fname, field in run.fields:
+                    pytype = field.type_.accept(PythonType(current_proto, options))
+                    if isinstance(field.type_, tir.Enum):
+                        targets.append(f"_{fname}_raw")
+                        conversions.append((fname, field.master_field, pytype))
+                    elif field.master_field is not None:
+                        targets.append(f'_ctxt["{fname}"]')
+                    else:
+                        targets.append("_")
+                    if field.master_field is None:
+                        endianness, fmt = unwrap(field.type_.accept(StructFormatCode()))
+                        field_struct = f"_{view_name}_{fname}_struct"
+                        field_format = (
+                            struct_pack_endianness(endianness or Endianness.LITTLE)
+                            + fmt
+                        )
+                        field_formats.append(
+                            pg.Raw(f"{field_struct} = struct.Struct('{field_format}')")
+                        )
+                        value_expr = f"{field_struct}.unpack_from(self._buf, {field_offset_expr(field)})[0]"
+                        if isinstance(field.type_, tir.Enum):
+                            value_expr = f"{pytype}({value_expr})"
+                        add_getter(fname, pytype, value_expr)
+                if any(target != "_" for target in targets):
+                    offset_expr = (
+                        f"_offset + {run_offset}" if run_offset != 0 else "_offset"
+                    )
+                    target_expr = ", ".join(targets) + (
+                        "," if len(targets) == 1 else ""
+                    )
+                    unpacks.append((run.struct_name, target_expr, offset_expr))
+                run_offset += run.size
+            truncated_checks = truncated_enum_checks(block, current_proto)
+            parser_parts.append(
+                gen_raw(
+                    """\
+                if _offset + {{ block_size }} > len(_buf):
+                    {%- for check in truncated_checks %}
+                    if _offset + {{ check.end }} > len(_buf):
+                        return {{ parse_error }}.NOT_ENOUGH_DATA
+                    if {{ check.read_expr }} not in {{ check.values }}:
+                        return {{ parse_error }}.MALFORMED
+                    {%- endfor %}
+                    return {{ parse_error }}.NOT_ENOUGH_DATA
+                {%- for struct_name, targets, offset_expr in unpacks %}
+                {{ targets }} = {{ struct_name }}.unpack_from(_buf, {{ offset_expr }})
+                {%- endfor %}
+                {%- for fname, master_field, pytype in conversions %}
+                {%- if master_field is none %}
+                if isinstance({{ pytype }}.from_int(_{{ fname }}_raw), {{ parse_error }}):
+                    return {{ parse_error }}.MALFORMED
+                {%- else %}
+                _ctxt["{{ fname }}"] = {{ pytype }}.from_int(_{{ fname }}_raw)
+                if isinstance(_ctxt["{{ fname }}"], {{ parse_error }}):
+                    return {{ parse_error }}.MALFORMED
+                {%- endif %}
+                {%- endfor %}
+                _offset += {{ block_size }}""",
+                    locals(),
+                )
+            )
+        else:
+            fname, field = block
+            check_name, read_name, fhelpers = field.type_.accept(
+                FieldViewGenerator(current_proto, options, view_name, fname)
+            )
+            helpers.append(fhelpers)
+            is_dynamic = isinstance(field.type_.size, st.Dynamic)
+            members.append(f"_info_{fname}")
+            if is_dynamic:
+                members.append(f"_tail_{fname}")
+            parser_parts.append(
+                gen_raw(
+                    """\
+                _{{ fname }}_inner = {{ view_name }}.{{ check_name }}(_buf, _offset, {{ ctxt_expr }})
+                if isinstance(_{{ fname }}_inner, {{ parse_error }}):
+                    return _{{ fname }}_inner
+                _offset, _info_{{ fname }} = _{{ fname }}_inner
+                {%- if is_dynamic %}
+                _tail_{{ fname }} = _offset
+                {%- endif %}""",
+                    locals(),
+                )
+            )
+            if field.master_field is None:
+                pytype = field.type_.accept(ViewPythonType(current_proto, options))
+                if read_name is None:
+                    value_expr = f"self._info_{fname}"
+                else:
+                    value_expr = f"{view_name}.{read_name}(self._buf, {field_offset_expr(field)}, self._info_{fname})"
+                add_getter(fname, pytype, value_expr)
+
+    # Virtual fields are parsed by the parse functions of the struct, using the
+    # fields of the view as the context
+    ctxt_expr = owned_ctxt_expr(struct, "self")
+    for fname, field in struct.fields.items():
+        if isinstance(field.type_, tir.Virtual):
+            pname, _ = field.type_.accept(
+                FieldParserGenerator(current_proto, options, class_name, fname)
+            )
+            pytype = field.type_.accept(PythonType(current_proto, options))
+            getters.append(
+                gen_raw(
+                    """\
+                def {{ fname }}(self, buf: {{ buffer_type }}, offset: int) -> typing.Union[{{ parse_error }}, typing.Tuple[int, {{ pytype }}]]:
+                    return {{ class_name }}.{{ pname }}(buf, offset, {{ ctxt_expr }})""",
+                    locals(),
+                )
+            )
+
+    slots = ["_buf", "_offset", "_end"] + members
+    slots_tuple = repr(tuple(slots))
+    parser_parts.append(
+        pg.Raw(
+            f"return _offset, {view_name}({', '.join(['_buf', '_start', '_offset'] + members)})"
+        )
+    )
+
+    return pg.Section(
+        field_formats
+        + [
+            pg.Class(
+                view_name,
+                pg.Section(
+                    [
+                        gen_raw(
+                            """\
+                        __slots__ = {{ slots_tuple }}
+                        def __init__(self, {{ slots|join(', ') }}) -> None:
+                            {%- for slot in slots %}
+                            self.{{ slot }} = {{ slot }}
+                            {%- endfor %}""",
+                            locals(),
+                        ),
+                        pg.Section(helpers),
+                        pg.Function(
+                            "parse",
+                            [
+                                (pg.Type(buffer_type), "_buf"),
+                                (pg.Type("int"), "_offset"),
+                            ],
+                            pg.Type(
+                                f"typing.Union[{ parse_error }, typing.Tuple[int, '{view_name}']]"
+                            ),
+                            pg.Section(parser_parts),
+                            decorator="@staticmethod",
+                        ),
+                        gen_raw(
+                            """\
+                        def build(self) -> {{ class_name }}:
+                            return typing.cast(typing.Tuple[int, {{ class_name }}], {{ class_name }}.parse(self._buf, self._offset))[1]
+                        def size_bytes(self) -> int:
+                            return self._end - self._offset""",
+                            locals(),
+                        ),
+                        pg.Section(getters),
+                    ]
+                ),
+            )
+        ]
+    )
+
+
+# Generates the helpers to read a field through a view: a check function, which
+# validates the field and returns its end offset and the information needed to read
+# it, and a read function, which reads the field from its offset and that
+# information.
+# The name of the read function is None if the information is the value itself.
+@dataclasses.dataclass
+class FieldViewGenerator(
+    tir.TypeVisitor[t.Tuple[str, t.Optional[str], pg.Node]], tir.LengthVisitor[str]
+):
+    current_proto: QName
+    options: PythonOptions
+    class_name: str
+    fname: str
+    num: int = 0
+
+    # Fixed size primitives are part of fused runs, or handled by handle_seq
+    def visit_int(self, type_: tir.Int) -> t.Tuple[str, t.Optional[str], pg.Node]:
+        raise InternalError()
+
+    def visit_float(self, type_: tir.Float) -> t.Tuple[str, t.Optional[str], pg.Node]:
+        raise InternalError()
+
+    def visit_enum(self, root: tir.Enum) -> t.Tuple[str, t.Optional[str], pg.Node]:
+        raise InternalError()
+
+    def visit_array(self, type_: tir.Array) -> t.Tuple[str, t.Optional[str], pg.Node]:
+        return self.handle_seq(type_, type_.inner, str(type_.length))
+
+    def visit_vector(self, type_: tir.Vector) -> t.Tuple[str, t.Optional[str], pg.Node]:
+        return self.handle_seq(
+            type_, type_.inner, self.handle_field_reference(type_.length)
+        )
+
+    def visit_list(self, type_: tir.List) -> t.Tuple[str, t.Optional[str], pg.Node]:
+        return self.handle_seq(type_, type_.inner, type_.length.accept(self))
+
+    def visit_detached_variant(
+        self, type_: tir.DetachedVariant
+    ) -> t.Tuple[str, t.Optional[str], pg.Node]:
+        cname = self.alloc_function("check")
+        variant_pytype = type_.variant.accept(
+            PythonType(self.current_proto, self.options)
+        )
+        pytype = type_.accept(ViewPythonType(self.current_proto, self.options))
+        tag_expr = self.handle_field_reference(type_.tag)
+
+        return (
+            cname,
+            None,
+            gen_raw(
+                """\
+            @staticmethod
+            def {{ cname }}(buf: {{ buffer_type }}, offset: int, ctxt: typing.Dict[str, typing.Any]) -> typing.Union[{{ parse_error }}, typing.Tuple[int, {{ pytype }}]]:
+                return {{ variant_pytype }}.parse_view(buf, offset, {{ tag_expr }})""",
+                locals(),
+            ),
+        )
+
+    def visit_virtual(
+        self, type_: tir.Virtual
+    ) -> t.Tuple[str, t.Optional[str], pg.Node]:
+        raise InternalError()
+
+    def visit_struct(self, root: tir.Struct) -> t.Tuple[str, t.Optional[str], pg.Node]:
+        cname = self.alloc_function("check")
+        pytype = root.accept(ViewPythonType(self.current_proto, self.options))
+
+        return (
+            cname,
+            None,
+            gen_raw(
+                """\
+            @staticmethod
+            def {{ cname }}(buf: {{ buffer_type }}, offset: int, ctxt: typing.Dict[str, typing.Any]) -> typing.Union[{{ parse_error }}, typing.Tuple[int, {{ pytype }}]]:
+                return {{ pytype }}.parse(buf, offset)""",
+                locals(),
+            ),
+        )
+
+    def visit_variant(
+        self, root: tir.Variant
+    ) -> t.Tuple[str, t.Optional[str], pg.Node]:
+        raise InternalError()
+
+    def alloc_function(self, kind: str) -> str:
+        result = f"_{kind}_{self.fname}{self.num}"
+        self.num += 1
+        return result
+
+    def handle_field_reference(self, fr: tir.FieldReference) -> str:
+        return f"ctxt['{fr.name}']"
+
+    def visit_fixed_length(self, length: tir.FixedLength) -> str:
+        return str(length.length)
+
+    def visit_variable_length(self, length: tir.VariableLength) -> str:
+        return self.handle_field_reference(length.length)
+
+    def handle_seq(
+        self, seq: tir.Type, inner: tir.Type, length_expr: str
+    ) -> t.Tuple[str, t.Optional[str], pg.Node]:
+        code = inner.accept(StructFormatCode())
+        if code is not None:
+            return self.handle_primitive_seq(seq, inner, length_expr, code)
+
+        # Elements are indexed by their offsets. If the elements have a constant
+        # size, the offsets are computed instead of stored, and if any value of the
+        # elements is valid (they are trivial), they are not checked.
+        cname = self.alloc_function("check")
+        inner_cname, inner_rname, inner_helpers = inner.accept(self)
+        pytype = seq.accept(ViewPythonType(self.current_proto, self.options))
+        inner_pytype = inner.accept(ViewPythonType(self.current_proto, self.options))
+        inner_size = inner.size.value if isinstance(inner.size, st.Constant) else None
+        variable_length = has_variable_length(seq)
+
+        return (
+            cname,
+            None,
+            pg.Section(
+                [
+                    inner_helpers,
+                    gen_raw(
+                        """\
+                    @staticmethod
+                    def {{ cname }}(buf: {{ buffer_type }}, offset: int, ctxt: typing.Dict[str, typing.Any]) -> typing.Union[{{ parse_error }}, typing.Tuple[int, {{ pytype }}]]:
+                        # Elements were validated when the list was checked
+                        def get(element_offset: int) -> {{ inner_pytype }}:
+                            info = typing.cast(typing.Tuple[int, typing.Any], {{ this.class_name }}.{{ inner_cname }}(buf, element_offset, ctxt))[1]
+                            {%- if inner_rname is none %}
+                            return info
+                            {%- else %}
+                            return {{ this.class_name }}.{{ inner_rname }}(buf, element_offset, info)
+                            {%- endif %}
+                        count = {{ length_expr }}
+                        {%- if variable_length %}
+                        if count < 0:
+                            return {{ parse_error }}.MALFORMED
+                        {%- endif %}
+                        {%- if inner.trivial %}
+                        end = offset + {{ inner_size }} * count
+                        if end > len(buf):
+                            return {{ parse_error }}.NOT_ENOUGH_DATA
+                        return end, tako.runtime.ListView(get, range(offset, end, {{ inner_size }}))
+                        {%- else %}
+                        {%- if inner_size is not none %}
+                        offsets = range(offset, offset + {{ inner_size }} * count, {{ inner_size }})
+                        {%- else %}
+                        offsets = []
+                        {%- endif %}
+                        for i in range(count):
+                            {%- if inner_size is none %}
+                            offsets.append(offset)
+                            {%- endif %}
+                            inner_result = {{ this.class_name }}.{{ inner_cname }}(buf, offset, ctxt)
+                            if isinstance(inner_result, {{ parse_error }}):
+                                return inner_result
+                            offset = inner_result[0]
+                        return offset, tako.runtime.ListView(get, offsets)
+                        {%- endif %}""",
+                        locals(),
+                    ),
+                ]
+            ),
+        )
+
+    def handle_primitive_seq(
+        self,
+        seq: tir.Type,
+        inner: tir.Type,
+        length_expr: str,
+        code: t.Tuple[t.Optional[Endianness], str],
+    ) -> t.Tuple[str, t.Optional[str], pg.Node]:
+        # The information is the number of elements
+        cname = self.alloc_function("check")
+        rname = self.alloc_function("read")
+        pytype = seq.accept(ViewPythonType(self.current_proto, self.options))
+        inner_pytype = inner.accept(PythonType(self.current_proto, self.options))
+        endianness, fmt = code
+        endianness_prefix = struct_pack_endianness(endianness or Endianness.LITTLE)
+        inner_size = checked_cast(st.Constant, inner.size).value
+        is_enum = isinstance(inner, tir.Enum)
+        variable_length = has_variable_length(seq)
+        dtype = numpy_dtype(self.options, inner)
+        bytes_expr = (
+            byte_seq_expr(self.options, inner, "offset", "offset + count")
+            if is_byte(inner)
+            else None
+        )
 
         return (
-            bname,
+            cname,
+            rname,
             gen_raw(
                 """\
-            def {{ bname }}(self, value: {{ pytype }}, buf: bytearray, offset: int) -> int:
-                return value.serialize_into(buf, offset)""",
+            @staticmethod
+            def {{ cname }}(buf: {{ buffer_type }}, offset: int, ctxt: typing.Dict[str, typing.Any]) -> typing.Union[{{ parse_error }}, typing.Tuple[int, int]]:
+                count = {{ length_expr }}
+                {%- if variable_length %}
+                if count < 0:
+                    return {{ parse_error }}.MALFORMED
+                {%- endif %}
+                end = offset + {{ inner_size }} * count
+                if end > len(buf):
+                    return {{ parse_error }}.NOT_ENOUGH_DATA
+                {%- if is_enum %}
+                for value in struct.unpack_from(f'{{ endianness_prefix }}{count}{{ fmt }}', buf, offset):
+                    if isinstance({{ inner_pytype }}.from_int(value), {{ parse_error }}):
+                        return {{ parse_error }}.MALFORMED
+                {%- endif %}
+                return end, count
+            @staticmethod
+            def {{ rname }}(buf: {{ buffer_type }}, offset: int, count: int) -> {{ pytype }}:
+                {%- if dtype is not none %}
+                return numpy.frombuffer(buf, '{{ dtype }}', count, offset).astype('{{ dtype[1:] }}')
+                {%- elif bytes_expr is not none %}
+                return {{ bytes_expr }}
+                {%- elif is_enum %}
+                return [{{ inner_pytype }}(value) for value in struct.unpack_from(f'{{ endianness_prefix }}{count}{{ fmt }}', buf, offset)]
+                {%- else %}
+                return list(struct.unpack_from(f'{{ endianness_prefix }}{count}{{ fmt }}', buf, offset))
+                {%- endif %}""",
                 locals(),
             ),
         )
 
 
-def gen_sizer(struct: tir.Struct) -> pg.Node:
-
-    sizer_parts: t.List[pg.Node] = []
-    helpers: t.List[pg.Node] = []
-    sizer_parts.append(pg.Raw(f"result: int = 0"))
-    base_size = 0
-    for fname, field in struct.get_non_virtual():
-        size_info = field.type_.accept(
-            FieldSizerGenerator(struct.name.namespace(), fname)
-        )
-        if isinstance(size_info, int):
-            base_size += size_info
-        elif isinstance(size_info, tuple):
-            sname, fhelpers = size_info
-            helpers.append(fhelpers)
-            sizer_parts.append(pg.Raw(f"result += self.{sname}(self.{fname})"))
-        else:
-            assert_never()
-    sizer_parts.append(pg.Raw(f"return result + {base_size}"))
-    helpers.append(
-        pg.Function(
-            "size_bytes", [(None, "self")], pg.Type("int"), pg.Section(sizer_parts)
-        )
-    )
-    return pg.Section(helpers)
-
-
 @dataclasses.dataclass
-class FieldSizerGenerator(tir.TypeVisitor[t.Union[int, t.Tuple[str, pg.Node]]]):
+class FieldValidatorGenerator(
+    tir.TypeVisitor[t.Tuple[str, pg.Node]], tir.LengthVisitor[str]
+):
     current_proto: QName
+    options: PythonOptions
+    class_name: str
     fname: str
     num: int = 0
 
-    def visit_int(self, type_: tir.Int) -> t.Union[int, t.Tuple[str, pg.Node]]:
-        return self.handle_fixed_size(type_)
+    # Fixed size primitives are part of fused runs, or handled by handle_seq
+    def visit_int(self, type_: tir.Int) -> t.Tuple[str, pg.Node]:
+        raise InternalError()
 
-    def visit_float(self, type_: tir.Float) -> t.Union[int, t.Tuple[str, pg.Node]]:
-        return self.handle_fixed_size(type_)
+    def visit_float(self, type_: tir.Float) -> t.Tuple[str, pg.Node]:
+        raise InternalError()
 
-    def visit_array(self, type_: tir.Array) -> t.Union[int, t.Tuple[str, pg.Node]]:
-        return self.handle_fixed_size(type_)
+    def visit_enum(self, root: tir.Enum) -> t.Tuple[str, pg.Node]:
+        raise InternalError()
 
-    def visit_vector(self, type_: tir.Vector) -> t.Union[int, t.Tuple[str, pg.Node]]:
-        sname = self.alloc_size_function()
-        inner_size = checked_cast(int, type_.inner.accept(self))
-        pytype = type_.accept(PythonType(self.current_proto))
+    def visit_array(self, type_: tir.Array) -> t.Tuple[str, pg.Node]:
+        return self.handle_seq(type_, type_.inner, str(type_.length))
 
-        return (
-            sname,
-            gen_raw(
-                """\
-            def {{ sname }}(self, value: {{ pytype }}) -> int:
-                return {{ inner_size }} * len(value)""",
-                locals(),
-            ),
+    def visit_vector(self, type_: tir.Vector) -> t.Tuple[str, pg.Node]:
+        return self.handle_seq(
+            type_, type_.inner, self.handle_field_reference(type_.length)
         )
 
-    def visit_list(self, type_: tir.List) -> t.Union[int, t.Tuple[str, pg.Node]]:
-        sname = self.alloc_size_function()
-        inner_sname, inner_helpers = checked_cast(tuple, type_.inner.accept(self))
-        pytype = type_.accept(PythonType(self.current_proto))
-
-        return (
-            sname,
-            pg.Section(
-                [
-                    inner_helpers,
-                    gen_raw(
-                        """\
-                def {{ sname }}(self, value: {{ pytype }}) -> int:
-                    result: int = 0
-                    for x in value:
-                        result += self.{{ inner_sname }}(x);
-                    return result""",
-                        locals(),
-                    ),
-                ]
-            ),
-        )
+    def visit_list(self, type_: tir.List) -> t.Tuple[str, pg.Node]:
+        return self.handle_seq(type_, type_.inner, type_.length.accept(self))
 
     def visit_detached_variant(
         self, type_: tir.DetachedVariant
-    ) -> t.Union[int, t.Tuple[str, pg.Node]]:
-        return self.handle_root(type_)
+    ) -> t.Tuple[str, pg.Node]:
+        variant_pytype = type_.variant.accept(
+            PythonType(self.current_proto, self.options)
+        )
+        tag_expr = self.handle_field_reference(type_.tag)
+        return self.handle_delegate(
+            f"{variant_pytype}.validate(buf, offset, {tag_expr})"
+        )
 
-    def visit_virtual(self, type_: tir.Virtual) -> t.Union[int, t.Tuple[str, pg.Node]]:
+    def visit_virtual(self, type_: tir.Virtual) -> t.Tuple[str, pg.Node]:
         raise InternalError()
 
-    def visit_struct(self, root: tir.Struct) -> t.Union[int, t.Tuple[str, pg.Node]]:
-        return self.handle_root(root)
+    def visit_struct(self, root: tir.Struct) -> t.Tuple[str, pg.Node]:
+        pytype = root.accept(PythonType(self.current_proto, self.options))
+        return self.handle_delegate(f"{pytype}.validate(buf, offset)")
 
-    def visit_variant(self, root: tir.Variant) -> t.Union[int, t.Tuple[str, pg.Node]]:
+    def visit_variant(self, root: tir.Variant) -> t.Tuple[str, pg.Node]:
         raise InternalError()
 
-    def visit_enum(self, root: tir.Enum) -> t.Union[int, t.Tuple[str, pg.Node]]:
-        return self.handle_fixed_size(root)
-
-    def alloc_size_function(self) -> str:
-        result = f"_size_bytes{self.fname}{self.num}"
+    def alloc_function(self) -> str:
+        result = f"_validate_{self.fname}{self.num}"
         self.num += 1
         return result
 
-    def handle_fixed_size(self, type_: tir.Type) -> int:
-        return checked_cast(st.Constant, type_.size).value
-
-    def handle_root(self, type_: tir.Type) -> t.Union[int, t.Tuple[str, pg.Node]]:
-        sname = self.alloc_size_function()
-        pytype = type_.accept(PythonType(self.current_proto))
-        return type_.size.accept(FieldSizerGeneratorHelper(sname, pytype))
-
+    def handle_field_reference(self, fr: tir.FieldReference) -> str:
+        return f"ctxt['{fr.name}']"
 
-@dataclasses.dataclass
-class FieldSizerGeneratorHelper(st.SizeVisitor[t.Union[int, t.Tuple[str, pg.Node]]]):
-    sname: str
-    pytype: str
+    def visit_fixed_length(self, length: tir.FixedLength) -> str:
+        return str(length.length)
 
-    def visit_constant(self, size: st.Constant) -> t.Union[int, t.Tuple[str, pg.Node]]:
-        return size.value
+    def visit_variable_length(self, length: tir.VariableLength) -> str:
+        return self.handle_field_reference(length.length)
 
-    def visit_dynamic(self, size: st.Dynamic) -> t.Union[int, t.Tuple[str, pg.Node]]:
+    def handle_delegate(self, validate_expr: str) -> t.Tuple[str, pg.Node]:
+        vname = self.alloc_function()
         return (
-            self.sname,
+            vname,
             gen_raw(
                 """\
-            def {{ this.sname }}(self, value: {{ this.pytype }}) -> int:
-                return value.size_bytes()""",
+            @staticmethod
+            def {{ vname }}(buf: {{ buffer_type }}, offset: int, ctxt: typing.Dict[str, typing.Any]) -> typing.Union[{{ parse_error }}, int]:
+                return {{ validate_expr }}""",
                 locals(),
             ),
         )
 
+    def handle_seq(
+        self, seq: tir.Type, inner: tir.Type, length_expr: str
+    ) -> t.Tuple[str, pg.Node]:
+        vname = self.alloc_function()
+        variable_length = has_variable_length(seq)
+        inner_size = inner.size.value if isinstance(inner.size, st.Constant) else None
+        code = inner.accept(StructFormatCode())
+        inner_pytype = inner.accept(PythonType(self.current_proto, self.options))
+        inner_helpers: pg.Node = pg.Section([])
+        # Structs of this protocol made of a single fused run are unpacked all at
+        # once, and only the distinct values of their enums are checked
+        inner_run = None
+        enum_checks = []
+        if (
+            isinstance(inner, tir.Struct)
+            and inner.name.namespace() == self.current_proto
+        ):
+            inner_layout = fuse_fields(inner)
+            if len(inner_layout) == 1 and isinstance(inner_layout[0], FusedRun):
+                inner_run = inner_layout[0]
+                for i, (_, field) in enumerate(inner_run.fields):
+                    if isinstance(field.type_, tir.Enum):
+                        enum_pytype = field.type_.accept(
+                            PythonType(self.current_proto, self.options)
+                        )
+                        enum_checks.append((i, enum_pytype))
+        # Other structs are validated directly, without a helper
+        if isinstance(inner, tir.Struct):
+            inner_validate_expr = f"{inner_pytype}.validate(buf, offset)"
+        elif not inner.trivial and code is None:
+            inner_vname, inner_helpers = inner.accept(self)
+            inner_validate_expr = f"{self.class_name}.{inner_vname}(buf, offset, ctxt)"
+        if code is not None:
+            endianness, fmt = code
+            endianness_prefix = struct_pack_endianness(endianness or Endianness.LITTLE)
+        # The elements of a truncated sequence are checked up to the end of the
+        # buffer, so that a malformed one is reported like in parse
+        check_truncated = not inner.trivial and (
+            inner_run is not None or code is not None
+        )
+
+        return (
+            vname,
+            pg.Section(
+                [
+                    inner_helpers,
+                    gen_raw(
+                        """\
+                    @staticmethod
+                    def {{ vname }}(buf: {{ buffer_type }}, offset: int, ctxt: typing.Dict[str, typing.Any]) -> typing.Union[{{ parse_error }}, int]:
+                        count = {{ length_expr }}
+                        {%- if variable_length %}
+                        if count < 0:
+                            return {{ parse_error }}.MALFORMED
+                        {%- endif %}
+                        {%- if inner_size is not none and (inner.trivial or check_truncated) %}
+                        end = offset + {{ inner_size }} * count
+                        if end > len(buf):
+                            {%- if check_truncated %}
+                            available = (len(buf) - offset) // {{ inner_size }}
+                            {%- if inner_run is not none %}
+                            {%- for i, enum_pytype in enum_checks %}
+                            for value in {values[{{ i }}] for values in {{ inner_run.struct_name }}.iter_unpack(memoryview(buf)[offset:offset + {{ inner_size }} * available])}:
+                                if isinstance({{ enum_pytype }}.from_int(value), {{ parse_error }}):
+                                    return {{ parse_error }}.MALFORMED
+                            {%- endfor %}
+                            result = {{ inner_pytype }}.validate(buf, offset + {{ inner_size }} * available)
+                            if isinstance(result, {{ parse_error }}):
+                                return result
+                            {%- else %}
+                            for value in set(struct.unpack_from(f'{{ endianness_prefix }}{available}{{ fmt }}', buf, offset)):
+                                if isinstance({{ inner_pytype }}.from_int(value), {{ parse_error }}):
+                                    return {{ parse_error }}.MALFORMED
+                            {%- endif %}
+                            {%- endif %}
+                            return {{ parse_error }}.NOT_ENOUGH_DATA
+                        {%- endif %}
+                        {%- if inner.trivial %}
+                        return end
+                        {%- elif inner_run is not none %}
+                        {%- for i, enum_pytype in enum_checks %}
+                        for value in {values[{{ i }}] for values in {{ inner_run.struct_name }}.iter_unpack(memoryview(buf)[offset:end])}:
+                            if isinstance({{ enum_pytype }}.from_int(value), {{ parse_error }}):
+                                return {{ parse_error }}.MALFORMED
+                        {%- endfor %}
+                        return end
+                        {%- elif code is not none %}
+                        for value in set(struct.unpack_from(f'{{ endianness_prefix }}{count}{{ fmt }}', buf, offset)):
+                            if isinstance({{ inner_pytype }}.from_int(value), {{ parse_error }}):
+                                return {{ parse_error }}.MALFORMED
+                        return end
+                        {%- else %}
+                        for _ in range(count):
+                            result = {{ inner_validate_expr }}
+                            if isinstance(result, {{ parse_error }}):
+                                return result
+                            offset = result
+                        return offset
+                        {%- endif %}""",
+                        locals(),
+                    ),
+                ]
+            ),
+        )
+
 
 @dataclasses.dataclass
 class RootConstantGenerator(kir.RootConstantVisitor[pg.Node]):
@@ -778,25 +3330,39 @@ class RootMarkerTypeGenerator(tir.RootTypeVisitor[pg.Node]):
         return self.handle_root(root)
 
 
+# The names of the conversion helpers of a protocol, by (src, target). Conversions
+# within a protocol call these directly instead of dispatching through convert.
+LocalConversions = t.Dict[t.Tuple[QName, QName], str]
+
+
 def gen_conversions(
-    current_proto: QName, own: t.List[cir.RootConversion]
+    current_proto: QName, options: PythonOptions, own: t.List[cir.RootConversion]
 ) -> t.List[pg.Node]:
     if not own:
         return []
 
+    local_conversions: LocalConversions = {
+        (conv.src.name, conv.target.name): f"convert{i}" for i, conv in enumerate(own)
+    }
+
     helpers = []
     overloads = []
     types = []
-    main: t.List[pg.Node] = []
+    table = []
 
     for i, conv in enumerate(own):
         conversion_name = f"convert{i}"
         helpers.append(
-            conv.accept_r(RootConversionGenerator(current_proto, conversion_name))
+            conv.accept_r(
+                RootConversionGenerator(
+                    current_proto, options, conversion_name, local_conversions
+                )
+            )
         )
-        src_pytype, _, return_type = get_conversion_types(conv, current_proto)
+        src_pytype, _, return_type = get_conversion_types(conv, current_proto, options)
         marker_pytype = get_marker_pyname(conv.target, current_proto)
         types.append((src_pytype, marker_pytype, return_type))
+        table.append((src_pytype, marker_pytype, conversion_name))
 
         overloads.append(
             gen_raw(
@@ -807,21 +3373,20 @@ def gen_conversions(
                 locals(),
             )
         )
-        main.append(
-            gen_raw(
-                """\
-            if isinstance(src, {{ src_pytype }}) and isinstance(marker, {{ marker_pytype }}):
-                return {{ conversion_name }}(src)""",
-                locals(),
-            )
-        )
-    main.append(
-        pg.Raw(
-            'raise ValueError(f"Illegal conversion from {type(src)} to {type(marker)}")'
-        )
-    )
 
     srcs, markers, returns = map(", ".join, zip(*types))
+    helpers.append(
+        gen_raw(
+            """\
+        # The conversion for each (type of src, type of marker)
+        _conversions: typing.Dict[typing.Tuple[typing.Type, typing.Type], typing.Callable[[typing.Any], typing.Any]] = {
+            {%- for src_pytype, marker_pytype, conversion_name in table %}
+            ({{ src_pytype }}, {{ marker_pytype }}): {{ conversion_name }},
+            {%- endfor %}
+        }""",
+            locals(),
+        )
+    )
     helpers.extend(overloads)
     helpers.append(
         pg.Function(
@@ -831,17 +3396,24 @@ def gen_conversions(
                 (pg.Type(f"typing.Union[{markers}]"), "marker"),
             ],
             pg.Type(f"typing.Union[{returns}]"),
-            pg.Section(main),
+            gen_raw(
+                """\
+            conversion = _conversions.get((type(src), type(marker)))
+            if conversion is None:
+                raise ValueError(f"Illegal conversion from {type(src)} to {type(marker)}")
+            return conversion(src)""",
+                locals(),
+            ),
         )
     )
     return helpers
 
 
 def get_conversion_types(
-    conversion: cir.RootConversion, current_proto: QName
+    conversion: cir.RootConversion, current_proto: QName, options: PythonOptions
 ) -> t.Tuple[str, str, str]:
-    src_pytype = conversion.src.accept(PythonType(current_proto))
-    target_pytype = conversion.target.accept(PythonType(current_proto))
+    src_pytype = conversion.src.accept(PythonType(current_proto, options))
+    target_pytype = conversion.target.accept(PythonType(current_proto, options))
     if conversion.strength == cir.ConversionStrength.PARTIAL:
         return_type = f"typing.Optional[{target_pytype}]"
     else:
@@ -853,26 +3425,37 @@ def get_conversion_types(
 @dataclasses.dataclass
 class RootConversionGenerator(cir.RootConversionVisitor[pg.Node]):
     current_proto: QName
+    options: PythonOptions
     conversion_name: str
+    local_conversions: LocalConversions
 
     def get_types(self, conversion: cir.RootConversion) -> t.Tuple[str, str, str]:
-        return get_conversion_types(conversion, self.current_proto)
+        return get_conversion_types(conversion, self.current_proto, self.options)
+
+    def expression_generator(self, src_expr: str) -> "ConversionExpressionGenerator":
+        return ConversionExpressionGenerator(
+            self.current_proto, self.options, src_expr, self.local_conversions
+        )
 
     def visit_enum_conversion(self, conversion: cir.EnumConversion) -> pg.Node:
         src_pytype, target_pytype, return_type = self.get_types(conversion)
 
         return gen_raw(
             """\
-            def {{ this.conversion_name }}(src: {{ src_pytype }}) -> {{ return_type }}:
+            _{{ this.conversion_name }}_table: typing.Dict[{{ src_pytype }}, {{ return_type }}] = {
                 {%- for evm in conversion.mapping %}
-                if src == {{ src_pytype }}.{{ evm.src.name }}:
-                    {%- if evm.target is none %}
-                    return None
-                    {%- else %}
-                    return {{ target_pytype }}.{{ evm.target.name }};
-                    {%- endif %}
+                {%- if evm.target is none %}
+                {{ src_pytype }}.{{ evm.src.name }}: None,
+                {%- else %}
+                {{ src_pytype }}.{{ evm.src.name }}: {{ target_pytype }}.{{ evm.target.name }},
+                {%- endif %}
                 {%- endfor %}
-                raise ValueError('Enum held illegal value')""",
+            }
+            def {{ this.conversion_name }}(src: {{ src_pytype }}) -> {{ return_type }}:
+                try:
+                    return _{{ this.conversion_name }}_table[src]
+                except KeyError:
+                    raise ValueError('Enum held illegal value')""",
             locals(),
         )
 
@@ -884,10 +3467,8 @@ class RootConversionGenerator(cir.RootConversionVisitor[pg.Node]):
             conversion_exprs.append(
                 (
                     fname,
-                    field.type_.accept(PythonType(self.current_proto)),
-                    conversion.mapping[fname].accept(
-                        ConversionExpressionGenerator(self.current_proto, "src")
-                    ),
+                    field.type_.accept(PythonType(self.current_proto, self.options)),
+                    conversion.mapping[fname].accept(self.expression_generator("src")),
                     conversion.strength == cir.ConversionStrength.PARTIAL,
                 )
             )
@@ -912,50 +3493,67 @@ class RootConversionGenerator(cir.RootConversionVisitor[pg.Node]):
 
     def visit_variant_conversion(self, conversion: cir.VariantConversion) -> pg.Node:
         src_pytype, target_pytype, return_type = self.get_types(conversion)
-        visitor_name = get_visitor_name(conversion.src, self.current_proto)
-        visitor_info = get_visitor_info(conversion.src)
 
-        def conversion_expr(
-            vvc: t.Optional[cir.VariantValueConversion]
-        ) -> t.Tuple[t.Optional[str], bool]:
+        # Each type of the src is converted by a module level function, or, if the
+        # value is passed through unchanged, directly by the target constructor.
+        # They are looked up by the type of the value of the src.
+        values: t.List[t.Tuple[str, str, t.Optional[str], bool]] = []
+        for i, vvm in enumerate(conversion.mapping):
+            vtype = vvm.src.type_.accept(PythonType(self.current_proto, self.options))
+            vvc = vvm.target
             if vvc is None:
-                return None, True
+                values.append((f"_{self.conversion_name}_{i}", vtype, None, True))
+            elif isinstance(vvc.conversion, cir.IdentityConversion):
+                values.append((target_pytype, vtype, None, False))
             else:
-                return (
-                    vvc.conversion.accept(
-                        ConversionExpressionGenerator(self.current_proto, "x")
-                    ),
-                    vvc.conversion.strength == cir.ConversionStrength.PARTIAL,
+                values.append(
+                    (
+                        f"_{self.conversion_name}_{i}",
+                        vtype,
+                        vvc.conversion.accept(self.expression_generator("x")),
+                        vvc.conversion.strength == cir.ConversionStrength.PARTIAL,
+                    )
                 )
 
-        visitors = [
-            (
-                visitor_info[vvm.src.type_],
-                vvm.src.type_.accept(PythonType(self.current_proto)),
-                conversion_expr(vvm.target),
+        value_conversions: t.List[pg.Node] = []
+        for fname, vtype, conversion_expr, partial in values:
+            if conversion_expr is None and not partial:
+                continue
+            value_conversions.append(
+                gen_raw(
+                    """\
+                def {{ fname }}(x: {{ vtype }}) -> {{ return_type }}:
+                    {%- if conversion_expr is none %}
+                    return None
+                    {%- else %}
+                    result = {{ conversion_expr }}
+                    {%- if partial %}
+                    if result is None:
+                        return None
+                    {%- endif %}
+                    return {{ target_pytype }}(result)
+                    {%- endif %}""",
+                    locals(),
+                )
             )
-            for vvm in conversion.mapping
-        ]
-
-        return gen_raw(
-            """\
+        return pg.Section(
+            value_conversions
+            + [
+                gen_raw(
+                    """\
+            _{{ this.conversion_name }}_table: typing.Dict[typing.Type, typing.Callable[[typing.Any], {{ return_type }}]] = {
+                {%- for fname, vtype, _, _ in values %}
+                {{ vtype }}: {{ fname }},
+                {%- endfor %}
+            }
             def {{ this.conversion_name }}(src: {{ src_pytype }}) -> {{ return_type }}:
-                class Visitor({{ visitor_name }}[{{ return_type }}]):
-                    {%- for vname, vtype, (conversion_expr, partial) in visitors %}
-                    def {{ vname }}(self, x: {{ vtype }}) -> {{ return_type }}:
-                        {%- if conversion_expr is none %}
-                        return None
-                        {%- else %}
-                        result = {{ conversion_expr }}
-                        {%- if partial %}
-                        if result is None:
-                            return None
-                        {%- endif %}
-                        return {{ target_pytype }}(result)
-                        {%- endif %}
-                    {%- endfor %}
-                return src.accept(Visitor())""",
-            locals(),
+                value_conversion = _{{ this.conversion_name }}_table.get(type(src.value))
+                if value_conversion is None:
+                    raise ValueError('Variant held illegal type')
+                return value_conversion(src.value)""",
+                    locals(),
+                )
+            ]
         )
 
 
@@ -964,7 +3562,9 @@ class ConversionExpressionGenerator(
     cir.ConversionVisitor[str], cir.FieldConversionVisitor[str]
 ):
     current_proto: QName
+    options: PythonOptions
     src_expr: str
+    local_conversions: LocalConversions
 
     def visit_identity_conversion(self, conversion: cir.IdentityConversion) -> str:
         return self.src_expr
@@ -983,7 +3583,7 @@ class ConversionExpressionGenerator(
     def visit_enum_default_field_conversion(
         self, conversion: cir.EnumDefaultFieldConversion
     ) -> str:
-        pytype = conversion.type_.accept(PythonType(self.current_proto))
+        pytype = conversion.type_.accept(PythonType(self.current_proto, self.options))
         return f"{pytype}.{conversion.value.name}"
 
     def visit_transform_field_conversion(
@@ -991,13 +3591,23 @@ class ConversionExpressionGenerator(
     ) -> str:
         inner_src_expr = f"{self.src_expr}.{conversion.src_field}"
         return conversion.conversion.accept(
-            ConversionExpressionGenerator(self.current_proto, inner_src_expr)
+            ConversionExpressionGenerator(
+                self.current_proto,
+                self.options,
+                inner_src_expr,
+                self.local_conversions,
+            )
         )
 
     def visit_variant_conversion(self, conversion: cir.VariantConversion) -> str:
         return self.root_conversion_expr(conversion)
 
     def root_conversion_expr(self, conversion: cir.RootConversion) -> str:
+        local_name = self.local_conversions.get(
+            (conversion.src.name, conversion.target.name)
+        )
+        if local_name is not None:
+            return f"{local_name}({self.src_expr})"
         fname = localize(
             conversion.protocol.with_name("convert"), self.current_proto, "convert"
         )
@@ -1010,10 +3620,13 @@ def qname_to_py(qname: QName) -> str:
 
 
 def int_struct_pack_format(int_type: tir.Int) -> str:
-    sign_modifier = struct_pack_sign(int_type.sign)
     endianness_prefix = struct_pack_endianness(int_type.endianness)
-    width_spec = sign_modifier(int_struct_pack_width(int_type.width))
-    return f"{endianness_prefix}{width_spec}"
+    return f"{endianness_prefix}{int_struct_pack_code(int_type)}"
+
+
+def int_struct_pack_code(int_type: tir.Int) -> str:
+    sign_modifier = struct_pack_sign(int_type.sign)
+    return sign_modifier(int_struct_pack_width(int_type.width))
 
 
 def float_struct_pack_format(float_type: tir.Float) -> str:
@@ -1066,6 +3679,12 @@ def get_local_enum(type_: tir.Enum) -> str:
     return type_.name.name()
 
 
+# The dict from the values of an enum to its members, which parsers use directly
+# instead of calling from_int
+def get_enum_values_name(type_: tir.Enum, current_proto: QName) -> str:
+    return localize(type_.name, current_proto, f"_{get_local_enum(type_)}_values")
+
+
 def get_local_variant(type_: tir.Variant) -> str:
     return type_.name.name()
 
@@ -1097,6 +3716,10 @@ def get_to_pyname(type_: tir.RootType, current_proto: QName) -> str:
     return localize(type_.name, current_proto, f"To{type_.name.name()}")
 
 
+def get_view_pyname(type_: tir.Struct, current_proto: QName) -> str:
+    return localize(type_.name, current_proto, f"{type_.name.name()}View")
+
+
 def localize(qname: QName, current_proto: QName, local_pytype: str) -> str:
     if qname.namespace() == current_proto:
         return local_pytype
@@ -1107,6 +3730,7 @@ def localize(qname: QName, current_proto: QName, local_pytype: str) -> str:
 @dataclasses.dataclass
 class PythonType(tir.TypeVisitor[str]):
     current_proto: QName
+    options: PythonOptions
 
     def visit_int(self, type_: tir.Int) -> str:
         return "int"
@@ -1124,6 +3748,18 @@ class PythonType(tir.TypeVisitor[str]):
         return self.visit_array_like(type_.inner)
 
     def visit_array_like(self, inner: tir.Type) -> str:
+        if numpy_dtype(self.options, inner) is not None:
+            return "numpy.ndarray"
+        if is_byte(inner):
+            if self.options.memoryview:
+                return "memoryview"
+            # Sequences of i8 are decoded as arrays, but may also be given as lists
+            signed = checked_cast(tir.Int, inner).sign == Sign.SIGNED
+            return (
+                "typing.Union[array.array[int], typing.List[int]]"
+                if signed
+                else "bytes"
+            )
         return f"typing.List[{inner.accept(self)}]"
 
     def visit_detached_variant(self, type_: tir.DetachedVariant) -> str:
@@ -1145,5 +3781,111 @@ class PythonType(tir.TypeVisitor[str]):
         return localize(qname, self.current_proto, pytype)
 
 
+# The types of the values read through a view
+@dataclasses.dataclass
+class ViewPythonType(PythonType):
+    def visit_array_like(self, inner: tir.Type) -> str:
+        if inner.accept(StructFormatCode()) is not None:
+            return super().visit_array_like(inner)
+        return f"tako.runtime.ListView[{inner.accept(self)}]"
+
+    def visit_detached_variant(self, type_: tir.DetachedVariant) -> str:
+        view_types = [
+            get_view_pyname(variant, self.current_proto)
+            for variant in type_.variant.tags
+        ]
+        return f"typing.Union[{', '.join(view_types)}]"
+
+    def visit_struct(self, root: tir.Struct) -> str:
+        return get_view_pyname(root, self.current_proto)
+
+
+# Whether the length of a sequence is the value of a field, which may be negative in
+# a malformed message
+def has_variable_length(seq: tir.Type) -> bool:
+    return isinstance(seq, tir.Vector) or (
+        isinstance(seq, tir.List) and isinstance(seq.length, tir.VariableLength)
+    )
+
+
+def is_byte(type_: tir.Type) -> bool:
+    # Enums are excluded, even with a 1 byte underlying type
+    return isinstance(type_, tir.Int) and type_.width == 1
+
+
+# Returns the expression decoding the sequence of bytes between start and end of buf.
+# Sequences of u8 are bytes, and sequences of i8 are signed arrays, because bytes are
+# always unsigned. With --memoryview, both are memoryviews, cast to signed for i8.
+def byte_seq_expr(options: PythonOptions, inner: tir.Type, start: str, end: str) -> str:
+    signed = checked_cast(tir.Int, inner).sign == Sign.SIGNED
+    if options.memoryview:
+        return f"memoryview(buf)[{start}:{end}]" + (".cast('b')" if signed else "")
+    if signed:
+        return f"array.array('b', bytes(buf[{start}:{end}]))"
+    return f"bytes(buf[{start}:{end}])"
+
+
+# Returns the numpy dtype used to decode sequences of inner, or None if they are not
+# decoded as numpy arrays
+def numpy_dtype(options: PythonOptions, inner: tir.Type) -> t.Optional[str]:
+    if not options.numpy or is_byte(inner):
+        return None
+    if isinstance(inner, tir.Int):
+        kind = "i" if inner.sign == Sign.SIGNED else "u"
+    elif isinstance(inner, tir.Float):
+        kind = "f"
+    else:
+        return None
+    byte_order = "<" if inner.endianness == Endianness.LITTLE else ">"
+    return f"{byte_order}{kind}{inner.width}"
+
+
+# Returns the expression for the numpy structured dtype of a constant size struct, or
+# None if some field has no fixed layout (variants).
+def struct_dtype_expr(
+    struct: tir.Struct, current_proto: QName, options: PythonOptions
+) -> t.Optional[str]:
+    if not isinstance(struct.size, st.Constant):
+        return None
+    fields = []
+    for fname, field in struct.get_non_virtual():
+        field_dtype = field_dtype_expr(field.type_, current_proto, options)
+        if field_dtype is None:
+            return None
+        dtype, shape = field_dtype
+        if shape:
+            fields.append(f"('{fname}', {dtype}, {shape})")
+        else:
+            fields.append(f"('{fname}', {dtype})")
+    return f"numpy.dtype([{', '.join(fields)}])"
+
+
+# Returns the dtype and the shape of a field of a struct with a structured dtype
+def field_dtype_expr(
+    type_: tir.Type, current_proto: QName, options: PythonOptions
+) -> t.Optional[t.Tuple[str, t.Tuple[int, ...]]]:
+    if isinstance(type_, tir.Enum):
+        type_ = type_.underlying_type
+    if isinstance(type_, (tir.Int, tir.Float)):
+        kind = "f" if isinstance(type_, tir.Float) else "u"
+        if isinstance(type_, tir.Int) and type_.sign == Sign.SIGNED:
+            kind = "i"
+        byte_order = "<" if type_.endianness == Endianness.LITTLE else ">"
+        return f"'{byte_order}{kind}{type_.width}'", ()
+    elif isinstance(type_, tir.Array):
+        inner = field_dtype_expr(type_.inner, current_proto, options)
+        if inner is None:
+            return None
+        dtype, shape = inner
+        return dtype, (type_.length,) + shape
+    elif isinstance(type_, tir.Struct):
+        if struct_dtype_expr(type_, current_proto, options) is None:
+            return None
+        pytype = type_.accept(PythonType(current_proto, options))
+        return f"{pytype}.DTYPE", ()
+    else:
+        return None
+
+
 def gen_raw(template: str, env: t.Dict[str, t.Any]) -> pg.Raw:
     return pg.Raw(template_raw(template, {**globals(), **env}))
@@ -16,10 +16,269 @@
 # This is so potentially the python runtime can be shipped without the generator
 # Note the the generator can depend on the runtime
 
+import collections
 import enum
+import mmap
+import typing
 
 # This mirrors the ParseError enum in tako.hh
 @enum.unique
 class ParseError(enum.Enum):
     MALFORMED = enum.auto()
     NOT_ENOUGH_DATA = enum.auto()
+
+
+# Generated parsers accept any object supporting the buffer protocol whose items
+# are single bytes, and never copy it.
+Buffer = typing.Union[bytes, bytearray, memoryview, mmap.mmap]
+
+
+# Returns a flat view of unsigned bytes over any contiguous buffer protocol object
+# (for example an array.array or a multi-dimensional memoryview), without copying it,
+# so it can be passed to generated parsers.
+def byte_view(obj: typing.Any) -> memoryview:
+    view = memoryview(obj)
+    if view.format == "B" and view.ndim == 1:
+        return view
+    return view.cast("B")
+
+
+T = typing.TypeVar("T")
+
+
+# A sequence of elements of a message which are read through a view. Each element
+# is read from its offset in the buffer when it is accessed.
+class ListView(typing.Sequence[T]):
+    __slots__ = ("_get", "_offsets")
+
+    def __init__(
+        self, get: typing.Callable[[int], T], offsets: typing.Sequence[int]
+    ) -> None:
+        self._get = get
+        self._offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    @typing.overload
+    def __getitem__(self, index: int) -> T:
+        ...
+
+    @typing.overload
+    def __getitem__(self, index: slice) -> "ListView[T]":
+        ...
+
+    def __getitem__(
+        self, index: typing.Union[int, slice]
+    ) -> typing.Union[T, "ListView[T]"]:
+        if isinstance(index, slice):
+            return ListView(self._get, self._offsets[index])
+        return self._get(self._offsets[index])
+
+    def __repr__(self) -> str:
+        return f"ListView({list(self)!r})"
+
+
+# Raised when decoding a sequence of messages fails. offset is the position of the
+# start of the message which failed in the stream or buffer.
+class DecodeError(Exception):
+    def __init__(self, offset: int, description: str) -> None:
+        super().__init__(f"{description} at offset {offset}")
+        self.offset = offset
+
+
+class MalformedMessage(DecodeError):
+    def __init__(self, offset: int) -> None:
+        super().__init__(offset, "malformed message")
+
+
+# Raised when a buffer ends in the middle of a message
+class IncompleteMessage(DecodeError):
+    def __init__(self, offset: int) -> None:
+        super().__init__(offset, "incomplete message")
+
+
+# Parses data, which holds exactly one message of type message_type (a generated
+# struct). Raises MalformedMessage if it is malformed or followed by other data,
+# and IncompleteMessage if it is truncated.
+# Generated structs are pickled as their serialized bytes, and unpickled with it.
+def decode(message_type: typing.Any, data: Buffer) -> typing.Any:
+    parsed = message_type.parse(data, 0)
+    if isinstance(parsed, ParseError):
+        if parsed == ParseError.MALFORMED:
+            raise MalformedMessage(0)
+        raise IncompleteMessage(0)
+    end, message = parsed
+    if end != len(data):
+        raise MalformedMessage(end)
+    return message
+
+
+# Checks whether a message of type message_type which was found to be incomplete
+# may now be complete, without parsing it: constant size messages (with
+# SIZE_BYTES) need all their bytes, and other messages are checked with validate
+# (if message_type has it), which is much cheaper than parsing them.
+class _CompletionCheck:
+    def __init__(self, message_type: typing.Any) -> None:
+        self._size: typing.Optional[int] = getattr(message_type, "SIZE_BYTES", None)
+        self._validate: typing.Optional[
+            typing.Callable[[Buffer, int], typing.Union[ParseError, int]]
+        ] = getattr(message_type, "validate", None)
+
+    # Returns the error of the message at offset in buf if it is known without
+    # parsing it, and None if it must be parsed.
+    def __call__(self, buf: Buffer, offset: int) -> typing.Optional[ParseError]:
+        if self._size is not None:
+            if len(buf) - offset < self._size:
+                return ParseError.NOT_ENOUGH_DATA
+            return None
+        if self._validate is None:
+            return None
+        result = self._validate(buf, offset)
+        return result if isinstance(result, ParseError) else None
+
+
+# Decodes a stream of messages of one type, which arrives in chunks of any size.
+# message_type is a generated struct (or anything with a compatible parse).
+#
+# The data which has not been decoded yet is kept in a bytearray, and once some
+# messages have been decoded, only the remainder is copied into a new bytearray,
+# so each byte is copied a constant number of times.
+# Decoded messages may reference the old buffer (with --memoryview), which is
+# never modified.
+# Once a message is found to be incomplete, it is not parsed again until it may be
+# complete (see _CompletionCheck).
+class StreamDecoder(typing.Generic[T]):
+    def __init__(self, message_type: typing.Any) -> None:
+        self._parse: typing.Callable[
+            [bytearray, int], typing.Union[ParseError, typing.Tuple[int, T]]
+        ] = message_type.parse
+        self._check = _CompletionCheck(message_type)
+        self._buf = bytearray()
+        self._start = 0
+        # The offset in the stream of the start of _buf
+        self._buf_offset = 0
+        # Whether the message at _start was incomplete when it was last parsed
+        self._incomplete = False
+
+    # Adds data to the stream, and returns an iterator over the messages which are
+    # now complete.
+    # Raises MalformedMessage from the iterator if a message is malformed. The
+    # stream cannot be decoded past it.
+    def feed(self, data: Buffer) -> typing.Iterator[T]:
+        self._compact()
+        self._buf += data
+        return self._decode()
+
+    # The offset in the stream of the next message
+    @property
+    def offset(self) -> int:
+        return self._buf_offset + self._start
+
+    # The number of bytes received which are not part of a decoded message. If this
+    # is not 0 when the stream ends, the stream was truncated.
+    @property
+    def pending(self) -> int:
+        return len(self._buf) - self._start
+
+    # The bytes received which are not part of a decoded message
+    def remainder(self) -> bytes:
+        return bytes(self._buf[self._start :])
+
+    def _decode(self) -> typing.Iterator[T]:
+        while True:
+            if self._incomplete and not self._may_be_complete():
+                break
+            result = self._parse(self._buf, self._start)
+            if isinstance(result, ParseError):
+                if result == ParseError.MALFORMED:
+                    raise MalformedMessage(self.offset)
+                self._incomplete = True
+                break
+            self._incomplete = False
+            end, message = result
+            if end == self._start:
+                raise ValueError("messages of size 0 cannot be decoded from a stream")
+            self._start = end
+            yield message
+        self._compact()
+
+    def _may_be_complete(self) -> bool:
+        result = self._check(self._buf, self._start)
+        if result == ParseError.MALFORMED:
+            raise MalformedMessage(self.offset)
+        return result is None
+
+    def _compact(self) -> None:
+        if self._start != 0:
+            self._buf_offset += self._start
+            self._buf = self._buf[self._start :]
+            self._start = 0
+
+
+# A bounded cache of the messages decoded from the most recently used byte strings,
+# for a constant size struct. Since generated structs are frozen, the parser returns
+# the same message each time it parses the same bytes.
+# The least recently used messages are evicted when the cache holds more than
+# capacity of them. hits, misses and evictions count the lookups and evictions
+# since the cache was created. With several threads, the counters may be inexact.
+# The messages are shared, so only structs whose messages cannot be modified use it.
+class DecodeCache(typing.Generic[T]):
+    def __init__(self, size: int, capacity: int = 1024) -> None:
+        if capacity < 1:
+            raise ValueError("the capacity of a decode cache must be positive")
+        self.size = size
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._messages: "collections.OrderedDict[bytes, T]" = collections.OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._messages)
+
+    # Returns the message decoded from the size bytes at offset in buf, or None if
+    # they are not in the cache.
+    def get(self, buf: Buffer, offset: int) -> typing.Optional[T]:
+        key = bytes(buf[offset : offset + self.size])
+        message = self._messages.get(key)
+        if message is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        try:
+            self._messages.move_to_end(key)
+        except KeyError:
+            # Evicted by another thread
+            pass
+        return message
+
+    # Adds message, decoded from the size bytes at offset in buf
+    def put(self, buf: Buffer, offset: int, message: T) -> None:
+        self._messages[bytes(buf[offset : offset + self.size])] = message
+        while len(self._messages) > self.capacity:
+            self._messages.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self._messages.clear()
+
+
+# Makes the parser of message_type, a generated constant size struct, use a new
+# DecodeCache holding up to capacity messages, and returns it. Only parse and the
+# parsers of structs containing message_type use the cache.
+# Structs holding sequences cannot be cached, because their messages may reference
+# the parsed buffer or be modified, except for sequences of u8 decoded as bytes.
+def enable_decode_cache(
+    message_type: typing.Any, capacity: int = 1024
+) -> DecodeCache[typing.Any]:
+    if not hasattr(message_type, "_decode_cache"):
+        raise TypeError(f"{message_type.__name__} cannot use a decode cache")
+    cache: DecodeCache[typing.Any] = DecodeCache(message_type.SIZE_BYTES, capacity)
+    message_type._decode_cache = cache
+    return cache
+
+
+def disable_decode_cache(message_type: typing.Any) -> None:
+    if hasattr(message_type, "_decode_cache"):
+        message_type._decode_cache = None
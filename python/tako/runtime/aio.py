@@ -0,0 +1,146 @@
+# Copyright 2020 Jacob Glueck
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# asyncio integration for generated messages.
+# Like the rest of the runtime, this depends on nothing else in tako.
+
+import asyncio
+import typing
+
+from tako.runtime import ParseError, StreamDecoder, _CompletionCheck
+
+T = typing.TypeVar("T")
+
+
+# Iterates over the messages of type message_type read from reader, reading up to
+# chunk_size bytes at a time.
+# Raises tako.runtime.MalformedMessage if a message is malformed, and
+# asyncio.IncompleteReadError if the stream ends in the middle of a message.
+async def read_messages(
+    reader: asyncio.StreamReader, message_type: typing.Any, chunk_size: int = 65536
+) -> typing.AsyncIterator[T]:
+    decoder: StreamDecoder[T] = StreamDecoder(message_type)
+    while True:
+        data = await reader.read(chunk_size)
+        if not data:
+            if decoder.pending != 0:
+                raise asyncio.IncompleteReadError(decoder.remainder(), None)
+            return
+        for message in decoder.feed(data):
+            yield message
+
+
+# Serializes messages to a transport (or an asyncio.StreamWriter), coalescing all
+# the messages written during one iteration of the event loop into one writelines.
+class MessageWriter:
+    def __init__(self, transport: typing.Any) -> None:
+        self._transport = transport
+        self._pending: typing.List[bytearray] = []
+
+    # Must be called from the event loop
+    def write(self, message: typing.Any) -> None:
+        if not self._pending:
+            asyncio.get_running_loop().call_soon(self.flush)
+        self._pending.append(message.serialize())
+
+    # Writes the pending messages now
+    def flush(self) -> None:
+        if self._pending:
+            pending, self._pending = self._pending, []
+            self._transport.writelines(pending)
+
+
+# A protocol which decodes messages of type message_type directly from the receive
+# buffer of the transport. Subclasses handle messages in message_received, and can
+# send messages with send.
+#
+# Received data is written after the end of the data already received, and when
+# the buffer is full, the undecoded data is copied to a new buffer. Decoded
+# messages may reference the buffer (with --memoryview), so data is never
+# overwritten. Like in StreamDecoder, an incomplete message is not parsed again
+# until it may be complete.
+class MessageProtocol(asyncio.BufferedProtocol, typing.Generic[T]):
+    def __init__(self, message_type: typing.Any, buffer_size: int = 65536) -> None:
+        self._parse: typing.Callable[
+            [memoryview, int], typing.Union[ParseError, typing.Tuple[int, T]]
+        ] = message_type.parse
+        self._check = _CompletionCheck(message_type)
+        # Whether the message at _start was incomplete when it was last parsed
+        self._incomplete = False
+        self._buffer_size = buffer_size
+        self._buf = bytearray(buffer_size)
+        # _buf[_start:_end] has been received but not decoded
+        self._start = 0
+        self._end = 0
+        # The offset in the stream of the start of _buf
+        self._buf_offset = 0
+        self.transport: typing.Optional[asyncio.BaseTransport] = None
+        self._writer: typing.Optional[MessageWriter] = None
+
+    def connection_made(self, transport: asyncio.BaseTransport) -> None:
+        self.transport = transport
+        self._writer = MessageWriter(transport)
+
+    def get_buffer(self, sizehint: int) -> memoryview:
+        if len(self._buf) - self._end < max(sizehint, self._buffer_size // 4):
+            pending = self._end - self._start
+            buf = bytearray(max(self._buffer_size, 2 * pending, pending + sizehint))
+            buf[:pending] = memoryview(self._buf)[self._start : self._end]
+            self._buf_offset += self._start
+            self._buf = buf
+            self._start = 0
+            self._end = pending
+        return memoryview(self._buf)[self._end :]
+
+    def buffer_updated(self, nbytes: int) -> None:
+        self._end += nbytes
+        received = memoryview(self._buf)[: self._end]
+        if self._incomplete:
+            error = self._check(received, self._start)
+            if error is not None:
+                if error == ParseError.MALFORMED:
+                    self.malformed_message(self._buf_offset + self._start)
+                return
+        while True:
+            result = self._parse(received, self._start)
+            if isinstance(result, ParseError):
+                if result == ParseError.MALFORMED:
+                    self.malformed_message(self._buf_offset + self._start)
+                else:
+                    self._incomplete = True
+                return
+            self._incomplete = False
+            end, message = result
+            if end == self._start:
+                raise ValueError("messages of size 0 cannot be decoded from a stream")
+            self._start = end
+            self.message_received(message)
+
+    # Called with each decoded message. Subclasses override it, and by default
+    # messages are dropped.
+    def message_received(self, message: T) -> None:
+        pass
+
+    # Called when the message at offset in the stream is malformed. The stream
+    # cannot be decoded past it, so by default the connection is closed.
+    def malformed_message(self, offset: int) -> None:
+        if self.transport is not None:
+            self.transport.close()
+
+    # Sends a message with the other messages sent during this iteration of the
+    # event loop
+    def send(self, message: typing.Any) -> None:
+        if self._writer is None:
+            raise RuntimeError("the connection has not been made")
+        self._writer.write(message)
@@ -0,0 +1,205 @@
+# Copyright 2020 Jacob Glueck
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Random access to files of back to back messages of one type.
+# Like the rest of the runtime, this depends on nothing else in tako.
+
+import array
+import hashlib
+import mmap
+import os
+import struct
+import sys
+import typing
+
+from tako.runtime import (
+    Buffer,
+    IncompleteMessage,
+    ListView,
+    MalformedMessage,
+    ParseError,
+)
+
+T = typing.TypeVar("T")
+
+# The index file starts with a header of the magic, the size and modification time
+# of the log when it was indexed, and a hash of the name of the message type. It is
+# followed by the offset of each message in the log, as little endian u64s.
+_INDEX_MAGIC = b"TAKOIDX2"
+_INDEX_HEADER = struct.Struct("<8sQQ8s")
+
+
+def _type_hash(message_type: typing.Any) -> bytes:
+    name = f"{message_type.__module__}.{message_type.__qualname__}"
+    return hashlib.blake2b(name.encode(), digest_size=8).digest()
+
+
+# Returns the offset of each message in buf, using validate so the messages are
+# not built.
+# Raises MalformedMessage if a message is malformed (including when validate does
+# not move past it), and IncompleteMessage if buf ends in the middle of a message.
+def index_messages(buf: Buffer, message_type: typing.Any) -> "array.array[int]":
+    if getattr(message_type, "SIZE_BYTES", None) == 0:
+        raise ValueError("messages of size 0 cannot be indexed")
+    validate: typing.Callable[
+        [Buffer, int], typing.Union[ParseError, int]
+    ] = message_type.validate
+    offsets = array.array("Q")
+    offset = 0
+    end = len(buf)
+    while offset < end:
+        result = validate(buf, offset)
+        if isinstance(result, ParseError):
+            if result == ParseError.MALFORMED:
+                raise MalformedMessage(offset)
+            raise IncompleteMessage(offset)
+        if result <= offset:
+            raise MalformedMessage(offset)
+        offsets.append(offset)
+        offset = result
+    return offsets
+
+
+# A read only sequence of the messages of type message_type in the file at path.
+# message_type is a generated struct.
+#
+# The file is memory mapped, and messages are parsed when they are accessed, so
+# only the pages of the messages which are read are loaded. The offsets of the
+# messages are found the first time the file is opened, and saved in the index
+# file at index_path (path + ".idx" by default), which is memory mapped when the
+# file is opened again. The index is rebuilt if the size or modification time of
+# the file changed, if it was built for another message type, or if it is
+# corrupt. If the index file cannot be written, the offsets are only kept in
+# memory.
+#
+# Messages parsed with --memoryview reference the file, so they must be released
+# before the log is closed.
+class MessageLog(typing.Sequence[T]):
+    def __init__(
+        self,
+        path: typing.Union[str, "os.PathLike[str]"],
+        message_type: typing.Any,
+        index_path: typing.Optional[typing.Union[str, "os.PathLike[str]"]] = None,
+    ) -> None:
+        self._parse: typing.Callable[
+            [Buffer, int], typing.Union[ParseError, typing.Tuple[int, T]]
+        ] = message_type.parse
+        self._index_path = (
+            index_path if index_path is not None else os.fspath(path) + ".idx"
+        )
+        self._index_map: typing.Optional[mmap.mmap] = None
+        with open(path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            # Empty files cannot be memory mapped
+            self._map: typing.Optional[mmap.mmap] = (
+                mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                if stat.st_size != 0
+                else None
+            )
+        self._buf: Buffer = self._map if self._map is not None else b""
+        self._header = _INDEX_HEADER.pack(
+            _INDEX_MAGIC, stat.st_size, stat.st_mtime_ns, _type_hash(message_type)
+        )
+        offsets = self._load_index()
+        if offsets is None:
+            offsets = index_messages(self._buf, message_type)
+            self._save_index(offsets)
+        self._offsets: typing.Sequence[int] = offsets
+
+    # The offset of each message in the file
+    @property
+    def offsets(self) -> typing.Sequence[int]:
+        return self._offsets
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    @typing.overload
+    def __getitem__(self, index: int) -> T:
+        ...
+
+    @typing.overload
+    def __getitem__(self, index: slice) -> ListView[T]:
+        ...
+
+    def __getitem__(
+        self, index: typing.Union[int, slice]
+    ) -> typing.Union[T, ListView[T]]:
+        if isinstance(index, slice):
+            return ListView(self._get, self._offsets[index])
+        return self._get(self._offsets[index])
+
+    def __iter__(self) -> typing.Iterator[T]:
+        for offset in self._offsets:
+            yield self._get(offset)
+
+    # Slices of the log reference the index, so it is unmapped when they are
+    # released.
+    def close(self) -> None:
+        self._offsets = ()
+        self._index_map = None
+        self._buf = b""
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+    def __enter__(self) -> "MessageLog[T]":
+        return self
+
+    def __exit__(self, *args: typing.Any) -> None:
+        self.close()
+
+    def _get(self, offset: int) -> T:
+        result = self._parse(self._buf, offset)
+        # The file was validated when it was indexed, so this only fails if it
+        # was modified since.
+        if isinstance(result, ParseError):
+            raise MalformedMessage(offset)
+        return result[1]
+
+    def _load_index(self) -> typing.Optional[typing.Sequence[int]]:
+        try:
+            with open(self._index_path, "rb") as f:
+                if f.read(_INDEX_HEADER.size) != self._header:
+                    return None
+                size = os.fstat(f.fileno()).st_size
+                # A truncated index is rebuilt
+                if (size - _INDEX_HEADER.size) % 8 != 0:
+                    return None
+                if size == _INDEX_HEADER.size:
+                    return array.array("Q")
+                if sys.byteorder == "little":
+                    self._index_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                    return memoryview(self._index_map)[_INDEX_HEADER.size :].cast("Q")
+                offsets = array.array("Q")
+                offsets.frombytes(f.read())
+                offsets.byteswap()
+                return offsets
+        except OSError:
+            return None
+
+    def _save_index(self, offsets: "array.array[int]") -> None:
+        tmp_path = os.fspath(self._index_path) + ".tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(self._header)
+                if sys.byteorder == "little":
+                    offsets.tofile(f)
+                else:
+                    swapped = array.array("Q", offsets)
+                    swapped.byteswap()
+                    swapped.tofile(f)
+            os.replace(tmp_path, self._index_path)
+        except OSError:
+            pass
@@ -0,0 +1,119 @@
+# Copyright 2020 Jacob Glueck
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Decoding files of back to back messages on several cores.
+# Like the rest of the runtime, this depends on nothing else in tako.
+
+import bisect
+import concurrent.futures
+import functools
+import mmap
+import os
+import typing
+
+from tako.runtime import MalformedMessage, ParseError
+from tako.runtime.log import MessageLog
+
+R = typing.TypeVar("R")
+
+
+# Calls fn on each message of type message_type in the file at path, in worker
+# processes, and returns an iterator over the results which are not None, in the
+# order of the messages.
+#
+# The file is split at message boundaries into chunks_per_worker chunks per
+# worker, of about the same size. The boundaries are found with a MessageLog, so
+# the index file at index_path (path + ".idx" by default) is used if it is up to
+# date, and written otherwise. Each worker memory maps the file and parses its
+# chunk with the generated parser.
+#
+# If result_type is a generated struct, fn returns messages of that type, which
+# are sent back as one serialized batch per chunk, rather than pickled one by one.
+# Otherwise the results are pickled. fn, message_type and result_type are
+# pickled by reference, so they must be defined at the top level of a module.
+def decode_file(
+    path: typing.Union[str, "os.PathLike[str]"],
+    message_type: typing.Any,
+    fn: typing.Callable[[typing.Any], typing.Optional[R]],
+    workers: typing.Optional[int] = None,
+    result_type: typing.Any = None,
+    index_path: typing.Optional[typing.Union[str, "os.PathLike[str]"]] = None,
+    chunks_per_worker: int = 4,
+) -> typing.Iterator[R]:
+    if workers is None:
+        workers = os.cpu_count() or 1
+    log: MessageLog[typing.Any]
+    with MessageLog(path, message_type, index_path) as log:
+        size = os.path.getsize(path)
+        boundaries = [0]
+        num_chunks = workers * chunks_per_worker
+        for i in range(1, num_chunks):
+            index = bisect.bisect_left(log.offsets, size * i // num_chunks)
+            boundary = log.offsets[index] if index < len(log) else size
+            if boundary != boundaries[-1]:
+                boundaries.append(boundary)
+        if boundaries[-1] != size:
+            boundaries.append(size)
+    return _decode_chunks(
+        functools.partial(_decode_chunk, path, message_type, fn, result_type),
+        boundaries,
+        workers,
+        result_type,
+    )
+
+
+def _decode_chunks(
+    decode_chunk: typing.Callable[[int, int], typing.Any],
+    boundaries: typing.List[int],
+    workers: int,
+    result_type: typing.Any,
+) -> typing.Iterator[R]:
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        for batch in executor.map(decode_chunk, boundaries[:-1], boundaries[1:]):
+            if result_type is not None:
+                yield from result_type.iter_parse(batch)
+            else:
+                yield from batch
+
+
+def _decode_chunk(
+    path: typing.Union[str, "os.PathLike[str]"],
+    message_type: typing.Any,
+    fn: typing.Callable[[typing.Any], typing.Any],
+    result_type: typing.Any,
+    start: int,
+    end: int,
+) -> typing.Union[bytearray, typing.List[typing.Any]]:
+    # The map is not closed explicitly, because messages parsed with --memoryview
+    # may still reference it.
+    with open(path, "rb") as f:
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    serialized = bytearray()
+    results: typing.List[typing.Any] = []
+    offset = start
+    while offset < end:
+        parsed = message_type.parse(buf, offset)
+        # The file was validated when it was indexed, so this only fails if it was
+        # modified since.
+        if isinstance(parsed, ParseError):
+            raise MalformedMessage(offset)
+        offset, message = parsed
+        result = fn(message)
+        if result is None:
+            continue
+        if result_type is not None:
+            result.serialize_into(serialized, len(serialized))
+        else:
+            results.append(result)
+    return serialized if result_type is not None else results
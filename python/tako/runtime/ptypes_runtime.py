@@ -13,12 +13,13 @@
 # limitations under the License.
 
 import typing as t
+import array
 from takogen.tako import Ptypes
 
 T = t.TypeVar("T", Ptypes.StringL8, Ptypes.StringL16, Ptypes.StringL32)
 
 def make_ptype_string(ptype: t.Type[T], s: str) -> T:
-    return ptype(list(s.encode()))
+    return ptype(array.array("b", s.encode()))
 
 def make_string(ptype_str: T) -> str:
     return bytes(ptype_str.data).decode()
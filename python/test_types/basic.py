@@ -102,6 +102,9 @@ class Basic(Protocol):
     Matrix = Struct(data=Seq(Seq(i8, 3), 3))
 
     VarList = Struct(rows=u8, data=Virtual(Seq(Seq(i8, 3), this.rows)))
+    LabeledVarList = Struct(
+        rows=u8, data=Virtual(Seq(Seq(i8, 3), this.rows)), label=External.String
+    )
 
     Person = Struct(name=External.String, age=li16)
 